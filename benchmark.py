@@ -0,0 +1,225 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import neat
+
+from main import App, SCR_WIDTH, SCR_HEIGHT, RUNS_PER_NET, MAX_STEPS, CHUNK_SIZE, EVAL_CONFIG_ATTRIBUTES
+from scripts.scene import Scene
+from scripts.scenarios import ScenarioSet
+from scripts.worker_pool import WorkerPool
+
+SEED = 0 # every benchmark starts from the same layouts & population
+BASELINE_PATH = "benchmark-baseline.json"
+THRESHOLD = 0.1 # results more than this fraction below the baseline count as regressions
+OUTPUT = (1.0, 1.0, 1.0) # full speed ahead with the camera on, so every phase of a step runs
+
+# every result is a rate, higher is better
+
+def bench_scene_tick(num_targets, render, steps) -> float:
+    """
+    Scene.tick() steps/s, starting over every MAX_STEPS steps like a training run would
+    """
+    scene = Scene(num_targets=num_targets, width=SCR_WIDTH, height=SCR_HEIGHT, headless=not render, seed=SEED)
+    scene.warm_up()
+    start = time.perf_counter()
+    for i in range(steps):
+        if scene.step >= MAX_STEPS:
+            scene.reset(SEED)
+        scene.tick(OUTPUT, render)
+    return steps / (time.perf_counter() - start)
+
+def bench_physics(iterations, steps) -> float:
+    """
+    PhysicsManager.update() steps/s with the given solver iterations
+    """
+    # lots of targets so there are contacts to solve
+    scene = Scene(num_targets=100, width=SCR_WIDTH, height=SCR_HEIGHT, headless=True, seed=SEED)
+    scene.warm_up()
+    scene.physics_manager.space.iterations = iterations
+    scene.set_motor_left(255)
+    scene.set_motor_right(200)
+    elapsed = 0.0
+    for i in range(steps):
+        # the rest of the step keeps the bodies awake like in a real run, but isn't timed
+        scene.robot.update_motors()
+        for target in scene.targets:
+            target.update()
+        start = time.perf_counter()
+        scene.physics_manager.update()
+        elapsed += time.perf_counter() - start
+    return steps / elapsed
+
+def load_config():
+    config_path = os.path.join(os.path.dirname(__file__), "config.conf")
+    return neat.Config(neat.DefaultGenome, neat.DefaultReproduction, neat.DefaultSpeciesSet, neat.DefaultStagnation, config_path)
+
+def bench_genome_evaluations(num_genomes) -> float:
+    """
+    Genomes/s through the evaluation function workers run, in this process
+    """
+    config = load_config()
+    random.seed(SEED)
+    genomes = list(neat.Population(config).population.values())[:num_genomes]
+    config.scenario_seeds = ScenarioSet(RUNS_PER_NET, seed=SEED).get_seeds(0)
+    config.racing_threshold = None
+
+    start = time.perf_counter()
+    for genome in genomes:
+        App.evaluate_genome_racing(genome, config)
+    return len(genomes) / (time.perf_counter() - start)
+
+# counts the generations population.run() evaluated, it stops early if the fitness threshold is reached
+class GenerationCounter(neat.reporting.BaseReporter):
+    def __init__(self):
+        self.generations = 0
+
+    def post_evaluate(self, config, population, species, best_genome):
+        self.generations += 1
+
+def bench_generations(num_workers, pop_size, generations) -> float:
+    """
+    Generations/minute on a worker pool (pool start up isn't counted)
+    """
+    config = load_config()
+    config.pop_size = pop_size
+    config.racing_threshold = None
+    scenarios = ScenarioSet(RUNS_PER_NET, seed=SEED)
+    pool = WorkerPool(num_workers, App.evaluate_genome_racing, config, chunk_size=CHUNK_SIZE,
+                      initializer=App.init_worker, config_attributes=EVAL_CONFIG_ATTRIBUTES)
+
+    def evaluate(genomes, config):
+        config.scenario_seeds = scenarios.next_generation()
+        pool.evaluate(genomes, config)
+
+    random.seed(SEED)
+    population = neat.Population(config)
+    counter = GenerationCounter()
+    population.add_reporter(counter)
+    start = time.perf_counter()
+    population.run(evaluate, generations)
+    elapsed = time.perf_counter() - start
+    pool.close()
+    return counter.generations / elapsed * 60
+
+def worker_counts(max_workers) -> list:
+    # 1, 2, 4, ... & the maximum, running every count in between takes too long on big machines
+    counts = []
+    n = 1
+    while n < max_workers:
+        counts.append(n)
+        n *= 2
+    return counts + [max_workers]
+
+def run_benchmarks(quick=False, max_workers=None, only=None) -> dict:
+    """
+    Runs the benchmarks & returns {name: {"value": rate, "unit": unit}}\n
+    quick: fewer steps & a smaller population, for a fast sanity check
+    max_workers: highest worker count for the generation benchmark (default all cpus)
+    only: names of benchmark groups to run (scene, physics, evaluate, generations), default all of them
+    """
+    steps = 1000 if quick else 10000
+    num_genomes = 4 if quick else 20
+    pop_size = 20 if quick else 100
+    generations = 1 if quick else 3
+    max_workers = max_workers or multiprocessing.cpu_count()
+    groups = only or ("scene", "physics", "evaluate", "generations")
+
+    results = {}
+    def record(name, value, unit):
+        results[name] = {"value": value, "unit": unit}
+        print(f"{name:<40}{value:>12.1f} {unit}", file=sys.__stdout__, flush=True)
+
+    # the worker pool prints a line per generation, that's just noise here
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        if "scene" in groups:
+            for render in (False, True):
+                for num_targets in (1, 10, 100):
+                    mode = "render" if render else "headless"
+                    record(f"scene_tick/{mode}/targets={num_targets}", bench_scene_tick(num_targets, render, steps), "steps/s")
+        if "physics" in groups:
+            for iterations in (1, 5, 10, 20, 40):
+                record(f"physics_update/iterations={iterations}", bench_physics(iterations, steps), "steps/s")
+        if "evaluate" in groups:
+            record("evaluate_genome", bench_genome_evaluations(num_genomes), "genomes/s")
+        if "generations" in groups:
+            for num_workers in worker_counts(max_workers):
+                record(f"generations/pop={pop_size}/workers={num_workers}",
+                       bench_generations(num_workers, pop_size, generations), "generations/min")
+    return results
+
+def get_meta(quick) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": multiprocessing.cpu_count(),
+        "quick": quick,
+        "seed": SEED,
+    }
+
+def compare(results: dict, baseline: dict, threshold=THRESHOLD) -> list:
+    """
+    Prints each result against the baseline & returns the names of the ones that regressed
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old = baseline[name]["value"]
+        change = result["value"] / old - 1
+        status = ""
+        if change < -threshold:
+            status = "REGRESSION"
+            regressions.append(name)
+        print(f"{name:<40}{old:>12.1f} -> {result['value']:>10.1f} {change:>+7.1%} {status}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulation & training throughput benchmarks")
+    parser.add_argument("--quick", action="store_true", help="fewer steps & a smaller population")
+    parser.add_argument("--only", nargs="+", choices=("scene", "physics", "evaluate", "generations"), help="benchmark groups to run")
+    parser.add_argument("--workers", type=int, help="highest worker count for the generation benchmark")
+    parser.add_argument("--output", default="benchmark-results.json", help="where to write the results")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="results to compare against")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="allowed slowdown before failing, as a fraction")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    args = parser.parse_args()
+
+    data = {"meta": get_meta(args.quick), "results": run_benchmarks(args.quick, args.workers, args.only)}
+    with open(args.output, "w") as f:
+        json.dump(data, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(data, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        sys.exit()
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"No baseline at {args.baseline}, run with --save-baseline to make one")
+        sys.exit()
+
+    if baseline["meta"].get("quick") != args.quick:
+        print("Warning: the baseline was run with different settings (--quick), the numbers aren't comparable")
+    regressions = compare(data["results"], baseline["results"], args.threshold)
+    if regressions:
+        print(f"{len(regressions)} benchmarks regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+    print("No regressions")
@@ -1,3 +1,4 @@
+import argparse
 import math
 import pygame
 import time
@@ -9,15 +10,79 @@ import neat
 import tomllib
 
 from scripts.scene import Scene
+from scripts.physics_world import PHYSICS_PROFILES
+from scripts.batch_scene import evaluate_population
+from scripts.batch_network import BatchNetwork
+from scripts.compiled_network import network_cache
+from scripts.fitness_cache import FitnessCache
+from scripts.scenarios import ScenarioSet
+from scripts.scene_pool import scene_pool
+from scripts.worker_pool import WorkerPool
+from scripts.distributed import PORT, Coordinator, run_workers
+from scripts.async_evolution import SteadyStateEvolution
+from scripts.profiler import profiler
+from scripts.trajectory import EpisodeFile, save_episodes, show_step
+from scripts.episode_store import get_writer
+from scripts.event_log import event_log, DEBUG, INFO
+from scripts.genome_archive import GenomeArchive, ArchiveReporter
+from scripts.checkpoint import Checkpointer, load_checkpoint, restore_population
 from scripts.logging import Logger
 
 pygame.font.init()
 
 NUM_TARGETS = 1
 RUNS_PER_NET = 5
+USE_MULTI_SCENE = False # run all of a genome's scenarios side by side in one physics space (see MultiScene)
+MAX_STEPS = 1000
 SCR_WIDTH = 640
 SCR_HEIGHT = 640
-SAVE_NETS = True
+SAVE_NETS = True # archive every generation's best genomes under NETS_DIR/R-<run number>, see GenomeArchive
+NETS_DIR = "nets"
+ARCHIVE_ELITES = 5 # fittest genomes archived each generation, on top of the best of every species
+GENERATIONS = 100
+CHECKPOINTS = True # checkpoint the population every generation under CHECKPOINT_DIR/R-<run number>, carry on with --resume
+CHECKPOINT_DIR = "checkpoints"
+CHECKPOINT_BASE_EVERY = 10 # generations between full checkpoints, the rest only have the new genomes
+PHYSICS_PROFILE = "default" # one of PHYSICS_PROFILES, pick with python -m scripts.physics_drift
+NUM_RAYS = 0 # rays in the ray sensor, each adds (distance, hit type) to the net inputs so num_inputs in config.conf has to be 8 + 2 * NUM_RAYS
+NUM_WORKERS = multiprocessing.cpu_count()
+CHUNK_SIZE = 4 # genomes sent to a worker at a time
+EVAL_CONFIG_ATTRIBUTES = ("scenario_seeds", "racing_threshold", "profiling", "profile_genome", "generation",
+                          "log_level", "log_sample_rates") # per generation settings workers need
+HEADLESS_TRAINING = True # training workers never draw, the surfaces would never be looked at
+USE_BATCH_SCENE = False # evaluate the whole population in one vectorized BatchScene
+USE_FITNESS_CACHE = True # skip re-evaluating unchanged genomes (elites). Needs the same seeded scenarios every generation,
+                          # so it's turned off when RESAMPLE_SCENARIOS is on: resampling scores genomes on more layouts
+                          # (less overfitting) but every genome has to be simulated every generation
+FITNESS_CACHE_PATH = None # e.g. "fitness-cache.json" to keep the cache between runs
+SCENARIO_SEED = 0 # master seed for the scenario layouts, makes training reproducible
+# draw new layouts every generation instead of reusing the first ones, off by default while the fitness cache
+# is on as the cache only ever hits when the layouts stay the same (see USE_FITNESS_CACHE)
+RESAMPLE_SCENARIOS = not USE_FITNESS_CACHE
+# stop evaluating genomes once they can't make the last generation's survival cut. Those genomes get MIN_FITNESS
+# instead of their real fitness, so it changes selection too: they all rank last in their species & pull its mean
+# fitness (& offspring) down more than their real fitness would
+RACING = False
+RACING_MARGIN = 0.9 # fraction of the survival cut used as the racing threshold (species select on their own)
+ASYNC_EVOLUTION = False # steady state evolution without generation barriers (local worker pool only)
+ASYNC_IN_FLIGHT = NUM_WORKERS * 2 # genomes being evaluated at any time in async mode
+ASYNC_MAX_EVALUATIONS = 100 * 100 # about as many evaluations as 100 generations of 100 genomes
+MIN_FITNESS = 0.0 # get_final_fitness() never scores a run lower
+PROFILE = False # time the phases of every simulation step & print a report each generation (not for USE_BATCH_SCENE)
+PROFILE_GENOME = None # key of a genome to write a flamegraph stack file for when it's evaluated
+PROFILE_STACKS_PATH = "profile-genome-{}.folded" # formatted with the genome key
+LOG_PATH = "events.jsonl" # structured log of the training run, written by its own process
+LOG_LEVEL = INFO # INFO logs every genome & generation, DEBUG adds every run & (sampled) step
+LOG_SAMPLE_RATES = {"step": 0.01} # fraction of each event's records kept
+RECORD_WINNER = True # record the winner's runs after training, watch them with --replay
+RECORDINGS_PATH = "episodes.npz"
+RECORD_EPISODES_DIR = None # e.g. "episode-store" to record every training run into an EpisodeStore, each worker appending its own shard
+REPLAY_SPEEDS = (0.125, 0.25, 0.5, 1, 2, 4, 8, 16, 32) # recorded steps per frame in replay mode
+REPLAY_BAR_HEIGHT = 8 # progress bar along the bottom in replay mode, click or drag near it to scrub
+SIM_RATE = 60 # simulation steps per second the viewer runs at 1x, whatever the frame rate
+SIM_SPEEDS = (0.25, 0.5, 1, 2, 4, 8, 16, 64, math.inf) # viewer speeds, inf runs as many steps as fit in FRAME_BUDGET
+FRAME_BUDGET = 0.012 # seconds of simulation per frame at most, the viewer slows down rather than dropping frames
+WATCH_TOP_K = 4 # best genomes shown side by side after training
 
 global run_num
 run_num = 0
@@ -41,14 +106,47 @@ class App:
 
         self.scenes = []
         
-        self.scene = Scene(width=self.screen.get_width(), height=self.screen.get_height(), num_targets=NUM_TARGETS)
+        self.scene = Scene(width=self.screen.get_width(), height=self.screen.get_height(), num_targets=NUM_TARGETS, num_rays=NUM_RAYS,
+                           physics_profile=PHYSICS_PROFILES[PHYSICS_PROFILE])
+
+        # viewer, steps at SIM_RATE (times the speed) & draws the latest state each frame
+        self.viewer = [(self.scene, None, None)] # (scene, network, genome) shown side by side, see watch()
+        self.viewer_done = [False]
+        self.sim_speed = SIM_SPEEDS.index(1)
+        self.sim_paused = False
+        self.steps_due = 0.0 # steps the viewer is behind
+        self.steps_per_frame = 0
+        self.view_surf = None # the scenes tiled together when there's more than one
 
         self.scene_surf = pygame.Surface((0, 0))
+        self.changed_rects = None # areas of scene_surf changed since the last draw(), None redraws all of it
+        self.text_rects = [] # drawn over the scene by the last draw()
+        self.display_rects = None # areas of the screen the last draw() changed, None for all of it
+
+        # replay mode (see load_replay())
+        self.replay = None
+        self.replay_scene = None
+        self.replay_step = 0.0
+        self.replay_speed = REPLAY_SPEEDS.index(1)
+        self.replay_paused = False
 
         # NEAT stuff
         self.pop = None # population
+        self.stats = None
         self.pe = None # population evaluator
         self.config = None
+        self.archive = None # this training run's GenomeArchive
+        self.checkpointer = None
+        self.fitness_cache = None
+        if USE_FITNESS_CACHE and RESAMPLE_SCENARIOS:
+            print("Fitness cache: off, nothing would ever hit with RESAMPLE_SCENARIOS on")
+        elif USE_FITNESS_CACHE:
+            self.fitness_cache = FitnessCache(path=FITNESS_CACHE_PATH, settings=self.get_fitness_settings())
+            if self.fitness_cache.stale:
+                print(f"Fitness cache: {FITNESS_CACHE_PATH} was made with other settings, starting over")
+        self.scenarios = ScenarioSet(RUNS_PER_NET, seed=SCENARIO_SEED, resample=RESAMPLE_SCENARIOS)
+        self.scenario_seeds = None # seeds of the scenarios every genome is evaluated on
+        self.racing_threshold = None
         
         # logging
         self.log_file = None
@@ -63,13 +161,29 @@ class App:
                 global run_num
                 run_num = int(data["run"]["RUN_NUM"])
         except FileNotFoundError:
-            with open("cache.toml", "w") as f:
-                f.write(
-                    """
-                    [run]
-                    RUN_NUM = 0
-                    """
-                )
+            self.save_cache()
+
+    def save_cache(self):
+        with open("cache.toml", "w") as f:
+            f.write(f"[run]\nRUN_NUM = {run_num}\n")
+
+    @staticmethod
+    def get_archive_dir(run) -> str:
+        return os.path.join(os.path.dirname(os.path.abspath(__file__)), NETS_DIR, f"R-{run}")
+
+    @staticmethod
+    def get_checkpoint_dir(run) -> str:
+        return os.path.join(os.path.dirname(os.path.abspath(__file__)), CHECKPOINT_DIR, f"R-{run}")
+
+    def get_checkpoint_state(self) -> dict:
+        # what evaluate() needs to score the next generation the same way
+        return {"scenario_seed": self.scenarios.seed, "scenario_generation": self.scenarios.generation,
+                "racing_threshold": self.racing_threshold}
+
+    def set_checkpoint_state(self, state: dict):
+        self.scenarios.seed = state["scenario_seed"]
+        self.scenarios.generation = state["scenario_generation"]
+        self.racing_threshold = state["racing_threshold"]
     
     def init_log(self, local_log_path):
         local_dir = os.path.dirname(__file__)
@@ -82,53 +196,289 @@ class App:
         self.log_file.close()
     
     @staticmethod
-    def evaluate_genome(genome, config):
-        print("Evaluating genome ", genome)
-        net = neat.nn.FeedForwardNetwork.create(genome, config)
-        print("Created net...")
-        fitnesses = []
+    def get_training_scene_settings() -> dict:
+        # the network only gets the closest target, so that's all the scene has to look for
+        return dict(width=SCR_WIDTH, height=SCR_HEIGHT, num_targets=NUM_TARGETS, headless=HEADLESS_TRAINING, max_seen=1,
+                    num_rays=NUM_RAYS, physics_profile=PHYSICS_PROFILES[PHYSICS_PROFILE])
 
-        for run in range(RUNS_PER_NET):
-            sim = Scene(width=SCR_WIDTH, height=SCR_HEIGHT, num_targets=NUM_TARGETS)
-            fitness = 1000.0
-            while sim.step < 1000.0:
-                fitness = 1000.0 - sim.step
-                inputs = sim.get_net_inputs()
+    @staticmethod
+    def get_fitness_settings() -> dict:
+        # everything besides the genome & the seeds that changes a fitness, for the fitness cache
+        settings = App.get_training_scene_settings()
+        del settings["headless"]
+        settings["physics_profile"] = repr(settings["physics_profile"])
+        return dict(settings, max_steps=MAX_STEPS, batch_scene=USE_BATCH_SCENE, multi_scene=USE_MULTI_SCENE)
+
+    @staticmethod
+    def evaluate_run(net, seed=None, threshold=None, run_info=None):
+        """
+        Simulates one run of a network on a pooled scene & returns (fitness, steps skipped)\n
+        run_info: (genome_id, run, generation) of the run for the log, & to record it to RECORD_EPISODES_DIR with
+        """
+        start = time.perf_counter()
+        # reset a scene this worker already built instead of building a new pymunk space, the
+        # warm up steps can't depend on the network so they're forked from a shared snapshot
+        sim = scene_pool.get_warm(seed, **App.get_training_scene_settings())
+        recording = RECORD_EPISODES_DIR and run_info is not None
+        if recording:
+            sim.start_recording(MAX_STEPS)
+        result = App.run_scene(sim, net, threshold)
+        if recording:
+            App.save_recording(sim, result[0], run_info)
+        if run_info is not None:
+            App.log_run(sim, result, run_info, time.perf_counter() - start)
+        scene_pool.release(sim)
+        if profiler.enabled:
+            profiler.flush()
+        return result
+
+    @staticmethod
+    def run_scene(sim, net, threshold=None):
+        """
+        Runs a network on a scene until it's done & returns (fitness, steps skipped)\n
+        threshold: stops as soon as the run can't reach this fitness anymore,
+        the fitness returned is then MIN_FITNESS, the only score the run is sure to have got
+        """
+        fitness = 1000.0
+        profiling = profiler.enabled
+        tracing = event_log.is_enabled(DEBUG, "step")
+        while sim.step < MAX_STEPS:
+            fitness = MAX_STEPS - sim.step
+            # best case from here is reaching the target on this step
+            upper_bound = fitness + 200 + SCR_WIDTH + SCR_HEIGHT
+            if threshold is not None and upper_bound < threshold:
+                return MIN_FITNESS, MAX_STEPS - sim.step
+
+            inputs = sim.get_net_inputs()
+            if profiling:
+                start = time.perf_counter_ns()
                 output = net.activate(inputs)
-                # print(f"Output: {output}")
-
-                if not sim.get_ready():
-                    if output[2] >= 0.5:
-                        fitness -= 4.0
-
-                surf = sim.tick(output, True)
-                
-                # check distance
-                target = sim.get_closest_target()
-                if target:
-                    if target.distance < sim.robot.dimensions[0] * 0.7:
-                        fitness += 200
-                        break
-            
-            target = sim.get_closest_target()
-            fitness += SCR_WIDTH + SCR_HEIGHT
-            if target:
-                fitness -= target.distance
+                profiler.lap("activate", start)
             else:
-                fitness -= SCR_WIDTH + SCR_HEIGHT
-            fitnesses.append(max(0, fitness))
+                output = net.activate(inputs)
+            # print(f"Output: {output}")
 
-            print(f"Run: {run}")
+            if not sim.get_ready():
+                if output[2] >= 0.5:
+                    fitness -= 4.0
+            if tracing and event_log.sample("step"):
+                event_log.add(DEBUG, "step", dict(seed=sim.seed, step=sim.step, inputs=list(inputs), outputs=list(output), fitness=fitness))
 
-        net_dir = os.path.join(os.path.dirname(__file__), "/nets/")
-        global run_num
-        run_path = f"R-{run_num}"
-        if not (run_path in os.listdir(net_dir)):
-            os.mkdir(run_path)
-        with open(os.path.join(net_dir, f"/{id(genome)}")) as f:
-            pass
+            surf = sim.tick(output, not HEADLESS_TRAINING)
+            
+            # check distance
+            if App.reached_target(sim):
+                fitness += 200
+                break
         
-        return min(fitnesses)
+        return App.get_final_fitness(sim, fitness), 0
+
+    @staticmethod
+    def log_run(sim, result, run_info: dict, seconds):
+        fitness, steps_skipped = result
+        event_log.debug("run", genome=run_info["genome_id"], run=run_info["run"], seed=sim.seed, fitness=fitness,
+                        steps=sim.step, steps_skipped=steps_skipped, seconds=seconds)
+
+    @staticmethod
+    def save_recording(sim, fitness, episode: dict):
+        # appends a finished run to this process' shard of the episode store
+        recorder = sim.stop_recording()
+        get_writer(RECORD_EPISODES_DIR).append(recorder.get_episode(seed=sim.seed, fitness=fitness, reached_target=App.reached_target(sim), **episode))
+
+    @staticmethod
+    def reached_target(sim) -> bool:
+        target = sim.get_closest_target()
+        return bool(target) and target.distance < sim.robot.dimensions[0] * 0.7
+
+    @staticmethod
+    def get_final_fitness(sim, fitness) -> float:
+        # closer to the target at the end is better
+        target = sim.get_closest_target()
+        fitness += SCR_WIDTH + SCR_HEIGHT
+        if target:
+            fitness -= target.distance
+        else:
+            fitness -= SCR_WIDTH + SCR_HEIGHT
+        return max(MIN_FITNESS, fitness)
+
+    @staticmethod
+    def run_scenes(multi, net, threshold=None) -> list:
+        """
+        run_scene() for every scene of a MultiScene in lockstep, returns [(fitness, steps skipped)].
+        With a threshold every run stops as soon as one of them can't reach it (the genome only scores its worst run)
+        """
+        sims = multi.scenes
+        fitnesses = [1000.0] * len(sims)
+        results = [None] * len(sims)
+        active = [True] * len(sims)
+        profiling = profiler.enabled
+        tracing = event_log.is_enabled(DEBUG, "step")
+        while any(active):
+            outputs = [None] * len(sims)
+            for i, sim in enumerate(sims):
+                if not active[i]:
+                    continue
+                if sim.step >= MAX_STEPS:
+                    results[i] = App.get_final_fitness(sim, fitnesses[i]), 0
+                    active[i] = False
+                    continue
+                fitness = MAX_STEPS - sim.step
+                upper_bound = fitness + 200 + SCR_WIDTH + SCR_HEIGHT
+                if threshold is not None and upper_bound < threshold:
+                    # settles the genome, the other runs get the lowest fitness too
+                    for j, other in enumerate(sims):
+                        if active[j]:
+                            results[j] = MIN_FITNESS, MAX_STEPS - other.step
+                    return results
+
+                inputs = sim.get_net_inputs()
+                if profiling:
+                    start = time.perf_counter_ns()
+                    output = net.activate(inputs)
+                    profiler.lap("activate", start)
+                else:
+                    output = net.activate(inputs)
+                if not sim.get_ready() and output[2] >= 0.5:
+                    fitness -= 4.0
+                if tracing and event_log.sample("step"):
+                    event_log.add(DEBUG, "step", dict(seed=sim.seed, step=sim.step, inputs=list(inputs), outputs=list(output), fitness=fitness))
+                fitnesses[i] = fitness
+                outputs[i] = output
+
+            multi.tick(outputs, active)
+
+            for i, sim in enumerate(sims):
+                if outputs[i] is not None and App.reached_target(sim):
+                    fitnesses[i] += 200
+                    results[i] = App.get_final_fitness(sim, fitnesses[i]), 0
+                    active[i] = False
+        return results
+
+    @staticmethod
+    def run_genome(genome, config, threshold=None):
+        """
+        Evaluates a genome on every scenario & returns (fitness, steps saved by racing)
+        """
+        start = time.perf_counter()
+        event_log.configure(getattr(config, "log_level", None), getattr(config, "log_sample_rates", None))
+        # compiled once per structure, elites carried over by reproduction come straight from the cache
+        net = network_cache.get(genome, config)
+        fitnesses = []
+        steps_saved = 0
+        profiler.enabled = getattr(config, "profiling", False)
+        record_stacks = profiler.enabled and genome.key == getattr(config, "profile_genome", None)
+
+        # the scenario seeds for this generation come along with the config (see App.evaluate)
+        seeds = getattr(config, "scenario_seeds", None) or [None] * RUNS_PER_NET
+        generation = getattr(config, "generation", None) or 0
+        if USE_MULTI_SCENE:
+            multi = scene_pool.get_multi_warm(list(seeds), **App.get_training_scene_settings())
+            if RECORD_EPISODES_DIR:
+                for sim in multi.scenes:
+                    sim.start_recording(MAX_STEPS)
+            if record_stacks:
+                # the runs step together, so there's one stack for all of them
+                profiler.stack = f"genome {genome.key};all runs"
+            results = App.run_scenes(multi, net, threshold)
+            profiler.stack = None
+            seconds = time.perf_counter() - start
+            for run, (sim, result) in enumerate(zip(multi.scenes, results)):
+                run_info = dict(genome_id=genome.key, run=run, generation=generation)
+                if RECORD_EPISODES_DIR:
+                    App.save_recording(sim, result[0], run_info)
+                # the runs share the time
+                App.log_run(sim, result, run_info, seconds / len(results))
+            scene_pool.release(multi)
+            if profiler.enabled:
+                profiler.flush()
+            fitnesses = [fitness for fitness, steps_skipped in results]
+            steps_saved = sum(steps_skipped for fitness, steps_skipped in results)
+        else:
+            for run, seed in enumerate(seeds):
+                if record_stacks:
+                    profiler.stack = f"genome {genome.key};run {run}"
+                run_info = dict(genome_id=genome.key, run=run, generation=generation)
+                fitness, steps_skipped = App.evaluate_run(net, seed, threshold, run_info)
+                profiler.stack = None
+                fitnesses.append(fitness)
+                steps_saved += steps_skipped
+
+                # the genome only scores its worst run, so one run under the threshold settles it
+                if threshold is not None and fitness < threshold:
+                    steps_saved += MAX_STEPS * (len(seeds) - run - 1)
+                    break
+
+        # the runs that were skipped could have scored anything down to MIN_FITNESS, anything higher would
+        # be an upper bound that inflates the genome's standing in its species
+        fitness = MIN_FITNESS if steps_saved else min(fitnesses)
+        event_log.info("genome", genome=genome.key, generation=generation, fitness=fitness, runs=len(fitnesses),
+                       steps_saved=steps_saved, nodes=len(genome.nodes), connections=len(genome.connections),
+                       seconds=time.perf_counter() - start)
+        return fitness, steps_saved
+
+    @staticmethod
+    def record_genomes(genomes, config) -> list:
+        """
+        Runs each (genome id, genome) on every scenario again with the scene recording, returns the Episodes
+        """
+        episodes = []
+        seeds = getattr(config, "scenario_seeds", None) or [None] * RUNS_PER_NET
+        for genome_id, genome in genomes:
+            net = network_cache.get(genome, config)
+            for run, seed in enumerate(seeds):
+                sim = scene_pool.get_warm(seed, **App.get_training_scene_settings())
+                sim.start_recording(MAX_STEPS)
+                fitness, steps_skipped = App.run_scene(sim, net)
+                episodes.append(sim.stop_recording().get_episode(genome_id, run, seed, fitness))
+                scene_pool.release(sim)
+        return episodes
+
+    @staticmethod
+    def evaluate_genome(genome, config):
+        # genomes get archived by the training process once a generation is evaluated, see ArchiveReporter
+        fitness, steps_saved = App.run_genome(genome, config)
+        return fitness
+
+    @staticmethod
+    def evaluate_genome_racing(genome, config):
+        return App.run_genome(genome, config, getattr(config, "racing_threshold", None))
+
+    @staticmethod
+    def init_worker(config):
+        # build a scene up front so the first genome doesn't pay for it
+        scene_pool.release(scene_pool.get(**App.get_training_scene_settings()))
+
+    def evaluate_pool(self, genomes, config) -> set:
+        """
+        Evaluates the genomes on the worker pool. Returns the ids of genomes that were
+        stopped early by racing, their fitness is only a lower bound
+        """
+        results = self.pe.evaluate(genomes, config)
+
+        raced = {genome_id for genome_id, (fitness, steps_saved) in results.items() if steps_saved}
+        if RACING:
+            steps_saved = sum(steps_saved for fitness, steps_saved in results.values())
+            print(f"Racing: threshold {config.racing_threshold}, stopped {len(raced)} genomes early, saved {steps_saved} steps")
+        return raced
+
+    @staticmethod
+    def evaluate_genomes_batched(genomes, config):
+        """
+        Evaluates every run of every genome in lockstep with a BatchScene
+        """
+        # one forward pass per step for the whole population
+        net = BatchNetwork.create([genome for genome_id, genome in genomes], config)
+
+        def policy(inputs):
+            # rows are genome major, so they reshape straight into per genome batches
+            outputs = net.activate(inputs.reshape(net.num_genomes, -1, inputs.shape[1]))
+            return outputs.reshape(len(inputs), -1)
+
+        seeds = getattr(config, "scenario_seeds", None)
+        runs = len(seeds) if seeds else RUNS_PER_NET
+        fitnesses = evaluate_population(policy, net.num_genomes, runs, num_targets=NUM_TARGETS, width=SCR_WIDTH, height=SCR_HEIGHT, seeds=seeds)
+        for (genome_id, genome), fitness in zip(genomes, fitnesses):
+            genome.fitness = float(fitness)
 
     @staticmethod
     def evaluate_genomes(genomes, config):
@@ -140,44 +490,332 @@ class App:
         pygame.quit()
         sys.exit()
     
-    def update(self, NN=None):
-        self.scene.draw_debug_joints = self.show_debug_joints
-        output = ()
-        if NN:
-            inputs = self.scene.get_net_inputs()
-            output = NN.activate(inputs)
+    def watch(self, genomes):
+        """
+        Shows the genomes side by side in run(), each driving its own scene of the same layout
+        """
+        self.viewer = []
+        for genome in genomes:
+            scene = Scene(width=self.screen.get_width(), height=self.screen.get_height(), num_targets=NUM_TARGETS, num_rays=NUM_RAYS,
+                          physics_profile=PHYSICS_PROFILES[PHYSICS_PROFILE], seed=self.scene_num)
+            self.viewer.append((scene, network_cache.get(genome, self.config), genome))
+        self.reset_viewer()
+
+    def reset_viewer(self):
+        # Scene No. is the seed of the layout
+        for scene, net, genome in self.viewer:
+            scene.reset(self.scene_num)
+        self.viewer_done = [False] * len(self.viewer)
+        self.steps_due = 0.0
+        self.changed_rects = None
+
+    def step_viewer(self):
+        # one step of every scene that hasn't finished its run
+        for i, (scene, net, genome) in enumerate(self.viewer):
+            if self.viewer_done[i]:
+                continue
+            output = net.activate(scene.get_net_inputs()) if net else ()
+            scene.tick(output)
+            if net:
+                self.viewer_done[i] = scene.step >= MAX_STEPS or App.reached_target(scene)
+
+    def update(self):
+        """
+        Runs the steps due since the last frame (fixed timestep), then draws the latest state
+        """
+        if not self.sim_paused:
+            self.steps_due += self.dt / 60 * SIM_RATE * SIM_SPEEDS[self.sim_speed]
+        deadline = time.perf_counter() + FRAME_BUDGET
+        self.steps_per_frame = 0
+        while self.steps_due >= 1 and not all(self.viewer_done):
+            self.step_viewer()
+            self.steps_due -= 1
+            self.steps_per_frame += 1
+            if time.perf_counter() > deadline:
+                # can't keep up, carrying the backlog over would only make it worse
+                self.steps_due = 0.0
+        if all(self.viewer_done):
+            self.steps_due = 0.0
 
-        self.scene_surf = self.scene.tick(output, True)
+        for scene, net, genome in self.viewer:
+            scene.draw_debug_joints = self.show_debug_joints
+            scene.draw()
+        if len(self.viewer) == 1:
+            self.scene_surf = self.viewer[0][0].screen
+            self.changed_rects = self.viewer[0][0].changed_rects
+        else:
+            self.scene_surf = self.tile_viewer()
+            self.changed_rects = None
+
+    def tile_viewer(self) -> pygame.Surface:
+        # every scene scaled down into a grid filling the screen
+        if self.view_surf is None or self.view_surf.get_size() != self.screen.get_size():
+            self.view_surf = pygame.Surface(self.screen.get_size())
+        self.view_surf.fill((0, 0, 0))
+        columns = math.ceil(math.sqrt(len(self.viewer)))
+        rows = math.ceil(len(self.viewer) / columns)
+        width = self.screen.get_width() // columns
+        height = self.screen.get_height() // rows
+        for i, (scene, net, genome) in enumerate(self.viewer):
+            x, y = i % columns * width, i // columns * height
+            self.view_surf.blit(pygame.transform.scale(scene.screen, (width - 2, height - 2)), (x + 1, y + 1))
+            if genome is not None:
+                fitness = f"{genome.fitness:.1f}" if genome.fitness is not None else "?"
+                label = self.font.render(f"Genome {genome.key} ({fitness})", False, (255, 200, 200), (0, 0, 0))
+                self.view_surf.blit(label, (x + width - label.get_width() - 1, y + 1))
+        return self.view_surf
+
+    def handle_viewer_event(self, event):
+        """
+        space: pause, right / . : one step while paused, up/down: faster/slower, r: restart, j/k: other layout
+        """
+        if event.type != pygame.KEYDOWN:
+            return
+        if event.key == pygame.K_SPACE:
+            self.sim_paused = not self.sim_paused
+        if event.key in (pygame.K_RIGHT, pygame.K_PERIOD) and self.sim_paused:
+            self.steps_due += 1
+        if event.key == pygame.K_UP:
+            self.sim_speed = min(self.sim_speed + 1, len(SIM_SPEEDS) - 1)
+        if event.key == pygame.K_DOWN:
+            self.sim_speed = max(self.sim_speed - 1, 0)
+        if event.key in (pygame.K_r, pygame.K_j, pygame.K_k):
+            self.reset_viewer()
 
     def draw(self):
-        self.screen.fill((0, 0, 0))
-        self.screen.blit(self.scene_surf, (0, 0))
+        if self.changed_rects is None:
+            self.screen.fill((0, 0, 0))
+            self.screen.blit(self.scene_surf, (0, 0))
+            self.display_rects = None
+        else:
+            # only what the scene changed, & the text from last frame in case it got shorter
+            self.display_rects = self.changed_rects + self.text_rects
+            for rect in self.display_rects:
+                self.screen.blit(self.scene_surf, rect, rect)
         
+        bottom = self.screen.get_height() - (REPLAY_BAR_HEIGHT if self.replay else 0)
         font_surf = self.font.render(f"Scene No.{self.scene_num}", False, (255, 200, 200), (0, 0, 0))
-        self.screen.blit(font_surf, (0, self.screen.get_height() - font_surf.get_height()))
+        self.text_rects = [self.screen.blit(font_surf, (0, bottom - font_surf.get_height()))]
+        if self.replay:
+            self.text_rects += self.draw_replay_bar()
+        if self.display_rects is not None:
+            self.display_rects += self.text_rects
     
-    def loadNN(self):
+    def load_config(self):
         local_dir = os.path.dirname(__file__)
         config_path = os.path.join(local_dir, 'config.conf')
         self.config = neat.Config(neat.DefaultGenome, neat.DefaultReproduction,
                             neat.DefaultSpeciesSet, neat.DefaultStagnation,
                             config_path)
+        if self.config.genome_config.num_inputs != 8 + 2 * NUM_RAYS:
+            raise ValueError(f"num_inputs in config.conf should be {8 + 2 * NUM_RAYS} with NUM_RAYS = {NUM_RAYS}")
+
+    def loadNN(self, coordinator_address=None, resume=None):
+        """
+        coordinator_address: (host, port) to listen on for remote workers, otherwise a local worker pool is used
+        resume: number of a training run to carry on from its latest checkpoint, instead of starting a new one
+        """
+        self.load_config()
+        if USE_BATCH_SCENE and NUM_RAYS:
+            raise ValueError("BatchScene doesn't simulate the ray sensor, set NUM_RAYS = 0 to use it")
         
-        self.pop = neat.Population(self.config)
+        global run_num
+        if resume is None:
+            # every training run gets its own archive & checkpoints
+            run_num += 1
+            self.save_cache()
+            self.pop = neat.Population(self.config)
+        else:
+            run_num = resume
+            checkpoint = load_checkpoint(self.get_checkpoint_dir(resume))
+            if checkpoint is None:
+                raise ValueError(f"no checkpoints in {self.get_checkpoint_dir(resume)}")
+            self.pop = restore_population(checkpoint, self.config)
+            self.set_checkpoint_state(checkpoint.state)
+            print(f"Resuming run {resume} at generation {self.pop.generation}")
+
         stats = neat.StatisticsReporter()
+        self.stats = stats
         self.pop.add_reporter(stats)
         self.pop.add_reporter(neat.StdOutReporter(True))
+        if SAVE_NETS:
+            self.archive = GenomeArchive(self.get_archive_dir(run_num))
+            # anything archived after the checkpoint gets archived again
+            self.archive.drop_from(self.pop.generation)
+            self.pop.add_reporter(ArchiveReporter(self.archive, ARCHIVE_ELITES))
+            print(f"Archiving genomes to {self.archive.directory}")
+        # async evolution doesn't go through Population.run(), so there's nothing to resume
+        if CHECKPOINTS and not ASYNC_EVOLUTION:
+            self.checkpointer = Checkpointer(self.get_checkpoint_dir(run_num), self.pop, CHECKPOINT_BASE_EVERY,
+                                             get_state=self.get_checkpoint_state)
+            self.pop.add_reporter(self.checkpointer)
 
-        self.pe = neat.ParallelEvaluator(multiprocessing.cpu_count(), self.evaluate_genome)
+        # workers get the config once, the per generation settings come with each chunk of genomes
+        if coordinator_address:
+            host, port = coordinator_address
+            self.pe = Coordinator(self.config, host, port, chunk_size=CHUNK_SIZE, config_attributes=EVAL_CONFIG_ATTRIBUTES)
+            print(f"Waiting for workers on {host}:{port}...")
+        else:
+            self.pe = WorkerPool(NUM_WORKERS, self.evaluate_genome_racing, self.config, chunk_size=CHUNK_SIZE,
+                                 initializer=self.init_worker, config_attributes=EVAL_CONFIG_ATTRIBUTES)
+
+    def evaluate(self, genomes, config):
+        # every genome gets scored on the same layouts this generation, workers get the seeds with the config
+        self.scenario_seeds = self.scenarios.next_generation()
+        config.scenario_seeds = self.scenario_seeds
+
+        config.racing_threshold = self.racing_threshold
+        config.generation = self.scenarios.generation
+        config.log_level = LOG_LEVEL
+        config.log_sample_rates = LOG_SAMPLE_RATES
+        config.profiling = PROFILE
+        config.profile_genome = PROFILE_GENOME
+        if PROFILE:
+            self.pe.profile.reset()
+
+        start = time.perf_counter()
+        eval_function = self.evaluate_genomes_batched if USE_BATCH_SCENE else self.evaluate_pool
+        # cached fitnesses are only valid if every genome runs on the same seeded scenarios
+        if self.fitness_cache is None or self.scenario_seeds is None:
+            eval_function(genomes, config)
+        else:
+            self.fitness_cache.evaluate(eval_function, genomes, config, self.scenario_seeds)
+            print(f"Fitness cache: {self.fitness_cache.hits} hits, {self.fitness_cache.misses} misses")
+
+        fitnesses = [genome.fitness for genome_id, genome in genomes]
+        event_log.info("generation", generation=config.generation, genomes=len(genomes), best=max(fitnesses),
+                       mean=sum(fitnesses) / len(fitnesses), seconds=time.perf_counter() - start)
+        event_log.flush()
+
+        if PROFILE and not USE_BATCH_SCENE:
+            print("Profile:\n" + self.pe.profile.summary())
+            if self.pe.profile.stacks:
+                self.pe.profile.write_stacks(PROFILE_STACKS_PATH.format(PROFILE_GENOME))
+
+        if RACING:
+            # next generation races against this generation's survival cut
+            fitnesses = sorted((genome.fitness for genome_id, genome in genomes), reverse=True)
+            cut = max(1, math.ceil(config.reproduction_config.survival_threshold * len(fitnesses)))
+            self.racing_threshold = fitnesses[cut - 1] * RACING_MARGIN
+
+    def evolve_async(self):
+        if not isinstance(self.pe, WorkerPool):
+            raise RuntimeError("async evolution needs the local worker pool")
+        # the population keeps genomes from different points in time, so they all have to be
+        # scored on the same scenarios
+        self.scenario_seeds = self.scenarios.get_seeds(0)
+        self.config.scenario_seeds = self.scenario_seeds
+        self.config.racing_threshold = None
+
+        evolution = SteadyStateEvolution(self.pop, self.pe, ASYNC_IN_FLIGHT, report_every=self.config.pop_size)
+        return evolution.run(ASYNC_MAX_EVALUATIONS)
 
     def trainNN(self):
         print("Running...")
-        winner = self.pop.run(self.pe.evaluate, 100)
+        if ASYNC_EVOLUTION:
+            winner = self.evolve_async()
+        else:
+            winner = self.pop.run(self.evaluate, GENERATIONS - self.pop.generation)
+        # let the workers exit cleanly, they inherit SDL's signal handlers so terminating them doesn't work
+        self.pe.close()
+        if self.archive:
+            self.archive.close()
+        if self.checkpointer:
+            self.checkpointer.close()
 
         with open('winner-feedforward', 'wb') as f:
             pickle.dump(winner, f)
+        if RECORD_WINNER:
+            save_episodes(RECORDINGS_PATH, self.record_genomes([(winner.key, winner)], self.config))
         
         self.winner = winner
+
+    def get_top_genomes(self, k) -> list:
+        # best of every generation, falling back to the winner if the stats didn't get any
+        genomes = self.stats.best_unique_genomes(k) if self.stats else []
+        return genomes or [self.winner]
+
+    def load_archived(self, run=None, k=WATCH_TOP_K, generation=None) -> list:
+        """
+        Fittest k distinct genomes archived by a training run (the latest by default), optionally from one generation
+        """
+        start = time.perf_counter()
+        archive = GenomeArchive(self.get_archive_dir(run_num if run is None else run))
+        genomes = [archive.load(i, self.config) for i in archive.best(k, generation)]
+        if not genomes:
+            raise ValueError(f"nothing archived in {archive.directory}")
+        print(f"Loaded {len(genomes)} of {len(archive)} archived genomes in {(time.perf_counter() - start) * 1000:.1f}ms")
+        return genomes
+
+    def load_replay(self, path):
+        """
+        Switches run() to playing back the episodes in a file from save_episodes() instead of simulating.
+        Scene No. picks the episode, ones without any steps are skipped
+        """
+        replay = EpisodeFile(path)
+        episodes = [i for i, length in enumerate(replay.index["length"].tolist()) if length]
+        if not episodes:
+            replay.close()
+            raise ValueError(f"no episodes with any steps in {path}")
+        self.replay = replay
+        self.replay_episodes = episodes
+        # only used for drawing, its physics never get stepped
+        num_targets = self.replay.get(self.replay_episodes[0]).targets.shape[1]
+        self.replay_scene = Scene(width=self.screen.get_width(), height=self.screen.get_height(), num_targets=num_targets)
+        self.replay_step = 0.0
+
+    def get_replay_episode(self):
+        return self.replay.get(self.replay_episodes[self.scene_num % len(self.replay_episodes)])
+
+    def update_replay(self):
+        episode = self.get_replay_episode()
+        if not self.replay_paused:
+            self.replay_step += REPLAY_SPEEDS[self.replay_speed] * self.dt
+        self.replay_step = min(max(self.replay_step, 0), len(episode) - 1)
+        show_step(self.replay_scene, episode, int(self.replay_step))
+        self.replay_scene.draw()
+        self.scene_surf = self.replay_scene.screen
+        self.changed_rects = self.replay_scene.changed_rects
+
+    def handle_replay_event(self, event):
+        """
+        space: pause, left/right: step back/forward (10 with shift), up/down: faster/slower,
+        home: back to the start, click or drag along the bar at the bottom: scrub
+        """
+        if event.type == pygame.KEYDOWN:
+            step = 10 if event.mod & pygame.KMOD_SHIFT else 1
+            if event.key == pygame.K_SPACE:
+                self.replay_paused = not self.replay_paused
+            if event.key == pygame.K_RIGHT:
+                self.replay_step = int(self.replay_step) + step
+            if event.key == pygame.K_LEFT:
+                self.replay_step = int(self.replay_step) - step
+            if event.key == pygame.K_UP:
+                self.replay_speed = min(self.replay_speed + 1, len(REPLAY_SPEEDS) - 1)
+            if event.key == pygame.K_DOWN:
+                self.replay_speed = max(self.replay_speed - 1, 0)
+            if event.key == pygame.K_HOME:
+                self.replay_step = 0.0
+            if event.key in (pygame.K_j, pygame.K_k):
+                self.replay_step = 0.0
+        clicked = event.type == pygame.MOUSEBUTTONDOWN and event.button == 1
+        dragged = event.type == pygame.MOUSEMOTION and event.buttons[0]
+        if clicked or dragged:
+            x, y = event.pos
+            if y > self.screen.get_height() - REPLAY_BAR_HEIGHT * 3:
+                self.replay_step = x / self.screen.get_width() * len(self.get_replay_episode())
+
+    def draw_replay_bar(self) -> list:
+        # returns the areas drawn over
+        episode = self.get_replay_episode()
+        width = self.screen.get_width()
+        top = self.screen.get_height() - REPLAY_BAR_HEIGHT
+        bar = pygame.draw.rect(self.screen, (60, 60, 60), (0, top, width, REPLAY_BAR_HEIGHT))
+        pygame.draw.rect(self.screen, (255, 200, 200), (0, top, width * (int(self.replay_step) + 1) / len(episode), REPLAY_BAR_HEIGHT))
+        state = "paused" if self.replay_paused else f"x{REPLAY_SPEEDS[self.replay_speed]}"
+        font_surf = self.font.render(f"Genome {episode.genome_id} run {episode.run} fitness {episode.fitness:.1f} {state}",
+                                     False, (255, 200, 200), (0, 0, 0))
+        return [bar, self.screen.blit(font_surf, (width - font_surf.get_width(), top - font_surf.get_height()))]
     
     def run(self):
         while self.running:
@@ -201,19 +839,83 @@ class App:
                         self.show_debug_joints = not self.show_debug_joints
                     if event.key == pygame.K_f:
                         self.scene.see()
+                if self.replay:
+                    self.handle_replay_event(event)
+                else:
+                    self.handle_viewer_event(event)
 
             self.draw()
-            self.update(NN=self.winner)
+            if self.replay:
+                self.update_replay()
+                caption = f'Robot Simulation at {self.clock.get_fps() :.1f} FPS. Scene No. {self.scene_num}'
+            else:
+                self.update()
+                speed = "paused" if self.sim_paused else f"x{SIM_SPEEDS[self.sim_speed]}"
+                caption = (f'Robot Simulation at {self.clock.get_fps() :.1f} FPS, {speed} ({self.steps_per_frame} steps/frame). '
+                           f'Scene No. {self.scene_num}')
 
-            pygame.display.set_caption(f'Robot Simulation at {self.clock.get_fps() :.1f} FPS. Scene No. {self.scene_num}')
-            pygame.display.flip()
+            pygame.display.set_caption(caption)
+            if self.display_rects is None:
+                pygame.display.flip()
+            else:
+                pygame.display.update(self.display_rects)
             self.clock.tick(60)
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Robot simulation & NEAT training")
+    parser.add_argument("mode", nargs="?", default="local", choices=("local", "coordinator", "worker"),
+                        help="local: train with worker processes on this machine, coordinator: train with workers "
+                             "connecting over TCP, worker: evaluate genomes for a coordinator")
+    parser.add_argument("--host", default="localhost", help="address to listen on (coordinator) or connect to (worker)")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--processes", type=int, default=NUM_WORKERS, help="worker processes to start in worker mode")
+    parser.add_argument("--profile", action="store_true", help="print a per phase step profile every generation")
+    parser.add_argument("--profile-genome", type=int, help="write a flamegraph stack file for this genome key")
+    parser.add_argument("--replay", nargs="?", const=RECORDINGS_PATH, help="watch recorded episodes instead of training")
+    parser.add_argument("--watch", nargs="*", metavar="GENOME", help="watch pickled genomes (winner-feedforward by default) instead of training")
+    parser.add_argument("--watch-run", nargs="?", type=int, const=-1, metavar="RUN",
+                        help="watch the best genomes archived by a training run (the latest by default) instead of training")
+    parser.add_argument("--generation", type=int, help="with --watch-run, only genomes archived in this generation")
+    parser.add_argument("--resume", nargs="?", type=int, const=-1, metavar="RUN",
+                        help="carry on a training run (the latest by default) from its last checkpoint")
+    args = parser.parse_args()
+    PROFILE = PROFILE or args.profile or args.profile_genome is not None
+    if args.profile_genome is not None:
+        PROFILE_GENOME = args.profile_genome
+
+    if args.mode == "worker":
+        # workers don't need a window or the log
+        run_workers(args.host, args.port, args.processes, App.evaluate_genome_racing, App.init_worker)
+        sys.exit()
+
+    if args.replay:
+        app = App()
+        app.load_replay(args.replay)
+        app.run()
+    if args.watch is not None:
+        app = App()
+        app.load_config()
+        genomes = []
+        for path in args.watch or ["winner-feedforward"]:
+            with open(path, "rb") as f:
+                genomes.append(pickle.load(f))
+        app.watch(genomes)
+        app.run()
+    if args.watch_run is not None:
+        app = App()
+        app.load_config()
+        app.watch(app.load_archived(None if args.watch_run < 0 else args.watch_run, generation=args.generation))
+        app.run()
+
     logger = Logger()
     sys.stdout = logger
     app = App()
-    app.loadNN()
+    resume = None if args.resume is None else run_num if args.resume < 0 else args.resume
+    app.loadNN(coordinator_address=(args.host, args.port) if args.mode == "coordinator" else None, resume=resume)
+    # after the workers are started, they send their records back with their results
+    event_log.start_writer(LOG_PATH)
     app.trainNN()
+    event_log.close()
+    app.watch(app.get_top_genomes(WATCH_TOP_K))
     app.run()
     logger.close()
\ No newline at end of file
@@ -0,0 +1,110 @@
+import queue
+import random
+
+TOURNAMENT_SIZE = 3
+
+# steady state version of neat.Population.run(), there are no generation barriers
+class SteadyStateEvolution:
+    def __init__(self, population, evaluator, in_flight, report_every, tournament_size=TOURNAMENT_SIZE):
+        """
+        Keeps a fixed number of genomes being evaluated at all times. Whenever a result comes in the
+        genome joins the population (replacing the worst one once it's full) & a new child is bred.\n
+        population: neat.Population, its config, reporters, species set & initial genomes are used
+        evaluator: WorkerPool (anything with submit(genome_id, genome, config, callback, error_callback))
+        in_flight: number of genomes to keep evaluating at once
+        report_every: reporters get a "generation" every this many evaluations
+        tournament_size: number of genomes competing for each parent slot
+        """
+        self.population = population
+        self.config = population.config
+        self.evaluator = evaluator
+        self.in_flight = in_flight
+        self.report_every = report_every
+        self.tournament_size = tournament_size
+
+        self.evaluated = {} # genome id -> genome, the current population
+        self.evaluations = 0
+        self.best_genome = None
+
+    def select(self):
+        contestants = random.sample(list(self.evaluated.values()), min(self.tournament_size, len(self.evaluated)))
+        return max(contestants, key=lambda g: g.fitness)
+
+    def breed(self) -> tuple:
+        reproduction = self.population.reproduction
+        parent1 = self.select()
+        parent2 = self.select()
+
+        key = next(reproduction.genome_indexer)
+        child = self.config.genome_type(key)
+        child.configure_crossover(parent1, parent2, self.config.genome_config)
+        child.mutate(self.config.genome_config)
+        reproduction.ancestors[key] = (parent1.key, parent2.key)
+        return key, child
+
+    def report(self):
+        # speciating is only needed for the reporters, selection doesn't use species
+        generation = self.evaluations // self.report_every
+        reporters = self.population.reporters
+        self.population.species.speciate(self.config, self.evaluated, generation)
+        # the best genome ever might have been replaced already, reporters want one from the population
+        best = max(self.evaluated.values(), key=lambda g: g.fitness)
+        reporters.post_evaluate(self.config, self.evaluated, self.population.species, best)
+        reporters.end_generation(self.config, self.evaluated, self.population.species)
+        reporters.start_generation(generation + 1)
+
+    def run(self, max_evaluations):
+        """
+        Evolves until a genome reaches the fitness threshold or max_evaluations genomes have been
+        evaluated. Returns the best genome found.
+        """
+        results = queue.Queue()
+        pending = list(self.population.population.items())
+        in_flight = {}
+
+        def on_result(genome_id, result):
+            # called from the pool's result thread
+            results.put((genome_id, result, None))
+
+        def on_error(genome_id, error):
+            # otherwise the genome's result would never come & run() would wait for it forever
+            results.put((genome_id, None, error))
+
+        self.population.reporters.start_generation(0)
+        while self.evaluations < max_evaluations:
+            while len(in_flight) < self.in_flight:
+                if pending:
+                    genome_id, genome = pending.pop()
+                elif len(self.evaluated) >= 2:
+                    genome_id, genome = self.breed()
+                else:
+                    break
+                in_flight[genome_id] = genome
+                self.evaluator.submit(genome_id, genome, self.config, on_result, on_error)
+
+            genome_id, result, error = results.get()
+            if error is not None:
+                raise error
+            genome = in_flight.pop(genome_id)
+            genome.fitness = result[0] if isinstance(result, tuple) else result
+            self.evaluations += 1
+
+            self.evaluated[genome_id] = genome
+            if len(self.evaluated) > self.config.pop_size:
+                worst = min(self.evaluated, key=lambda k: self.evaluated[k].fitness)
+                del self.evaluated[worst]
+
+            if self.best_genome is None or genome.fitness > self.best_genome.fitness:
+                self.best_genome = genome
+
+            if self.evaluations % self.report_every == 0:
+                self.report()
+
+            if not self.config.no_fitness_termination and genome.fitness >= self.config.fitness_threshold:
+                self.population.reporters.found_solution(self.config, self.evaluations // self.report_every, genome)
+                break
+
+        # wait for the genomes still being evaluated, so the pool is idle again (their results are dropped)
+        for i in range(len(in_flight)):
+            results.get()
+        return self.best_genome
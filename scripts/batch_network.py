@@ -0,0 +1,90 @@
+import numpy as np
+
+import neat
+
+# a whole generation of feed forward networks packed into padded, layered weight matrices
+class BatchNetwork:
+    def __init__(self, weights, biases, responses, masks, num_inputs, num_outputs):
+        """
+        Use BatchNetwork.create() to build one from genomes.\n
+        weights: (layers, genomes, slots, slots) weights from source slot to destination slot
+        biases, responses, masks: (layers, genomes, slots), masks select the nodes evaluated in each layer
+        Slots are laid out as [inputs..., outputs..., hidden nodes...] for every genome.
+        """
+        self.weights = weights
+        self.biases = biases
+        self.responses = responses
+        self.masks = masks
+        self.num_inputs = num_inputs
+        self.num_outputs = num_outputs
+        self.num_genomes = weights.shape[1]
+        self.num_slots = weights.shape[2]
+
+    @staticmethod
+    def sigmoid(z):
+        # same clamping as neat.activations.sigmoid_activation
+        z = np.clip(5.0 * z, -60.0, 60.0)
+        return 1.0 / (1.0 + np.exp(-z))
+
+    def activate(self, inputs: np.ndarray) -> np.ndarray:
+        """
+        Evaluates every network on its own batch of observations.\n
+        inputs: (genomes, batch, num_inputs) array
+        Returns a (genomes, batch, num_outputs) array.
+        """
+        inputs = np.asarray(inputs, dtype=np.float64)
+        values = np.zeros((self.num_genomes, inputs.shape[1], self.num_slots))
+        values[:, :, :self.num_inputs] = inputs
+
+        for weights, biases, responses, masks in zip(self.weights, self.biases, self.responses, self.masks):
+            node_values = self.sigmoid(biases[:, None, :] + responses[:, None, :] * np.matmul(values, weights))
+            values = np.where(masks[:, None, :], node_values, values)
+
+        return values[:, :, self.num_inputs:self.num_inputs + self.num_outputs]
+
+    @staticmethod
+    def create(genomes, config):
+        """
+        Receives a list of genomes and returns their phenotypes packed into one BatchNetwork.
+        Only the sum aggregation & sigmoid activation (see config.conf) are supported.
+        """
+        input_keys = config.genome_config.input_keys
+        output_keys = config.genome_config.output_keys
+        sum_aggregation = config.genome_config.aggregation_function_defs.get("sum")
+        sigmoid_activation = config.genome_config.activation_defs.get("sigmoid")
+
+        # reuse neat's own pruning & ordering so the results match FeedForwardNetwork.activate()
+        plans = []
+        for genome in genomes:
+            net = neat.nn.FeedForwardNetwork.create(genome, config)
+            slots = {key: i for i, key in enumerate(input_keys + output_keys)}
+            depths = {key: 0 for key in input_keys}
+            nodes = []
+            for node, act_func, agg_func, bias, response, links in net.node_evals:
+                if act_func is not sigmoid_activation or agg_func is not sum_aggregation:
+                    raise ValueError(f"BatchNetwork only supports sigmoid/sum nodes, node {node} of genome {genome.key} isn't one")
+                if node not in slots:
+                    slots[node] = len(slots)
+                depths[node] = 1 + max((depths.get(i, 0) for i, w in links), default=0)
+                nodes.append((node, bias, response, links))
+            plans.append((slots, depths, nodes))
+
+        num_layers = max((max(depths.values()) for slots, depths, nodes in plans), default=0)
+        num_slots = max((len(slots) for slots, depths, nodes in plans), default=len(input_keys) + len(output_keys))
+        num_genomes = len(plans)
+
+        weights = np.zeros((num_layers, num_genomes, num_slots, num_slots))
+        biases = np.zeros((num_layers, num_genomes, num_slots))
+        responses = np.zeros((num_layers, num_genomes, num_slots))
+        masks = np.zeros((num_layers, num_genomes, num_slots), dtype=bool)
+        for g, (slots, depths, nodes) in enumerate(plans):
+            for node, bias, response, links in nodes:
+                layer = depths[node] - 1
+                slot = slots[node]
+                masks[layer, g, slot] = True
+                biases[layer, g, slot] = bias
+                responses[layer, g, slot] = response
+                for i, w in links:
+                    weights[layer, g, slots[i], slot] += w
+
+        return BatchNetwork(weights, biases, responses, masks, len(input_keys), len(output_keys))
@@ -0,0 +1,220 @@
+import math
+import random
+
+import numpy as np
+
+from .scene import FOV, LOOK_TIME, STEP_RATE
+from .robot import SPEED
+
+ROBOT_DIMENSIONS = (20, 30)
+TARGET_DIMENSIONS = (10, 10)
+MAX_STEPS = 1000
+REACH_DISTANCE = 0.7 # fraction of the robot width that counts as reaching a target
+
+# a version of Scene that runs many robots in lockstep using numpy arrays
+class BatchScene:
+    def __init__(self, num_scenes, num_targets=1, width=640, height=640, rng=None, push_targets=False, seeds=None, max_steps=MAX_STEPS):
+        """
+        Vectorized robot & targets simulation, one row per scene.\n
+        num_scenes: number of independent robots (each with its own targets)
+        num_targets: number of targets per scene
+        width: width of arena
+        height: height of arena
+        rng: numpy Generator used for placing things & junk inputs
+        push_targets: approximates the robot pushing targets out of the way (Scene uses pymunk for this)
+        seeds: optional scene seed per row, rows get the same layout as Scene(seed=...) and
+        junk inputs that only depend on the seed & step
+        max_steps: length of the per seed junk input tables
+        """
+        self.num_scenes = num_scenes
+        self.num_targets = num_targets
+        self.width = width
+        self.height = height
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.push_targets = push_targets
+        self.max_steps = max_steps
+
+        self.robot_dimensions = np.array(ROBOT_DIMENSIONS, dtype=np.float64)
+        self.target_dimensions = np.array(TARGET_DIMENSIONS, dtype=np.float64)
+
+        self.reset(seeds)
+
+    def reset(self, seeds=None):
+        n = self.num_scenes
+        # robot pos is the top left corner, same as Robot.pos
+        self.robot_pos = np.empty((n, 2))
+        self.robot_angle = np.zeros(n)
+        self.motor_left = np.zeros(n)
+        self.motor_right = np.zeros(n)
+
+        # target centers (pymunk body positions)
+        self.target_pos = np.empty((n, self.num_targets, 2))
+
+        self.seeds = seeds
+        self.junk = None
+        if seeds is None:
+            self.robot_pos[:, 0] = self.rng.random(n) * 100 + 10
+            self.robot_pos[:, 1] = self.rng.random(n) + 100 + 10
+            self.target_pos[:, :, 0] = self.rng.integers(100, self.width - 100, (n, self.num_targets), endpoint=True)
+            self.target_pos[:, :, 1] = self.rng.integers(100, self.height - 100, (n, self.num_targets), endpoint=True)
+        else:
+            self.place_seeded(seeds)
+
+        self.step = np.zeros(n, dtype=np.int64)
+        self.stall = np.ones(n, dtype=np.int64)
+
+        # closest seen target, same as Scene.get_closest_target()
+        self.seen = np.zeros(n, dtype=bool)
+        self.seen_distance = np.zeros(n)
+        self.seen_bearing = np.zeros(n)
+
+        # fitness tracking for run()
+        self.active = np.ones(n, dtype=bool)
+        self.reached = np.zeros(n, dtype=bool)
+        self.fitness = np.zeros(n)
+
+    def place_seeded(self, seeds):
+        unique_seeds, self.junk_rows = np.unique(np.asarray(seeds), return_inverse=True)
+        self.junk = np.empty((len(unique_seeds), self.max_steps, 2))
+        for i, seed in enumerate(unique_seeds.tolist()):
+            # same calls in the same order as Scene.__init__()
+            rng = random.Random(seed)
+            robot_pos = (rng.random() * 100 + 10, rng.random() + 100 + 10)
+            target_pos = []
+            for t in range(self.num_targets):
+                target_pos.append((rng.randint(100, self.width - 100), rng.randint(100, self.height - 100)))
+                rng.random() # target angle, targets are treated as points here
+            rows = self.junk_rows == i
+            self.robot_pos[rows] = robot_pos
+            self.target_pos[rows] = target_pos
+            self.junk[i] = np.random.default_rng(seed).random((self.max_steps, 2)) * 1000
+
+    def get_ready(self) -> np.ndarray:
+        # check if we're done checking sensors
+        return self.stall > LOOK_TIME / STEP_RATE
+
+    def get_robot_center(self) -> np.ndarray:
+        return self.robot_pos + self.robot_dimensions / 2
+
+    def see(self, mask: np.ndarray):
+        """
+        Same maths as Scene.see(), for the scenes in mask (which should all be ready)
+        """
+        self.stall[mask] = 0
+        if not mask.any():
+            return
+
+        # the physics body angle is always -robot_angle after update_motors()
+        angle = ((-self.robot_angle[mask] + math.pi * 0.5) % (math.pi * 2)) - math.pi
+        robot_pos = self.get_robot_center()[mask]
+
+        # Scene.see() measures from the corner of the target (Target.pos), not the center
+        target_pos = self.target_pos[mask] - self.target_dimensions / 2
+        delta = target_pos - robot_pos[:, None, :]
+        angle2target = np.arctan2(delta[:, :, 1], delta[:, :, 0])
+        anglediff = ((angle2target - angle[:, None] + math.pi) % (math.pi * 2)) - math.pi
+        in_fov = np.abs(anglediff) < FOV / 2
+
+        # Scene.get_closest_target() returns the closest target found
+        distance = np.hypot(delta[:, :, 0], delta[:, :, 1])
+        closest = np.argmin(np.where(in_fov, distance, np.inf), axis=1)
+        rows = np.arange(len(closest))
+        self.seen[mask] = in_fov.any(axis=1)
+        self.seen_distance[mask] = distance[rows, closest]
+        self.seen_bearing[mask] = anglediff[rows, closest]
+
+    def get_net_inputs(self) -> np.ndarray:
+        n = self.num_scenes
+        inputs = np.empty((n, 8))
+        if self.junk is None:
+            junk = self.rng.random((n, 2)) * 1000
+        else:
+            # every genome on the same scenario gets the same junk at the same step
+            junk = self.junk[self.junk_rows, np.minimum(self.step, self.max_steps - 1)]
+        inputs[:, 0] = np.where(self.seen, self.seen_bearing, junk[:, 0])
+        inputs[:, 1] = np.where(self.seen, self.seen_distance, junk[:, 1])
+        inputs[:, 2] = self.motor_left
+        inputs[:, 3] = self.motor_right
+        inputs[:, 4] = self.robot_angle
+        inputs[:, 5] = self.get_ready()
+        inputs[:, 6] = self.stall
+        inputs[:, 7] = self.seen
+        return inputs
+
+    def update_motors(self, mask: np.ndarray):
+        forward = (self.motor_left[mask] + self.motor_right[mask]) / 2
+        angle = self.robot_angle[mask]
+        self.robot_pos[mask, 0] += forward * np.cos(angle + math.pi * 0.5)
+        self.robot_pos[mask, 1] -= forward * np.sin(angle + math.pi * 0.5)
+        self.robot_angle[mask] = angle - (self.motor_right[mask] - self.motor_left[mask]) / self.robot_dimensions[0]
+
+    def update_targets(self):
+        # treat robot & targets as circles and push overlapping targets out radially
+        radius = np.linalg.norm(self.robot_dimensions) / 2 + self.target_dimensions.max() / 2
+        delta = self.target_pos - self.get_robot_center()[:, None, :]
+        dist = np.maximum(np.hypot(delta[:, :, 0], delta[:, :, 1]), 1e-9)
+        overlap = (dist < radius) & self.active[:, None]
+        scale = np.where(overlap, radius / dist, 1.0)
+        self.target_pos = self.get_robot_center()[:, None, :] + delta * scale[:, :, None]
+        np.clip(self.target_pos[:, :, 0], 1, self.width, out=self.target_pos[:, :, 0])
+        np.clip(self.target_pos[:, :, 1], 1, self.height, out=self.target_pos[:, :, 1])
+
+    def tick(self, outputs: np.ndarray):
+        """
+        Executes one frame for every active scene.\n
+        outputs: (num_scenes, 3) array of (motor_left, motor_right, see)
+        """
+        active = self.active
+        ready = self.get_ready() & active
+        # set_left_motor() sets the right motor & vice versa, keep it the same as Robot
+        self.motor_right[ready] = np.clip(outputs[ready, 0], -255, 255) * SPEED
+        self.motor_left[ready] = np.clip(outputs[ready, 1], -255, 255) * SPEED
+        self.see(ready & (outputs[:, 2] >= 0.5))
+
+        # looking resets the stall, so we have to check again
+        self.update_motors(self.get_ready() & active)
+        if self.push_targets:
+            self.update_targets()
+
+        self.step[active] += 1
+        self.stall[active] += 1
+
+    def run(self, policy, max_steps=None) -> np.ndarray:
+        """
+        Runs every scene to completion and returns the fitness of each, using the same
+        fitness terms as App.evaluate_genome().\n
+        policy: function mapping a (num_scenes, 8) array of inputs to (num_scenes, 3) outputs
+        """
+        max_steps = max_steps or self.max_steps
+        while self.active.any():
+            outputs = np.asarray(policy(self.get_net_inputs()), dtype=np.float64)
+            active = self.active.copy()
+
+            fitness = max_steps - self.step.astype(np.float64)
+            fitness -= np.where(~self.get_ready() & (outputs[:, 2] >= 0.5), 4.0, 0.0)
+
+            self.tick(outputs)
+
+            # check distance
+            reached = active & self.seen & (self.seen_distance < self.robot_dimensions[0] * REACH_DISTANCE)
+            fitness += np.where(reached, 200.0, 0.0)
+            self.fitness[active] = fitness[active]
+            self.reached |= reached
+            self.active &= ~reached & (self.step < max_steps)
+
+        arena = self.width + self.height
+        fitness = self.fitness + arena - np.where(self.seen, self.seen_distance, arena)
+        return np.maximum(0.0, fitness)
+
+
+def evaluate_population(policy, num_genomes, runs_per_net, num_targets=1, width=640, height=640, rng=None, push_targets=False, seeds=None) -> np.ndarray:
+    """
+    Evaluates runs_per_net runs for every genome in one BatchScene and returns the
+    minimum fitness of each genome (like App.evaluate_genome()).\n
+    Rows are genome major, so row i belongs to genome i // runs_per_net.
+    seeds: optional scenario seed for each run, shared by every genome
+    """
+    row_seeds = None if seeds is None else np.tile(np.asarray(seeds), num_genomes)
+    scene = BatchScene(num_genomes * runs_per_net, num_targets, width, height, rng=rng, push_targets=push_targets, seeds=row_seeds)
+    fitnesses = scene.run(policy)
+    return fitnesses.reshape(num_genomes, runs_per_net).min(axis=1)
@@ -0,0 +1,224 @@
+import glob
+import os
+import pickle
+import queue
+import random
+import threading
+import zlib
+from dataclasses import dataclass, field
+from itertools import count
+
+import neat
+
+BASE_EVERY = 10 # generations between checkpoints holding every genome, the ones in between only hold new genomes
+KEEP_CHAINS = 2 # base checkpoints (with their deltas) kept, older ones are deleted
+
+# on disk a run's checkpoints are chains of records, one file per base:
+#   chain-<generation>.bin   8 byte length + zlib compressed pickle of a checkpoint, back to back
+# the first record of a chain has every genome, the rest only the ones the previous record didn't have.
+# a record cut short by a crash is ignored, so resuming picks up the last complete one
+
+# everything needed to carry on a neat.Population run exactly where it was
+@dataclass
+class Checkpoint:
+    generation: int # the generation that gets evaluated next
+    genomes: dict # key -> genome, only the new ones in a delta record
+    fitnesses: dict # key -> fitness of every genome in the population, in order
+    species: list # (key, created, last_improved, representative key, member keys, fitness, adjusted fitness, fitness history)
+    best_key: int | None # best genome so far (might not be in the population anymore)
+    best_fitness: float | None
+    next_genome_key: int
+    next_species_key: int
+    next_node_key: int | None # None until a node has been added
+    rng_state: tuple # of the random module, which neat draws from
+    state: dict = field(default_factory=dict) # whatever else the run needs, eg. the scenario seeds
+
+def write_records(records: queue.Queue, errors: list):
+    """
+    Runs in the checkpointer's thread, compresses & appends records to their chain files until it gets None.
+    Stops at the first record that can't be written & puts the exception in errors, as the records after it
+    would be deltas to a record that isn't there
+    """
+    while True:
+        item = records.get()
+        if item is None:
+            break
+        path, data, base, old_chains = item
+        try:
+            data = zlib.compress(data)
+            # a base starts its chain over, in case a resumed run gets back to a generation it had checkpointed
+            with open(path, "wb" if base else "ab") as f:
+                f.write(len(data).to_bytes(8, "little") + data)
+                f.flush()
+                os.fsync(f.fileno())
+            for old_path in old_chains:
+                os.remove(old_path)
+        except Exception as e:
+            errors.append(e)
+            break
+
+# checkpoints a neat.Population at the end of every generation, like neat.Checkpointer but
+# only writing new genomes & without making the generation wait for the disk
+class Checkpointer(neat.reporting.BaseReporter):
+    def __init__(self, directory, population: neat.Population, base_every=BASE_EVERY, keep=KEEP_CHAINS, get_state=None):
+        """
+        directory: where the run's chains go, made if it doesn't exist
+        population: the population being checkpointed, for its genome & species counters
+        get_state: returns a (picklable) dict of anything else to checkpoint, see Checkpoint.state
+        """
+        self.directory = directory
+        self.population = population
+        self.base_every = base_every
+        self.keep = keep
+        self.get_state = get_state
+        os.makedirs(directory, exist_ok=True)
+
+        self.generation = population.generation
+        self.best = population.best_genome
+        self.written = set() # genomes in the current chain's last record
+        self.chain_path = None
+        self.queue = queue.Queue()
+        self.errors = [] # what stopped the writer, raised by the next end_generation() or close()
+        self.writer = threading.Thread(target=write_records, args=(self.queue, self.errors), daemon=True)
+        self.writer.start()
+
+    def check_writer(self):
+        if self.errors:
+            raise RuntimeError("writing a checkpoint failed, no more get written") from self.errors[0]
+
+    def start_generation(self, generation):
+        self.generation = generation
+
+    def post_evaluate(self, config, population, species, best_genome):
+        # same as Population.best_genome, which reporters don't get to see
+        if self.best is None or best_genome.fitness > self.best.fitness:
+            self.best = best_genome
+
+    def end_generation(self, config, population, species_set):
+        self.check_writer()
+        generation = self.generation + 1
+        # a count() can't be read without advancing it, so each one is swapped for a fresh one
+        reproduction = self.population.reproduction
+        next_genome_key = next(reproduction.genome_indexer)
+        reproduction.genome_indexer = count(next_genome_key)
+        next_species_key = next(species_set.indexer)
+        species_set.indexer = count(next_species_key)
+        genome_config = config.genome_config
+        next_node_key = None
+        if genome_config.node_indexer is not None:
+            next_node_key = next(genome_config.node_indexer)
+            genome_config.node_indexer = count(next_node_key)
+
+        base = self.chain_path is None or generation % self.base_every == 0
+        old_chains = []
+        if base:
+            self.chain_path = os.path.join(self.directory, f"chain-{generation:06d}.bin")
+            self.written = set()
+            # deleted once the new base is written, along with any from after this generation (left by a
+            # run that was resumed from further back)
+            chains = [path for path in get_chains(self.directory) if path < self.chain_path]
+            old_chains = chains[:max(0, len(chains) - self.keep + 1)]
+            old_chains += [path for path in get_chains(self.directory) if path > self.chain_path]
+
+        genomes = dict(population)
+        if self.best is not None:
+            genomes[self.best.key] = self.best
+        checkpoint = Checkpoint(
+            generation,
+            {key: genome for key, genome in genomes.items() if key not in self.written},
+            {key: genome.fitness for key, genome in population.items()},
+            [(sid, s.created, s.last_improved, s.representative.key, list(s.members), s.fitness, s.adjusted_fitness,
+              list(s.fitness_history)) for sid, s in species_set.species.items()],
+            self.best.key if self.best is not None else None,
+            self.best.fitness if self.best is not None else None,
+            next_genome_key, next_species_key, next_node_key,
+            random.getstate(),
+            self.get_state() if self.get_state else {},
+        )
+        self.written = set(genomes)
+        # pickled now, while the genomes are as they are at the end of this generation
+        self.queue.put((self.chain_path, pickle.dumps(checkpoint, pickle.HIGHEST_PROTOCOL), base, old_chains))
+
+    def close(self):
+        """
+        Waits for every checkpoint to be written, raises if one of them couldn't be
+        """
+        if self.writer is not None:
+            self.queue.put(None)
+            self.writer.join()
+            self.writer = None
+        self.check_writer()
+
+def get_chains(directory) -> list:
+    # oldest first
+    return sorted(glob.glob(os.path.join(directory, "chain-*.bin")))
+
+def read_chain(path):
+    """
+    Yields the complete records of a chain
+    """
+    with open(path, "rb") as f:
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                return
+            size = int.from_bytes(header, "little")
+            data = f.read(size)
+            if len(data) < size:
+                return
+            yield pickle.loads(zlib.decompress(data))
+
+def load_checkpoint(directory, generation=None) -> Checkpoint | None:
+    """
+    The latest checkpoint in a directory, or the one for generation (None if there isn't one), with all of its genomes
+    """
+    for path in reversed(get_chains(directory)):
+        genomes = {}
+        found = None
+        for checkpoint in read_chain(path):
+            genomes.update(checkpoint.genomes)
+            # anything not in this record won't be in later ones either
+            keep = set(checkpoint.fitnesses) | {checkpoint.best_key}
+            genomes = {key: genome for key, genome in genomes.items() if key in keep}
+            if generation is None or checkpoint.generation == generation:
+                checkpoint.genomes = dict(genomes)
+                found = checkpoint
+            if checkpoint.generation == generation:
+                break
+        if found is not None:
+            return found
+    return None
+
+def restore_population(checkpoint: Checkpoint, config) -> neat.Population:
+    """
+    Population that carries on from a checkpoint the same way the checkpointed run did,
+    the random module's state is restored too. Reporters have to be added again
+    """
+    genomes = checkpoint.genomes
+    population = {}
+    for key, fitness in checkpoint.fitnesses.items():
+        population[key] = genomes[key]
+        population[key].fitness = fitness
+
+    species_set = config.species_set_type(config.species_set_config, None)
+    for sid, created, last_improved, representative, members, fitness, adjusted_fitness, history in checkpoint.species:
+        s = neat.species.Species(sid, created)
+        s.last_improved = last_improved
+        s.update(population[representative], {key: population[key] for key in members})
+        s.fitness = fitness
+        s.adjusted_fitness = adjusted_fitness
+        s.fitness_history = history
+        species_set.species[sid] = s
+        for key in members:
+            species_set.genome_to_species[key] = sid
+    species_set.indexer = count(checkpoint.next_species_key)
+
+    pop = neat.Population(config, (population, species_set, checkpoint.generation))
+    species_set.reporters = pop.reporters
+    pop.reproduction.genome_indexer = count(checkpoint.next_genome_key)
+    config.genome_config.node_indexer = count(checkpoint.next_node_key) if checkpoint.next_node_key is not None else None
+    pop.best_genome = genomes.get(checkpoint.best_key)
+    if pop.best_genome is not None:
+        pop.best_genome.fitness = checkpoint.best_fitness
+    random.setstate(checkpoint.rng_state)
+    return pop
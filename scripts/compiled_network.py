@@ -0,0 +1,89 @@
+import hashlib
+from collections import OrderedDict
+
+import neat
+
+CACHE_SIZE = 512
+
+def genome_hash(genome) -> str:
+    """
+    Structural hash of a genome: its enabled connections & weights and its nodes' parameters.
+    Genomes that would build the same network share the same hash, whatever their key is.
+    """
+    h = hashlib.sha1()
+    for key in sorted(genome.connections):
+        cg = genome.connections[key]
+        if cg.enabled:
+            h.update(repr((key, cg.weight)).encode())
+    h.update(b"|")
+    for key in sorted(genome.nodes):
+        ng = genome.nodes[key]
+        h.update(repr((key, ng.bias, ng.response, ng.activation, ng.aggregation)).encode())
+    return h.hexdigest()
+
+# a feed forward network compiled to a single straight-line python function
+class CompiledNetwork:
+    def __init__(self, source: str, namespace: dict):
+        self.source = source
+        exec(compile(source, "<compiled network>", "exec"), namespace)
+        self.activate = namespace["activate"]
+
+    @staticmethod
+    def create(genome, config):
+        """ Receives a genome and returns its phenotype compiled into python code. """
+        # let neat do the pruning & ordering, then unroll its node evaluation loop
+        net = neat.nn.FeedForwardNetwork.create(genome, config)
+        sum_aggregation = config.genome_config.aggregation_function_defs.get("sum")
+
+        names = {}
+        for i, key in enumerate(net.input_nodes):
+            names[key] = f"i{i}"
+        namespace = {}
+        lines = [f"def activate(inputs):",
+                 f"    {', '.join(names[key] for key in net.input_nodes)}, = inputs"]
+
+        for n, (node, act_func, agg_func, bias, response, links) in enumerate(net.node_evals):
+            names[node] = f"n{n}"
+            namespace[f"act{n}"] = act_func
+            terms = [f"{names[i]} * {w!r}" for i, w in links]
+            if agg_func is sum_aggregation:
+                s = " + ".join(terms) if terms else "0.0"
+            else:
+                namespace[f"agg{n}"] = agg_func
+                s = f"agg{n}([{', '.join(terms)}])"
+            lines.append(f"    n{n} = act{n}({bias!r} + {response!r} * ({s}))")
+
+        # outputs that never get evaluated stay at 0.0, same as FeedForwardNetwork
+        lines.append(f"    return [{', '.join(names.get(key, '0.0') for key in net.output_nodes)}]")
+        return CompiledNetwork("\n".join(lines) + "\n", namespace)
+
+# LRU cache of compiled networks, keyed by genome_hash()
+class NetworkCache:
+    def __init__(self, max_size=CACHE_SIZE):
+        self.max_size = max_size
+        self.networks = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, genome, config) -> CompiledNetwork:
+        key = genome_hash(genome)
+        net = self.networks.get(key)
+        if net is not None:
+            self.hits += 1
+            self.networks.move_to_end(key)
+            return net
+
+        self.misses += 1
+        net = CompiledNetwork.create(genome, config)
+        self.networks[key] = net
+        if len(self.networks) > self.max_size:
+            self.networks.popitem(last=False)
+        return net
+
+    def clear(self):
+        self.networks.clear()
+        self.hits = 0
+        self.misses = 0
+
+# one cache per process, so elites evaluated again by the same worker don't get recompiled
+network_cache = NetworkCache()
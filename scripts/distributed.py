@@ -0,0 +1,312 @@
+import multiprocessing
+import os
+import pickle
+import queue
+import socket
+import struct
+import threading
+import time
+import traceback
+
+from .worker_pool import CHUNK_SIZE, TASK_TIMEOUT, pack_genome, evaluate_packed
+from .profiler import Profiler, profiler
+from .event_log import event_log
+
+PORT = 5555
+HEARTBEAT_INTERVAL = 1.0 # seconds between heartbeats from a busy worker
+HEARTBEAT_TIMEOUT = 10.0 # a worker with tasks that's been quiet this long is treated as dead
+CONNECT_TIMEOUT = 30.0 # how long workers keep trying to reach the coordinator
+MAX_TASK_ATTEMPTS = 3 # a task that raises (or loses its worker) this many times fails the whole evaluate()
+
+# messages are length prefixed pickles, so only run this on networks you trust
+# worker -> coordinator: ("hello", host, pid), ("ready",), ("heartbeat",), ("result", task id, results, profile or None, event log records),
+#                        ("error", task id, traceback)
+# coordinator -> worker: ("config", config), ("task", task id, attributes, chunk), ("stop",)
+
+def send_message(sock: socket.socket, message: tuple):
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    sock.sendall(struct.pack("!I", len(data)) + data)
+
+def recv_exact(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        data += chunk
+    return bytes(data)
+
+def recv_message(sock: socket.socket) -> tuple:
+    size, = struct.unpack("!I", recv_exact(sock, 4))
+    return pickle.loads(recv_exact(sock, size))
+
+# info the coordinator keeps on each connected worker
+class WorkerInfo:
+    def __init__(self, name: str, sock: socket.socket):
+        self.name = name
+        self.sock = sock
+        self.last_seen = time.time()
+        self.tasks = set() # task ids in flight
+        self.genomes_done = 0
+
+# hands out chunks of genomes to workers connecting over TCP, drop in replacement for WorkerPool
+class Coordinator:
+    def __init__(self, config, host="0.0.0.0", port=PORT, chunk_size=CHUNK_SIZE, config_attributes=()):
+        """
+        config: neat config, sent to every worker when it connects
+        host, port: address to listen on for workers
+        chunk_size: number of genomes per task
+        config_attributes: names of attributes set on the config each generation that workers need too
+        """
+        self.config = config
+        self.chunk_size = chunk_size
+        self.config_attributes = config_attributes
+        self.running = True
+
+        self.lock = threading.Lock()
+        self.all_done = threading.Condition(self.lock)
+        self.tasks = queue.Queue()
+        self.task_data = {} # task id -> (attributes, chunk) for tasks not finished yet
+        self.results = {}
+        self.next_task_id = 0
+        self.workers = {}
+        self.requeued = 0
+        self.attempts = {} # task id -> times it failed during the current evaluate()
+        self.error = None # why the current evaluate() failed
+        self.last_finished = time.time() # when a task was last finished, evaluate() gives up after TASK_TIMEOUT
+        self.profile = Profiler() # merged from the workers during the last evaluate()
+
+        self.server = socket.create_server((host, port))
+        self.address = self.server.getsockname()
+        threading.Thread(target=self.accept_workers, daemon=True).start()
+        threading.Thread(target=self.monitor_workers, daemon=True).start()
+
+    def accept_workers(self):
+        while self.running:
+            try:
+                sock, address = self.server.accept()
+            except OSError:
+                break
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self.handle_worker, args=(sock, address), daemon=True).start()
+
+    def handle_worker(self, sock: socket.socket, address):
+        worker = WorkerInfo(f"{address[0]}:{address[1]}", sock)
+        try:
+            kind, host, pid = recv_message(sock)
+            worker.name = f"{host}:{pid}"
+            send_message(sock, ("config", self.config))
+            with self.lock:
+                self.workers[worker.name] = worker
+            print(f"Worker {worker.name} connected")
+
+            while self.running:
+                message = recv_message(sock)
+                worker.last_seen = time.time()
+                if message[0] == "heartbeat":
+                    continue
+                if message[0] == "result":
+                    self.finish_task(worker, message[1], message[2], message[3], message[4])
+                elif message[0] == "error":
+                    with self.lock:
+                        worker.tasks.discard(message[1])
+                        self.retry_task(message[1], f"it raised on {worker.name}:\n{message[2]}")
+
+                # "ready" & "result" both mean the worker wants another task
+                task = self.claim_task(worker)
+                if task is None:
+                    break
+                send_message(sock, ("task",) + task)
+            send_message(sock, ("stop",))
+        except (OSError, EOFError, ConnectionError, pickle.UnpicklingError):
+            pass
+        finally:
+            self.drop_worker(worker)
+            sock.close()
+
+    def claim_task(self, worker: WorkerInfo) -> tuple | None:
+        """
+        Waits for a task & gives it to worker. Returns (task id, attributes, chunk), or None once closed
+        """
+        while self.running:
+            try:
+                task_id = self.tasks.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            with self.lock:
+                # requeued tasks can already be finished by the time they come round again
+                if task_id not in self.task_data:
+                    continue
+                worker.tasks.add(task_id)
+                worker.last_seen = time.time()
+                return (task_id,) + self.task_data[task_id]
+        return None
+
+    def finish_task(self, worker: WorkerInfo, task_id: int, results: list, profile: dict | None, records: list):
+        with self.lock:
+            worker.tasks.discard(task_id)
+            # a requeued task can be finished twice, only the first result counts
+            if self.task_data.pop(task_id, None) is None:
+                return
+            self.last_finished = time.time()
+            worker.genomes_done += len(results)
+            self.results.update(results)
+            if profile:
+                self.profile.merge(profile)
+            event_log.extend(records)
+            if not self.task_data:
+                self.all_done.notify_all()
+
+    def drop_worker(self, worker: WorkerInfo):
+        with self.lock:
+            if self.workers.get(worker.name) is worker:
+                del self.workers[worker.name]
+            # give the dead worker's tasks to someone else
+            for task_id in worker.tasks:
+                self.retry_task(task_id, f"{worker.name} disconnected")
+            worker.tasks.clear()
+        if self.running:
+            print(f"Worker {worker.name} disconnected")
+
+    def retry_task(self, task_id: int, reason: str):
+        """
+        Requeues a task that didn't get finished, or fails the current evaluate() if it's been tried too often.
+        Call with the lock held
+        """
+        if task_id not in self.task_data:
+            return
+        self.attempts[task_id] = self.attempts.get(task_id, 0) + 1
+        if self.attempts[task_id] < MAX_TASK_ATTEMPTS:
+            self.tasks.put(task_id)
+            self.requeued += 1
+            return
+        self.error = f"task {task_id} failed {MAX_TASK_ATTEMPTS} times, last time because {reason}"
+        # the other tasks are dropped too, results still coming in for them get ignored
+        self.task_data.clear()
+        self.all_done.notify_all()
+
+    def monitor_workers(self):
+        while self.running:
+            time.sleep(HEARTBEAT_INTERVAL)
+            now = time.time()
+            with self.lock:
+                silent = [w for w in self.workers.values() if w.tasks and now - w.last_seen > HEARTBEAT_TIMEOUT]
+            for worker in silent:
+                print(f"Worker {worker.name} missed its heartbeats, requeueing its tasks")
+                # unblocks handle_worker(), which requeues the tasks
+                try:
+                    worker.sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def evaluate(self, genomes, config) -> dict:
+        """
+        Sets the fitness of every genome & returns {genome id: eval_function result}.
+        Raises RuntimeError if a task keeps failing & TimeoutError if no task finishes for TASK_TIMEOUT
+        """
+        attributes = {name: getattr(config, name, None) for name in self.config_attributes}
+        packed = [(genome_id, pack_genome(genome, config)) for genome_id, genome in genomes]
+
+        start = time.perf_counter()
+        with self.lock:
+            self.results = {}
+            self.profile = Profiler()
+            self.attempts = {}
+            self.error = None
+            self.last_finished = time.time()
+            for worker in self.workers.values():
+                worker.genomes_done = 0
+            for i in range(0, len(packed), self.chunk_size):
+                self.task_data[self.next_task_id] = (attributes, packed[i:i + self.chunk_size])
+                self.tasks.put(self.next_task_id)
+                self.next_task_id += 1
+            while self.task_data:
+                self.all_done.wait(HEARTBEAT_INTERVAL)
+                if self.task_data and time.time() - self.last_finished > TASK_TIMEOUT:
+                    self.task_data.clear()
+                    raise TimeoutError(f"no task finished in {TASK_TIMEOUT:.0f}s, {len(self.workers)} workers connected")
+            if self.error:
+                raise RuntimeError(self.error)
+            results = self.results
+            done = {worker.name: worker.genomes_done for worker in self.workers.values()}
+        wall_time = time.perf_counter() - start
+
+        for genome_id, genome in genomes:
+            result = results[genome_id]
+            genome.fitness = result[0] if isinstance(result, tuple) else result
+
+        print(f"Coordinator: {len(done)} workers, {len(genomes) / wall_time:.1f} genomes/s, "
+              f"{self.requeued} tasks requeued so far, genomes per worker " + ", ".join(str(n) for n in done.values()))
+        return results
+
+    def close(self):
+        self.running = False
+        self.server.close()
+
+def run_worker(host, port, eval_function, initializer=None):
+    """
+    Connects to a coordinator & evaluates the chunks it hands out until told to stop
+    """
+    # the coordinator might not be up yet
+    deadline = time.time() + CONNECT_TIMEOUT
+    while True:
+        try:
+            sock = socket.create_connection((host, port))
+            break
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.5)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    send_lock = threading.Lock()
+    stopped = threading.Event()
+
+    def heartbeat():
+        while not stopped.wait(HEARTBEAT_INTERVAL):
+            try:
+                with send_lock:
+                    send_message(sock, ("heartbeat",))
+            except OSError:
+                break
+
+    send_message(sock, ("hello", socket.gethostname(), os.getpid()))
+    kind, config = recv_message(sock)
+    if initializer:
+        initializer(config)
+
+    threading.Thread(target=heartbeat, daemon=True).start()
+    try:
+        with send_lock:
+            send_message(sock, ("ready",))
+        while True:
+            message = recv_message(sock)
+            if message[0] == "stop":
+                break
+            kind, task_id, attributes, chunk = message
+            try:
+                results = evaluate_packed(eval_function, config, attributes, chunk)
+            except Exception:
+                # the coordinator decides whether to retry it, this worker carries on
+                with send_lock:
+                    send_message(sock, ("error", task_id, traceback.format_exc()))
+                continue
+            profile = profiler.drain() if profiler.enabled else None
+            with send_lock:
+                send_message(sock, ("result", task_id, results, profile, event_log.drain()))
+    except (OSError, ConnectionError):
+        pass
+    finally:
+        stopped.set()
+        sock.close()
+
+def run_workers(host, port, num_processes, eval_function, initializer=None):
+    """
+    Starts num_processes workers on this machine & waits for them to finish
+    """
+    processes = [multiprocessing.Process(target=run_worker, args=(host, port, eval_function, initializer))
+                 for i in range(num_processes)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
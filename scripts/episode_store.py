@@ -0,0 +1,217 @@
+import glob
+import json
+import os
+
+import numpy as np
+
+from .trajectory import Episode, INDEX_DTYPE, STEP_ARRAYS, get_index_entry, get_episode
+
+DTYPE = np.float32 # of every step array
+
+# on disk a store is a directory of shards, each written by one EpisodeWriter:
+#   shard-<name>/meta.json     shape of a step row in each array
+#   shard-<name>/<array>.bin   raw rows of each step array, episodes back to back
+#   shard-<name>/index.bin     raw INDEX_DTYPE rows, one per episode
+# an episode's index row is only written once its steps are, so readers never see half an episode
+
+# appends episodes to its own shard of a store, one per process so workers never share a file
+class EpisodeWriter:
+    def __init__(self, directory, name=None):
+        """
+        directory: the store's directory, made if it doesn't exist
+        name: shard name, the process id by default (an existing shard is appended to)
+        """
+        self.path = os.path.join(directory, f"shard-{name if name is not None else os.getpid()}")
+        os.makedirs(self.path, exist_ok=True)
+        self.pid = os.getpid()
+        self.files = {}
+        self.index_file = None
+        self.rows = 0 # steps in the shard so far
+
+        # picks up where the shard left off
+        meta_path = os.path.join(self.path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                self.open(json.load(f))
+
+    def open(self, shapes: dict):
+        self.shapes = {name: tuple(shape) for name, shape in shapes.items()}
+        path = os.path.join(self.path, "index.bin")
+        self.index_file = open(path, "r+b" if os.path.exists(path) else "w+b")
+        index = read_index(path)
+        self.rows = get_rows(index)
+        # anything after the last complete episode is dropped, writes always go to the end
+        self.index_file.truncate(len(index) * INDEX_DTYPE.itemsize)
+        for name in STEP_ARRAYS:
+            path = os.path.join(self.path, f"{name}.bin")
+            self.files[name] = open(path, "r+b" if os.path.exists(path) else "w+b")
+            self.files[name].truncate(self.rows * int(np.prod(self.shapes[name], dtype=np.int64)) * DTYPE().itemsize)
+
+    def append(self, episode: Episode):
+        if self.index_file is None:
+            shapes = {name: getattr(episode, name).shape[1:] for name in STEP_ARRAYS}
+            with open(os.path.join(self.path, "meta.json"), "w") as f:
+                json.dump({name: list(shape) for name, shape in shapes.items()}, f)
+            self.open(shapes)
+
+        for name in STEP_ARRAYS:
+            array = getattr(episode, name)
+            if array.shape[1:] != self.shapes[name]:
+                raise ValueError(f"{name} rows are {array.shape[1:]}, this shard has {self.shapes[name]}")
+            f = self.files[name]
+            f.seek(0, os.SEEK_END)
+            f.write(np.ascontiguousarray(array, dtype=DTYPE).tobytes())
+            f.flush()
+
+        entry = np.array([get_index_entry(episode, self.rows)], dtype=INDEX_DTYPE)
+        self.index_file.seek(0, os.SEEK_END)
+        self.index_file.write(entry.tobytes())
+        self.index_file.flush()
+        self.rows += len(episode)
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        if self.index_file:
+            self.index_file.close()
+        self.files = {}
+        self.index_file = None
+
+def read_index(path) -> np.ndarray:
+    # a writer could be half way through an index row
+    count = os.path.getsize(path) // INDEX_DTYPE.itemsize if os.path.exists(path) else 0
+    return np.fromfile(path, dtype=INDEX_DTYPE, count=count) if count else np.zeros(0, dtype=INDEX_DTYPE)
+
+def get_rows(index: np.ndarray) -> int:
+    # steps in a shard, episodes are written in order
+    return int(index[-1]["start"] + index[-1]["length"]) if len(index) else 0
+
+writers = {} # directory -> this process' EpisodeWriter
+
+def get_writer(directory) -> EpisodeWriter:
+    """
+    This process' writer for a store, forked workers get their own instead of their parent's
+    """
+    writer = writers.get(directory)
+    if writer is None or writer.pid != os.getpid():
+        writer = writers[directory] = EpisodeWriter(directory)
+    return writer
+
+# read only view of every shard in a store, the step arrays are memory mapped so nothing is loaded up front
+class EpisodeStore:
+    def __init__(self, directory):
+        self.directory = directory
+        self.refresh()
+
+    def refresh(self):
+        """
+        Picks up episodes appended since the store was opened
+        """
+        self.shards = [] # name -> memmap for each shard
+        indexes = []
+        for path in sorted(glob.glob(os.path.join(self.directory, "shard-*"))):
+            index = read_index(os.path.join(path, "index.bin"))
+            if not len(index):
+                continue
+            rows = get_rows(index)
+            with open(os.path.join(path, "meta.json")) as f:
+                shapes = json.load(f)
+            # numpy can't map an empty file
+            self.shards.append({name: np.memmap(os.path.join(path, f"{name}.bin"), dtype=DTYPE, mode="r", shape=(rows, *shapes[name]))
+                                if rows else np.zeros((0, *shapes[name]), dtype=DTYPE) for name in STEP_ARRAYS})
+            indexes.append((index, len(self.shards) - 1))
+
+        self.index = np.concatenate([index for index, shard in indexes]) if indexes else np.zeros(0, dtype=INDEX_DTYPE)
+        self.shard_of = np.concatenate([np.full(len(index), shard) for index, shard in indexes]) if indexes else np.zeros(0, dtype=int)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def get(self, i) -> Episode:
+        # the step arrays are views of the memmaps, copy them to keep them past close()
+        return get_episode(self.index[i], self.shards[self.shard_of[i]])
+
+    def select(self, generation=None, min_fitness=None, max_fitness=None, reached_target=None, genome_id=None) -> "EpisodeView":
+        """
+        Episodes matching every filter given. generation: one generation or a (first, last) range
+        """
+        index = self.index
+        mask = np.ones(len(index), dtype=bool)
+        if isinstance(generation, tuple):
+            mask &= (index["generation"] >= generation[0]) & (index["generation"] <= generation[1])
+        elif generation is not None:
+            mask &= index["generation"] == generation
+        if min_fitness is not None:
+            mask &= index["fitness"] >= min_fitness
+        if max_fitness is not None:
+            mask &= index["fitness"] <= max_fitness
+        if reached_target is not None:
+            mask &= index["reached_target"] == reached_target
+        if genome_id is not None:
+            mask &= index["genome_id"] == genome_id
+        return EpisodeView(self, np.flatnonzero(mask))
+
+    def all(self) -> "EpisodeView":
+        return EpisodeView(self, np.arange(len(self.index)))
+
+    def close(self):
+        # drops the memmaps, episodes still referencing them keep theirs open
+        self.shards = []
+
+# some of a store's episodes, see EpisodeStore.select()
+class EpisodeView:
+    def __init__(self, store: EpisodeStore, positions: np.ndarray):
+        self.store = store
+        self.positions = positions
+        self.index = store.index[positions]
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __iter__(self):
+        for i in self.positions:
+            yield self.store.get(i)
+
+    def get(self, i) -> Episode:
+        return self.store.get(self.positions[i])
+
+    def get_steps(self) -> int:
+        return int(self.index["length"].sum())
+
+    def iter_batches(self, batch_size=1024, shuffle=False, seed=None, skip_idle=True):
+        """
+        Streams (inputs, outputs) arrays of batch_size steps (the last batch can be smaller), reading
+        the episodes a batch at a time so the view never has to fit in memory.\n
+        shuffle: visits the episodes in a random order, the steps within each one stay in order
+        skip_idle: leaves out steps where the network wasn't asked for anything (NaN outputs)
+        """
+        order = np.arange(len(self.positions))
+        if shuffle:
+            np.random.default_rng(seed).shuffle(order)
+
+        batch_inputs = batch_outputs = None
+        filled = 0
+        for i in order:
+            episode = self.store.get(self.positions[i])
+            inputs, outputs = episode.inputs, episode.outputs
+            if skip_idle:
+                keep = ~np.isnan(outputs).any(axis=1)
+                inputs, outputs = inputs[keep], outputs[keep]
+            if filled == 0:
+                batch_inputs = np.empty((batch_size, inputs.shape[1]), dtype=DTYPE)
+                batch_outputs = np.empty((batch_size, outputs.shape[1]), dtype=DTYPE)
+
+            start = 0
+            while start < len(inputs):
+                count = min(batch_size - filled, len(inputs) - start)
+                batch_inputs[filled:filled + count] = inputs[start:start + count]
+                batch_outputs[filled:filled + count] = outputs[start:start + count]
+                filled += count
+                start += count
+                if filled == batch_size:
+                    yield batch_inputs, batch_outputs
+                    batch_inputs = np.empty_like(batch_inputs)
+                    batch_outputs = np.empty_like(batch_outputs)
+                    filled = 0
+        if filled:
+            yield batch_inputs[:filled], batch_outputs[:filled]
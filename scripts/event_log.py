@@ -0,0 +1,146 @@
+import json
+import multiprocessing
+import os
+import queue
+import random
+import threading
+import time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+LEVEL_NAMES = {DEBUG: "debug", INFO: "info", WARNING: "warning"}
+BUFFER_SIZE = 512 # records the training process collects before sending them to the writer
+FLUSH_INTERVAL = 1.0 # seconds the writer holds on to records before they hit the file
+
+def format_record(record: tuple) -> str:
+    t, level, event, pid, fields = record
+    return json.dumps({"time": round(t, 6), "level": LEVEL_NAMES.get(level, level), "event": event, "pid": pid, **fields},
+                      separators=(",", ":")) + "\n"
+
+def write_records(path, records: multiprocessing.Queue):
+    """
+    Runs in the writer process, appends batches of records from the queue to a JSON lines file until it gets None
+    """
+    with open(path, "a") as f:
+        last_flush = time.perf_counter()
+        while True:
+            try:
+                batch = records.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                batch = []
+            if batch is None:
+                break
+            f.write("".join(format_record(record) for record in batch))
+            if time.perf_counter() - last_flush >= FLUSH_INTERVAL:
+                f.flush()
+                last_flush = time.perf_counter()
+
+# structured records (an event name & fields) buffered in memory, workers send theirs back with their
+# results (see drain()) & the training process hands them to a writer process in batches
+class EventLog:
+    def __init__(self, level=INFO, sample_rates=None):
+        """
+        level: records below this level are dropped straight away
+        sample_rates: event -> fraction of its records to keep, eg. {"step": 0.01}
+        """
+        self.level = level
+        self.sample_rates = sample_rates or {}
+        self.records = []
+        self.lock = threading.Lock() # the coordinator gets records from a thread per worker
+        self.rng = None # seeded per process, see get_rng()
+        self.rng_pid = None
+        self.queue = None # writer's queue, see start_writer()
+        self.writer = None
+        self.writer_pid = None # workers forked after the writer started still send their records back instead
+
+    def configure(self, level=None, sample_rates=None):
+        # workers get these with the config, like the profiler
+        if level is not None:
+            self.level = level
+        if sample_rates is not None:
+            self.sample_rates = sample_rates
+
+    def is_enabled(self, level, event=None) -> bool:
+        """
+        Whether log(level, event) would ever keep anything, check it before building expensive fields
+        """
+        return level >= self.level and self.sample_rates.get(event, 1.0) > 0
+
+    def sample(self, event) -> bool:
+        """
+        Whether to keep this record of event, for skipping the work of building fields that would be dropped (see add())
+        """
+        rate = self.sample_rates.get(event)
+        return rate is None or self.get_rng().random() < rate
+
+    def get_rng(self) -> random.Random:
+        # forked workers would all inherit the parent's state & sample the same records
+        if self.rng_pid != os.getpid():
+            self.rng = random.Random(os.getpid() ^ time.time_ns())
+            self.rng_pid = os.getpid()
+        return self.rng
+
+    def log(self, level, event, **fields):
+        if level >= self.level and self.sample(event):
+            self.add(level, event, fields)
+
+    def add(self, level, event, fields: dict):
+        # keeps a record without checking the level or sampling it
+        self.records.append((time.time(), level, event, os.getpid(), fields))
+        if self.queue is not None and len(self.records) >= BUFFER_SIZE:
+            self.flush()
+
+    def debug(self, event, **fields):
+        self.log(DEBUG, event, **fields)
+
+    def info(self, event, **fields):
+        self.log(INFO, event, **fields)
+
+    def warning(self, event, **fields):
+        self.log(WARNING, event, **fields)
+
+    def drain(self) -> list:
+        """
+        Takes the buffered records, eg. to send them back from a worker
+        """
+        with self.lock:
+            records, self.records = self.records, []
+        return records
+
+    def extend(self, records: list):
+        # records drained from a worker
+        if records:
+            with self.lock:
+                self.records += records
+            if self.queue is not None and len(self.records) >= BUFFER_SIZE:
+                self.flush()
+
+    def start_writer(self, path):
+        """
+        Starts the process writing this log's records to path (appending JSON lines)
+        """
+        self.queue = multiprocessing.Queue()
+        self.writer = multiprocessing.Process(target=write_records, args=(path, self.queue), daemon=True)
+        self.writer.start()
+        self.writer_pid = os.getpid()
+
+    def flush(self):
+        # hands the buffered records to the writer, it's up to the writer when they reach the file
+        if self.queue is not None and self.records and os.getpid() == self.writer_pid:
+            self.queue.put(self.drain())
+
+    def close(self):
+        """
+        Writes everything left & stops the writer
+        """
+        if self.writer is None or os.getpid() != self.writer_pid:
+            return
+        self.flush()
+        self.queue.put(None)
+        self.writer.join()
+        self.writer = None
+        self.queue = None
+
+# one per process, workers' records travel back with their results
+event_log = EventLog()
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+from .compiled_network import genome_hash
+
+CACHE_SIZE = 4096
+
+# content addressed fitness cache, so unchanged genomes (elites) don't have to be simulated again
+class FitnessCache:
+    def __init__(self, max_size=CACHE_SIZE, path=None, settings=None):
+        """
+        LRU cache of fitnesses keyed on genome structure + the scenario seeds it was evaluated on.\n
+        max_size: maximum number of fitnesses to keep
+        path: optional json file to persist the cache to between runs
+        settings: everything else the fitness depends on (eg. the physics profile), a file saved
+        with different settings is ignored (see stale)
+        """
+        self.max_size = max_size
+        self.path = path
+        self.settings = self.get_fingerprint(settings or {})
+        self.fitnesses = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stale = False # the file at path was made with other settings
+
+        if self.path and os.path.exists(self.path):
+            self.load()
+
+    @staticmethod
+    def get_fingerprint(settings: dict) -> str:
+        return hashlib.sha1(repr(sorted(settings.items())).encode()).hexdigest()
+
+    @staticmethod
+    def get_key(genome, seeds) -> str:
+        return genome_hash(genome) + ":" + ",".join(str(seed) for seed in seeds)
+
+    def get(self, genome, seeds) -> float | None:
+        key = self.get_key(genome, seeds)
+        fitness = self.fitnesses.get(key)
+        if fitness is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.fitnesses.move_to_end(key)
+        return fitness
+
+    def put(self, genome, seeds, fitness: float):
+        key = self.get_key(genome, seeds)
+        self.fitnesses[key] = fitness
+        self.fitnesses.move_to_end(key)
+        while len(self.fitnesses) > self.max_size:
+            self.fitnesses.popitem(last=False)
+
+    def evaluate(self, eval_function, genomes, config, seeds):
+        """
+        Sets the fitness of cached genomes and passes the rest on to eval_function
+        (any (genomes, config) evaluator that sets genome.fitness, like ParallelEvaluator.evaluate).
+        eval_function can return the ids of genomes whose fitness isn't exact, those don't get cached.
+        """
+        uncached = []
+        for genome_id, genome in genomes:
+            fitness = self.get(genome, seeds)
+            if fitness is None:
+                uncached.append((genome_id, genome))
+            else:
+                genome.fitness = fitness
+
+        if uncached:
+            inexact = eval_function(uncached, config) or ()
+            for genome_id, genome in uncached:
+                if genome_id not in inexact:
+                    self.put(genome, seeds, genome.fitness)
+
+        if self.path:
+            self.save()
+
+    def load(self):
+        with open(self.path, "r") as f:
+            data = json.load(f)
+        # files from before the settings were stored don't have any
+        if not isinstance(data, dict) or data.get("settings") != self.settings:
+            self.stale = True
+            return
+        self.fitnesses = OrderedDict(data["fitnesses"])
+        while len(self.fitnesses) > self.max_size:
+            self.fitnesses.popitem(last=False)
+
+    def save(self):
+        # write to a temporary file first so a crash can't leave a half written cache
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"settings": self.settings, "fitnesses": list(self.fitnesses.items())}, f)
+        os.replace(tmp_path, self.path)
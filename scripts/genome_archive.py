@@ -0,0 +1,198 @@
+import os
+import zlib
+
+import neat
+import numpy as np
+
+from .compiled_network import genome_hash
+from .worker_pool import pack_genome, unpack_genome
+
+ELITES = 5 # fittest genomes of the population archived every generation, on top of each species' best
+NO_SPECIES = -1
+ARCHIVE_DTYPE = np.dtype([
+    ("hash", "S40"), # genome_hash(), genomes that build the same network share a record
+    ("genome_id", np.int64), ("generation", np.int32), ("species", np.int32), ("fitness", np.float64),
+    ("offset", np.int64), ("size", np.int32), # compressed record in genomes.bin
+    ("best_of_species", np.bool_),
+])
+
+# on disk an archive is a directory with:
+#   genomes.bin   zlib compressed pack_genome() records back to back, one per distinct network
+#   index.bin     raw ARCHIVE_DTYPE rows, one per genome archived in a generation
+# like the episode store, a row is only written once its record is
+
+def compress_genome(genome, config) -> bytes:
+    # (nodes, connections) counts followed by both arrays, the genome key is kept in the index
+    key, nodes, connections = pack_genome(genome, config)
+    header = np.array([len(nodes), len(connections)], dtype=np.int64)
+    return zlib.compress(header.tobytes() + nodes.tobytes() + connections.tobytes())
+
+def decompress_genome(data: bytes, key, config):
+    """
+    Genome (without disabled connections) from a compress_genome() record, the config
+    has to have the same activation & aggregation options as the one it was archived with
+    """
+    data = zlib.decompress(data)
+    num_nodes, num_connections = np.frombuffer(data, dtype=np.int64, count=2).tolist()
+    values = np.frombuffer(data, dtype=np.float64, offset=16)
+    nodes = values[:num_nodes * 5].reshape(-1, 5)
+    connections = values[num_nodes * 5:].reshape(-1, 3)
+    return unpack_genome((key, nodes, connections), config)
+
+def read_index(path) -> np.ndarray:
+    # a writer could be half way through a row
+    count = os.path.getsize(path) // ARCHIVE_DTYPE.itemsize if os.path.exists(path) else 0
+    return np.fromfile(path, dtype=ARCHIVE_DTYPE, count=count) if count else np.zeros(0, dtype=ARCHIVE_DTYPE)
+
+# a training run's best genomes, loading one only reads its own record
+class GenomeArchive:
+    def __init__(self, directory):
+        """
+        directory: where the archive is, made on the first add()
+        """
+        self.directory = directory
+        self.blob_path = os.path.join(directory, "genomes.bin")
+        self.index_path = os.path.join(directory, "index.bin")
+        self.blob_file = None
+        self.index_file = None
+        self.refresh()
+
+    def refresh(self):
+        """
+        Picks up genomes added since the archive was opened (eg. by a training run still going)
+        """
+        self.index = read_index(self.index_path)
+        self.records = {} # hash -> (offset, size) of its record
+        for entry in self.index:
+            self.records.setdefault(bytes(entry["hash"]), (int(entry["offset"]), int(entry["size"])))
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.refresh()
+        self.blob_file = open(self.blob_path, "r+b" if os.path.exists(self.blob_path) else "w+b")
+        self.index_file = open(self.index_path, "r+b" if os.path.exists(self.index_path) else "w+b")
+        # anything after the last complete row is dropped, writes always go to the end
+        self.index_file.truncate(len(self.index) * ARCHIVE_DTYPE.itemsize)
+        self.blob_file.truncate(max((offset + size for offset, size in self.records.values()), default=0))
+
+    def add(self, genome, config, generation, species=NO_SPECIES, best_of_species=False):
+        """
+        Archives a genome (with its fitness) as one of a generation's, the record
+        is only written if no genome with the same network was archived before
+        """
+        if self.index_file is None:
+            self.open()
+
+        key = genome_hash(genome).encode()
+        record = self.records.get(key)
+        if record is None:
+            data = compress_genome(genome, config)
+            self.blob_file.seek(0, os.SEEK_END)
+            record = self.records[key] = (self.blob_file.tell(), len(data))
+            self.blob_file.write(data)
+            self.blob_file.flush()
+
+        entry = np.array([(key, genome.key, generation, species, genome.fitness, *record, best_of_species)], dtype=ARCHIVE_DTYPE)
+        self.index_file.seek(0, os.SEEK_END)
+        self.index_file.write(entry.tobytes())
+        self.index_file.flush()
+        self.index = np.concatenate((self.index, entry))
+
+    def add_generation(self, population: dict, species_set, generation, config, elites=ELITES):
+        """
+        Archives the fittest elites genomes of a population & the best of each species
+        """
+        evaluated = [genome for genome in population.values() if genome.fitness is not None]
+        best = {}
+        for genome in evaluated:
+            sid = species_set.genome_to_species.get(genome.key, NO_SPECIES)
+            if sid not in best or genome.fitness > best[sid].fitness:
+                best[sid] = genome
+
+        chosen = sorted(evaluated, key=lambda g: g.fitness, reverse=True)[:elites]
+        chosen += [genome for genome in best.values() if genome not in chosen]
+        for genome in chosen:
+            sid = species_set.genome_to_species.get(genome.key, NO_SPECIES)
+            self.add(genome, config, generation, sid, sid != NO_SPECIES and best[sid] is genome)
+
+    def drop_from(self, generation):
+        """
+        Forgets everything archived from generation on, eg. when a run carries on from an earlier checkpoint
+        """
+        self.close()
+        self.refresh()
+        dropped = np.flatnonzero(self.index["generation"] >= generation)
+        if len(dropped):
+            # rows are in the order they were added, their records get truncated by the next open()
+            with open(self.index_path, "r+b") as f:
+                f.truncate(int(dropped[0]) * ARCHIVE_DTYPE.itemsize)
+            self.refresh()
+
+    def select(self, generation=None, min_fitness=None, best_of_species=None) -> np.ndarray:
+        """
+        Positions of the archived genomes matching every filter given, fittest first.
+        generation: one generation or a (first, last) range
+        """
+        index = self.index
+        mask = np.ones(len(index), dtype=bool)
+        if isinstance(generation, tuple):
+            mask &= (index["generation"] >= generation[0]) & (index["generation"] <= generation[1])
+        elif generation is not None:
+            mask &= index["generation"] == generation
+        if min_fitness is not None:
+            mask &= index["fitness"] >= min_fitness
+        if best_of_species is not None:
+            mask &= index["best_of_species"] == best_of_species
+        positions = np.flatnonzero(mask)
+        return positions[np.argsort(-index["fitness"][positions], kind="stable")]
+
+    def best(self, k=1, generation=None) -> list[int]:
+        """
+        Positions of the k fittest genomes with different networks
+        """
+        positions = []
+        seen = set()
+        for i in self.select(generation).tolist():
+            key = bytes(self.index[i]["hash"])
+            if key not in seen:
+                seen.add(key)
+                positions.append(i)
+                if len(positions) == k:
+                    break
+        return positions
+
+    def load(self, i, config):
+        # only the genome's own record is read & unpacked
+        entry = self.index[i]
+        if self.blob_file is not None:
+            self.blob_file.flush()
+        with open(self.blob_path, "rb") as f:
+            f.seek(int(entry["offset"]))
+            data = f.read(int(entry["size"]))
+        genome = decompress_genome(data, int(entry["genome_id"]), config)
+        genome.fitness = float(entry["fitness"])
+        return genome
+
+    def close(self):
+        if self.blob_file:
+            self.blob_file.close()
+        if self.index_file:
+            self.index_file.close()
+        self.blob_file = None
+        self.index_file = None
+
+# archives every generation of a neat.Population (or SteadyStateEvolution's reports) as it's evaluated
+class ArchiveReporter(neat.reporting.BaseReporter):
+    def __init__(self, archive: GenomeArchive, elites=ELITES):
+        self.archive = archive
+        self.elites = elites
+        self.generation = 0
+
+    def start_generation(self, generation):
+        self.generation = generation
+
+    def post_evaluate(self, config, population, species, best_genome):
+        self.archive.add_generation(population, species, self.generation, config, self.elites)
@@ -0,0 +1,78 @@
+from .physics_world import PhysicsManager, PhysicsProfile, DEFAULT_PROFILE, MAX_LANES
+from .profiler import profiler, null_timer
+from .scene import Scene
+
+# several robots in one physics space, so they all advance with a single space.step()
+class MultiScene:
+    def __init__(self, num_robots, num_targets=4, width=1000, height=640, headless=True, seeds=None, cooperative=False,
+                 max_seen=None, num_rays=0, physics_profile: PhysicsProfile = DEFAULT_PROFILE):
+        """
+        Each robot gets its own Scene (in scenes), all of them sharing one physics space.\n
+        num_robots: number of robots / scenes
+        num_targets: targets per robot, or in total when cooperative
+        seeds: seed for each scene's layout (see Scene), None for random ones
+        cooperative: robots share the arena & one set of targets, bumping into each other & the same targets.
+        Otherwise each robot has its own targets in its own collision lane & the scenes don't affect each
+        other, a run in one is the same as in a Scene of its own (up to rounding in pymunk's collision code)
+        the rest are passed on to each Scene
+        """
+        if not cooperative and num_robots > MAX_LANES:
+            raise ValueError(f"only {MAX_LANES} independent robots fit in one space")
+        self.num_robots = num_robots
+        self.cooperative = cooperative
+        self.physics_manager = PhysicsManager(width, height, physics_profile)
+
+        seeds = list(seeds) if seeds is not None else [None] * num_robots
+        self.scenes = []
+        for i in range(num_robots):
+            self.scenes.append(Scene(
+                num_targets=num_targets, width=width, height=height, headless=headless, seed=seeds[i], max_seen=max_seen,
+                num_rays=num_rays, physics_manager=self.physics_manager, lane=None if cooperative else i,
+                # the first scene places & updates the shared targets
+                share_targets_with=self.scenes[0] if cooperative and i > 0 else None,
+            ))
+        self.physics_manager.reset()
+
+    def reset(self, seeds=None):
+        """
+        Puts every scene back to step 0. In cooperative mode the first seed lays out the targets
+        """
+        seeds = list(seeds) if seeds is not None else [None] * self.num_robots
+        for scene, seed in zip(self.scenes, seeds):
+            scene.reset(seed)
+        self.physics_manager.reset()
+
+    def get_ready(self) -> bool:
+        return all(scene.get_ready() for scene in self.scenes)
+
+    def warm_up(self):
+        # see Scene.warm_up(), the scenes always step together
+        while not self.get_ready():
+            self.get_net_inputs()
+            self.tick()
+
+    def get_net_inputs(self) -> list:
+        return [scene.get_net_inputs() for scene in self.scenes]
+
+    def tick(self, outputs=None, active=None):
+        """
+        Executes one frame of every scene, then steps the physics once for all of them.\n
+        outputs: network output for each scene (see Scene.tick()), or None
+        active: which scenes to tick, eg. to leave finished runs alone (their bodies still get simulated,
+        with the robot parked where it is)
+        """
+        for i, scene in enumerate(self.scenes):
+            if active is None or active[i]:
+                scene.tick(outputs[i] if outputs is not None else None)
+                continue
+            # a kinematic body keeps its velocity until it's told otherwise
+            body = scene.robot.controller_body
+            body.velocity = (0, 0)
+            body.angular_velocity = 0
+            # in cooperative mode the first scene's targets are everyone's, they still need updating once it's done
+            scene.update_targets()
+        # the scenes don't own the space, so its step is timed here
+        timer = profiler if profiler.enabled else null_timer
+        t = timer.start()
+        self.physics_manager.update()
+        timer.lap("physics", t)
@@ -0,0 +1,110 @@
+import argparse
+import pickle
+import random
+import time
+
+import numpy as np
+
+from .physics_world import PhysicsProfile, PHYSICS_PROFILES
+from .scene import Scene
+
+HOLD_STEPS = 30 # random driving keeps each set of outputs this many steps
+
+def random_driver(seed):
+    """
+    Policy that drives around randomly (the same way for the same seed) & always looks
+    """
+    rng = random.Random(seed)
+    output = None
+    step = 0
+    def policy(inputs):
+        nonlocal output, step
+        if step % HOLD_STEPS == 0:
+            output = (rng.uniform(-255, 255), rng.uniform(-255, 255), 1.0)
+        step += 1
+        return output
+    return policy
+
+def record_trajectory(profile: PhysicsProfile, seed, steps, policy, **scene_kwargs) -> tuple:
+    """
+    Runs a scene with profile. Returns (robot centers (steps, 2), target positions (steps, targets, 2), seconds taken)
+    """
+    scene = Scene(seed=seed, headless=True, physics_profile=profile, **scene_kwargs)
+    robot = np.empty((steps, 2))
+    targets = np.empty((steps, scene.num_targets, 2))
+    start = time.perf_counter()
+    for step in range(steps):
+        scene.tick(policy(scene.get_net_inputs()))
+        center = scene.robot.get_center()
+        robot[step] = center.x, center.y
+        for i, target in enumerate(scene.targets):
+            targets[step, i] = target.pos.x, target.pos.y
+    return robot, targets, time.perf_counter() - start
+
+def measure_drift(reference: PhysicsProfile, candidate: PhysicsProfile, seeds, steps=1000, make_policy=random_driver, **scene_kwargs) -> dict:
+    """
+    Runs the same scenes under both profiles & measures how far apart the robot & targets end up.\n
+    make_policy: function(seed) returning a fresh policy(inputs) -> outputs, it gets a new one for every run
+    so closed loop policies (eg. a trained network) see the drift build up like they would in training
+    scene_kwargs: passed on to Scene, eg. num_targets
+    Returns the mean & max distances (in pixels) over every step of every seed, the error at the last step
+    & how many times faster the candidate ran
+    """
+    robot_errors = []
+    target_errors = []
+    final_errors = []
+    reference_time = candidate_time = 0.0
+    for seed in seeds:
+        robot_a, targets_a, seconds_a = record_trajectory(reference, seed, steps, make_policy(seed), **scene_kwargs)
+        robot_b, targets_b, seconds_b = record_trajectory(candidate, seed, steps, make_policy(seed), **scene_kwargs)
+        reference_time += seconds_a
+        candidate_time += seconds_b
+
+        robot_error = np.hypot(*(robot_a - robot_b).T)
+        robot_errors.append(robot_error)
+        target_errors.append(np.hypot(targets_a[..., 0] - targets_b[..., 0], targets_a[..., 1] - targets_b[..., 1]).ravel())
+        final_errors.append(robot_error[-1])
+
+    robot_errors = np.concatenate(robot_errors)
+    target_errors = np.concatenate(target_errors)
+    return {
+        "robot_mean": float(robot_errors.mean()),
+        "robot_max": float(robot_errors.max()),
+        "robot_final": float(np.mean(final_errors)),
+        "target_mean": float(target_errors.mean()) if target_errors.size else 0.0,
+        "target_max": float(target_errors.max()) if target_errors.size else 0.0,
+        "speedup": reference_time / candidate_time,
+    }
+
+def load_genome_policy(genome_path, config_path):
+    """
+    make_policy for measure_drift() that drives with a pickled genome (eg. winner-feedforward)
+    """
+    import neat
+    config = neat.Config(neat.DefaultGenome, neat.DefaultReproduction, neat.DefaultSpeciesSet, neat.DefaultStagnation, config_path)
+    with open(genome_path, "rb") as f:
+        genome = pickle.load(f)
+    def make_policy(seed):
+        return neat.nn.FeedForwardNetwork.create(genome, config).activate
+    return make_policy
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measures how far trajectories drift between physics profiles")
+    parser.add_argument("candidates", nargs="+", choices=PHYSICS_PROFILES, help="profiles to compare against the reference")
+    parser.add_argument("--reference", default="high_fidelity", choices=PHYSICS_PROFILES)
+    parser.add_argument("--seeds", type=int, default=10, help="number of scenes to run")
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument("--targets", type=int, default=1)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=640)
+    parser.add_argument("--genome", help="pickled genome to drive with instead of driving randomly")
+    parser.add_argument("--config", default="config.conf", help="neat config for --genome")
+    args = parser.parse_args()
+
+    make_policy = load_genome_policy(args.genome, args.config) if args.genome else random_driver
+    print(f"{'profile':<16}{'robot mean':>12}{'robot max':>12}{'robot final':>13}{'target mean':>13}{'target max':>12}{'speedup':>9}")
+    for name in args.candidates:
+        drift = measure_drift(PHYSICS_PROFILES[args.reference], PHYSICS_PROFILES[name], range(args.seeds), args.steps, make_policy,
+                              num_targets=args.targets, width=args.width, height=args.height)
+        print(f"{name:<16}{drift['robot_mean']:>12.2f}{drift['robot_max']:>12.2f}{drift['robot_final']:>13.2f}"
+              f"{drift['target_mean']:>13.2f}{drift['target_max']:>12.2f}{drift['speedup']:>8.2f}x")
@@ -1,43 +1,127 @@
+import math
 import pymunk
 import pymunk.pygame_util
 from pymunk.vec2d import Vec2d
 
+from dataclasses import dataclass
+
 FRICTION = 0.7
+WALL_RADIUS = 1.0
+SPEED = 0.005 # robot movement per motor unit per step
+DRAG = 0.0
+STEP_RATE = 1/60 # seconds of robot time per step
+
+# shape filter categories, so queries can tell what they hit (these don't change what collides)
+CATEGORY_WALL = 1
+CATEGORY_ROBOT = 2
+CATEGORY_TARGET = 4
+# bits above those are lanes, shapes in a lane only collide with the walls & their own lane.
+# lets independent scenes share a space (see MultiScene)
+LANE_SHIFT = 3
+MAX_LANES = 32 - LANE_SHIFT
+
+def get_shape_filter(category: int, lane: int | None = None, group=0) -> pymunk.ShapeFilter:
+    """
+    Filter for a robot or target shape, lane None collides with everything
+    """
+    if lane is None:
+        return pymunk.ShapeFilter(group=group, categories=category)
+    if not 0 <= lane < MAX_LANES:
+        raise ValueError(f"lane has to be between 0 & {MAX_LANES - 1}")
+    lane_bit = 1 << (LANE_SHIFT + lane)
+    return pymunk.ShapeFilter(group=group, categories=category | lane_bit, mask=CATEGORY_WALL | lane_bit)
+
+# physics settings for a scene, frozen so scenes with the same profile can be pooled together
+@dataclass(frozen=True)
+class PhysicsProfile:
+    time_step: float = 1.0 # physics time per step, speeds are tuned for 1
+    substeps: int = 1 # pymunk steps the time step is split into
+    iterations: int = 10 # pymunk solver iterations
+    sleep_time_threshold: float = 0.5 # idle time before bodies sleep, math.inf to never sleep
+    idle_speed_threshold: float = 0.0 # speed under which bodies count as idle, 0 lets pymunk pick
+    spatial_hash: tuple | None = None # (cell size, cell count) to use pymunk's spatial hash instead of its bb tree
+    friction: float = FRICTION
+    drag: float = DRAG # fraction of velocity lost per unit of time
+    speed: float = SPEED # robot movement per motor unit per step
+    step_rate: float = STEP_RATE # seconds of robot time per step, for the camera's look time
+
+# what scenes used before profiles existed
+DEFAULT_PROFILE = PhysicsProfile()
+PHYSICS_PROFILES = {
+    "default": DEFAULT_PROFILE,
+    # cheaper solving, bodies nodding off sooner
+    "fast": PhysicsProfile(iterations=4, sleep_time_threshold=0.25),
+    # small substeps, a converged solver & nothing asleep, to compare the cheaper profiles against
+    "high_fidelity": PhysicsProfile(substeps=4, iterations=30, sleep_time_threshold=math.inf),
+}
 
 # a class for managing the physics of the robots & target
 class PhysicsManager:
-    def __init__(self, arena_width, arena_height) -> None:
+    def __init__(self, arena_width, arena_height, profile: PhysicsProfile = DEFAULT_PROFILE) -> None:
        # set up pymunk
+        self.profile = profile
+        self.arena_size = (arena_width, arena_height)
+        self.objects = [] # bodies & shapes in the order they were added, see reset()
+        self.create_space()
+
+        self.draw_options = None
+
+    def create_space(self):
+        profile = self.profile
         self.space = pymunk.Space()
-        self.space.iterations = 10
-        self.space.sleep_time_threshold = 0.5
+        self.space.iterations = profile.iterations
+        self.space.sleep_time_threshold = profile.sleep_time_threshold
+        self.space.idle_speed_threshold = profile.idle_speed_threshold
+        self.space.damping = 1 - profile.drag
+        if profile.spatial_hash:
+            self.space.use_spatial_hash(*profile.spatial_hash)
 
         self.static_body = self.space.static_body
-        self.init(arena_width, arena_height)
+        self.init(*self.arena_size)
 
-        self.draw_options = None
+    def reset(self):
+        """
+        Moves every body & shape into a new space (in the order they were first added), so nothing pymunk
+        kept from earlier steps (cached contacts, sleeping bodies, its spatial index) carries over.
+        A space reset after a run then steps exactly like one that was just built
+        """
+        self.space.remove(*self.objects)
+        self.create_space()
+        self.space.add(*self.objects)
+
+    def add(self, *objects):
+        # bodies & shapes that stay in the space, reset() takes them along
+        self.objects += objects
+        self.space.add(*objects)
 
     def init(self, width, height) -> None:
         # set up arena
-        shape = pymunk.Segment(self.static_body, (1, 1), (1, height), 1.0)
+        wall_filter = pymunk.ShapeFilter(categories=CATEGORY_WALL)
+        # (left, top, right, bottom) of the inside faces of the walls
+        self.wall_bounds = (1 + WALL_RADIUS, 1 + WALL_RADIUS, width - WALL_RADIUS, height - WALL_RADIUS)
+        shape = pymunk.Segment(self.static_body, (1, 1), (1, height), WALL_RADIUS)
         self.space.add(shape)
         shape.elasticity = 1
         shape.friction = 1
+        shape.filter = wall_filter
 
-        shape = pymunk.Segment(self.static_body, (width, 1), (width, height), 1.0)
+        shape = pymunk.Segment(self.static_body, (width, 1), (width, height), WALL_RADIUS)
         self.space.add(shape)
         shape.elasticity = 1
         shape.friction = 1
+        shape.filter = wall_filter
 
-        shape = pymunk.Segment(self.static_body, (1, 1), (width, 1), 1.0)
+        shape = pymunk.Segment(self.static_body, (1, 1), (width, 1), WALL_RADIUS)
         self.space.add(shape)
         shape.elasticity = 1
         shape.friction = 1
+        shape.filter = wall_filter
 
-        shape = pymunk.Segment(self.static_body, (1, height), (width, height), 1.0)
+        shape = pymunk.Segment(self.static_body, (1, height), (width, height), WALL_RADIUS)
         self.space.add(shape)
         shape.elasticity = 1
         shape.friction = 1
+        shape.filter = wall_filter
     
     @staticmethod
     def get_pos(x, y):
@@ -45,20 +129,23 @@ class PhysicsManager:
 
     def add_box(self, size, mass, pos: Vec2d):
         body = pymunk.Body()
-        self.space.add(body)
+        self.add(body)
 
         body.position = pos
 
         shape = pymunk.Poly.create_box(body, size, 0.0)
         shape.mass = mass
-        shape.friction = FRICTION
-        self.space.add(shape)
+        shape.friction = self.profile.friction
+        self.add(shape)
 
         return shape
     
-    def update(self, time_step):
-        # update bodies
-        self.space.step(time_step)
+    def update(self):
+        # update bodies, one step of the profile
+        substeps = self.profile.substeps
+        dt = self.profile.time_step / substeps
+        for i in range(substeps):
+            self.space.step(dt)
     
     def set_draw_options(self, surf):
         self.draw_options = pymunk.pygame_util.DrawOptions(surf)
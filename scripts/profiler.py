@@ -0,0 +1,126 @@
+import time
+
+import numpy as np
+
+PHASES = ("activate", "motors", "see", "targets", "physics", "draw")
+MIN_NS = 16 # lower edge of the first histogram bin
+BINS_PER_OCTAVE = 8 # ~9% wide bins, percentiles are only as exact as this
+NUM_BINS = 30 * BINS_PER_OCTAVE # up to ~17 seconds
+BIN_EDGES = MIN_NS * 2.0 ** (np.arange(NUM_BINS + 1) / BINS_PER_OCTAVE)
+
+# timers & counters for the phases of a simulation step, off unless enabled is set
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.stack = None # frames prefixed to folded stacks (eg. "genome 12;run 0"), None to not record stacks
+        self.reset()
+
+    def reset(self):
+        self.samples = {phase: [] for phase in PHASES} # raw ns, folded into the histograms by flush()
+        self.histograms = {phase: np.zeros(NUM_BINS, dtype=np.int64) for phase in PHASES}
+        self.totals = {phase: 0 for phase in PHASES} # ns
+        self.counters = {}
+        self.stacks = {} # folded stack -> ns
+
+    def record(self, phase: str, ns: int):
+        self.samples[phase].append(ns)
+        if self.stack is not None:
+            key = f"{self.stack};{phase}"
+            self.stacks[key] = self.stacks.get(key, 0) + ns
+
+    def start(self) -> int:
+        # start of a phase, for lap()
+        return time.perf_counter_ns()
+
+    def lap(self, phase: str, start: int) -> int:
+        """
+        Records the time since start under phase & returns the current time, for timing phases back to back
+        """
+        now = time.perf_counter_ns()
+        self.record(phase, now - start)
+        return now
+
+    def count(self, name: str, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def flush(self):
+        # keeps memory bounded, call every now & then (eg. after each run)
+        for phase, samples in self.samples.items():
+            if not samples:
+                continue
+            samples = np.array(samples, dtype=np.int64)
+            bins = np.clip(np.searchsorted(BIN_EDGES, samples, side="right") - 1, 0, NUM_BINS - 1)
+            self.histograms[phase] += np.bincount(bins, minlength=NUM_BINS)
+            self.totals[phase] += int(samples.sum())
+            self.samples[phase] = []
+
+    def drain(self) -> dict:
+        """
+        Returns everything recorded so far (small & picklable, see merge()) & starts over
+        """
+        self.flush()
+        data = {"histograms": self.histograms, "totals": self.totals, "counters": self.counters, "stacks": self.stacks}
+        self.reset()
+        return data
+
+    def merge(self, data: dict):
+        """
+        Adds the output of another profiler's drain(), eg. from a worker
+        """
+        self.flush()
+        for phase in PHASES:
+            self.histograms[phase] += data["histograms"][phase]
+            self.totals[phase] += data["totals"][phase]
+        for name, n in data["counters"].items():
+            self.count(name, n)
+        for key, ns in data["stacks"].items():
+            self.stacks[key] = self.stacks.get(key, 0) + ns
+
+    def percentile(self, phase: str, q: float) -> float:
+        """
+        q-th percentile of phase in ns (upper edge of the bin it falls in), 0 if nothing was recorded
+        """
+        counts = np.cumsum(self.histograms[phase])
+        if counts[-1] == 0:
+            return 0.0
+        return float(BIN_EDGES[np.searchsorted(counts, counts[-1] * q / 100) + 1])
+
+    def summary(self) -> str:
+        self.flush()
+        lines = [f"{'phase':<10}{'calls':>10}{'total ms':>11}{'mean us':>10}{'p50 us':>9}{'p90 us':>9}{'p99 us':>9}"]
+        for phase in PHASES:
+            calls = int(self.histograms[phase].sum())
+            if not calls:
+                continue
+            total = self.totals[phase]
+            lines.append(f"{phase:<10}{calls:>10}{total / 1e6:>11.1f}{total / calls / 1e3:>10.2f}" +
+                         "".join(f"{self.percentile(phase, q) / 1e3:>9.2f}" for q in (50, 90, 99)))
+        if self.counters:
+            lines.append(", ".join(f"{name}: {n}" for name, n in sorted(self.counters.items())))
+        return "\n".join(lines)
+
+    def write_stacks(self, path):
+        """
+        Writes the recorded stacks in the folded format flamegraph.pl & speedscope read (values in ns)
+        """
+        with open(path, "w") as f:
+            for key, ns in sorted(self.stacks.items()):
+                f.write(f"{key} {ns}\n")
+
+# one profiler per process, workers send theirs back with each chunk of results
+profiler = Profiler()
+
+# stands in for the profiler while it's off, so timed code doesn't need a second untimed copy
+class NullTimer:
+    enabled = False
+
+    def start(self) -> int:
+        return 0
+
+    def lap(self, phase: str, start: int) -> int:
+        return 0
+
+    def count(self, name: str, n=1):
+        pass
+
+null_timer = NullTimer()
@@ -0,0 +1,120 @@
+import math
+
+import numpy as np
+import pymunk
+
+from .physics_world import PhysicsManager, CATEGORY_WALL, CATEGORY_ROBOT, CATEGORY_TARGET
+
+# hit types in RaySensor readings
+HIT_NONE = 0
+HIT_WALL = 1
+HIT_TARGET = 2
+HIT_ROBOT = 3 # another robot
+
+# fan of rays cast from the robot across its field of view, stopped by walls, targets & other robots
+class RaySensor:
+    def __init__(self, physics_manager: PhysicsManager, num_rays: int, fov: float, max_range: float):
+        """
+        physics_manager: physics of the scene the rays are cast in
+        num_rays: number of rays, spread evenly across fov from edge to edge (a single ray looks straight ahead)
+        fov: angle between the outermost rays, in radians
+        max_range: length of the rays, rays that don't hit anything read this distance
+        """
+        self.physics_manager = physics_manager
+        self.wall_bounds = physics_manager.wall_bounds
+        self.num_rays = num_rays
+        self.max_range = max_range
+
+        # ray directions relative to the robot, rotated each step instead of working out every ray's angle again
+        self.offsets = np.linspace(-fov / 2, fov / 2, num_rays).tolist() if num_rays > 1 else [0.0]
+        self.directions = [(math.cos(offset), math.sin(offset)) for offset in self.offsets]
+        self.ray_ends = [(dx * max_range, dy * max_range) for dx, dy in self.directions] # facing along the x axis
+
+        self.readings = np.zeros((num_rays, 2)) # (distance, hit type) for each ray, overwritten by sense()
+        self.queries = 0 # pymunk segment queries made, to see how well the culling works
+
+    @staticmethod
+    def get_hit_type(categories: int) -> int:
+        # shapes in a lane have its bit set too
+        if categories & CATEGORY_TARGET:
+            return HIT_TARGET
+        if categories & CATEGORY_ROBOT:
+            return HIT_ROBOT
+        if categories & CATEGORY_WALL:
+            return HIT_WALL
+        return HIT_NONE
+
+    def sense(self, robot) -> np.ndarray:
+        """
+        Casts the rays from robot. Returns (num_rays, 2) array of (distance, hit type), from the left most ray.
+        The same array is reused every call, copy it to keep it.
+        """
+        # a pymunk query costs about as much as the rest of this put together, so rays only get one if they
+        # could hit something that moves. the walls never move, so their distance is worked out directly
+
+        # same heading as Scene.see(), taken from the robot so it's right before the body follows the motors
+        heading = -robot.angle - math.pi * 0.5
+        cos = math.cos(heading)
+        sin = math.sin(heading)
+        start = robot.get_center()
+        x, y = start.x, start.y
+        left, top, right, bottom = self.wall_bounds
+        inside = left < x < right and top < y < bottom
+
+        readings = self.readings
+        need_query = [not inside] * self.num_rays
+        min_x = max_x = x
+        min_y = max_y = y
+        for i, (dx, dy) in enumerate(self.directions):
+            dx, dy = dx * cos - dy * sin, dx * sin + dy * cos
+            # distance to the wall the ray points at
+            distance = self.max_range
+            if dx > 0:
+                distance = min(distance, (right - x) / dx)
+            elif dx < 0:
+                distance = min(distance, (left - x) / dx)
+            if dy > 0:
+                distance = min(distance, (bottom - y) / dy)
+            elif dy < 0:
+                distance = min(distance, (top - y) / dy)
+            readings[i, 0] = distance
+            readings[i, 1] = HIT_WALL if distance < self.max_range else HIT_NONE
+            end_x = x + dx * distance
+            end_y = y + dy * distance
+            min_x, max_x = min(min_x, end_x), max(max_x, end_x)
+            min_y, max_y = min(min_y, end_y), max(max_y, end_y)
+
+        # the robot's own shape is in its filter group, so rays starting inside it don't hit it
+        shape_filter = robot.shape.filter
+        if inside:
+            # anything that moves & is near enough the rays to be hit, then only the rays pointing at it need a query
+            moving_filter = pymunk.ShapeFilter(group=shape_filter.group, categories=shape_filter.categories,
+                                               mask=shape_filter.mask & ~CATEGORY_WALL)
+            for shape in self.physics_manager.space.bb_query(pymunk.BB(min_x, min_y, max_x, max_y), moving_filter):
+                bb = shape.bb
+                radius = math.hypot(bb.right - bb.left, bb.top - bb.bottom) / 2
+                center_x = (bb.left + bb.right) / 2 - x
+                center_y = (bb.bottom + bb.top) / 2 - y
+                distance = math.hypot(center_x, center_y)
+                if distance <= radius:
+                    need_query = [True] * self.num_rays
+                    break
+                bearing = ((math.atan2(center_y, center_x) - heading + math.pi) % (math.pi * 2)) - math.pi
+                spread = math.asin(radius / distance)
+                for i, offset in enumerate(self.offsets):
+                    if abs(offset - bearing) <= spread:
+                        need_query[i] = True
+
+        for i, (end_x, end_y) in enumerate(self.ray_ends):
+            if not need_query[i]:
+                continue
+            self.queries += 1
+            end = (x + end_x * cos - end_y * sin, y + end_x * sin + end_y * cos)
+            hit = self.physics_manager.space.segment_query_first((x, y), end, 0, shape_filter)
+            if hit is None:
+                readings[i, 0] = self.max_range
+                readings[i, 1] = HIT_NONE
+            else:
+                readings[i, 0] = hit.alpha * self.max_range
+                readings[i, 1] = self.get_hit_type(hit.shape.filter.categories)
+        return readings
@@ -0,0 +1,75 @@
+from collections import OrderedDict
+
+import pygame
+
+ANGLE_STEP = 1.0 # sprites are rotated to the nearest multiple of this many degrees
+MAX_SPRITES = 2048 # rotated sprites kept, least recently used go first
+MAX_BACKGROUNDS = 8 # pre rendered backgrounds kept
+
+# rotated sprites & static backgrounds, so drawing a frame is mostly blits of surfaces made in earlier frames
+class RenderCache:
+    def __init__(self, angle_step=ANGLE_STEP, max_sprites=MAX_SPRITES, max_backgrounds=MAX_BACKGROUNDS):
+        """
+        angle_step: rotations are rounded to this (in degrees), bigger steps reuse more sprites but look choppier
+        max_sprites: number of rotated sprites to keep
+        max_backgrounds: number of backgrounds to keep
+        """
+        self.angle_step = angle_step
+        self.max_sprites = max_sprites
+        self.max_backgrounds = max_backgrounds
+        self.sprites = OrderedDict() # (width, height, color, angle) -> rotated surface
+        self.backgrounds = OrderedDict() # key -> surface
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.sprites.clear()
+        self.backgrounds.clear()
+
+    def get_sprite(self, dimensions, color: tuple, angle: float) -> pygame.Surface:
+        """
+        Filled rectangle of dimensions rotated by angle (degrees, counter clockwise like pygame.transform.rotate)
+        """
+        angle = round(angle / self.angle_step) * self.angle_step % 360
+        key = (int(dimensions[0]), int(dimensions[1]), color, angle)
+        sprite = self.sprites.get(key)
+        if sprite is not None:
+            self.hits += 1
+            self.sprites.move_to_end(key)
+            return sprite
+
+        self.misses += 1
+        surf = pygame.Surface(key[:2])
+        surf.fill(color)
+        """
+        We don't need a colorkey in the general sense, but
+        otherwise pygame.transform.rotate() will fill in any
+        gaps with the average value from the surface (white)
+        """
+        surf.set_colorkey((255, 255, 255))
+        sprite = pygame.transform.rotate(surf, angle)
+        self.sprites[key] = sprite
+        if len(self.sprites) > self.max_sprites:
+            self.sprites.popitem(last=False)
+        return sprite
+
+    def get_background(self, size, key, draw) -> pygame.Surface:
+        """
+        Surface of size drawn by draw(surface) the first time key is asked for, key has to
+        cover everything that changes what draw() does (eg. the scroll)
+        """
+        key = (tuple(size), key)
+        background = self.backgrounds.get(key)
+        if background is not None:
+            self.backgrounds.move_to_end(key)
+            return background
+
+        background = pygame.Surface(size)
+        draw(background)
+        self.backgrounds[key] = background
+        if len(self.backgrounds) > self.max_backgrounds:
+            self.backgrounds.popitem(last=False)
+        return background
+
+# shared by every scene drawn in this process
+render_cache = RenderCache()
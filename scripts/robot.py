@@ -1,12 +1,12 @@
 # class for robot in robot simulation
-import pygame, math
-from .physics_world import PhysicsManager
+import pygame, math, itertools
+from .physics_world import PhysicsManager, CATEGORY_ROBOT, SPEED, DRAG, get_shape_filter
+from .render_cache import render_cache
 
 # for physics
 import pymunk
 
-DRAG = 0.0
-SPEED = 0.005
+filter_groups = itertools.count(1) # every robot gets its own group, so its sensors can ignore its own shape
 
 class Robot:
     def __init__(self, pos: pygame.Vector2, angle: float, dimensions: pygame.Vector2) -> None:
@@ -20,13 +20,47 @@ class Robot:
 
         self.shape = None
         self.controller_body = None
+        self.speed = SPEED
+        self.time_step = 1.0
 
-    def init(self, physics_manager: PhysicsManager):
+    def init(self, physics_manager: PhysicsManager, lane=None):
+        self.speed = physics_manager.profile.speed
+        self.time_step = physics_manager.profile.time_step
         # box shape
         self.controller_body = pymunk.Body(body_type=pymunk.Body.KINEMATIC)
         self.controller_body.friction = 0.0
         self.shape = pymunk.Poly.create_box(self.controller_body, (self.dimensions.x, self.dimensions.y), 0.0)
-        physics_manager.space.add(self.shape.body, self.shape)
+        self.shape.filter = get_shape_filter(CATEGORY_ROBOT, lane, group=next(filter_groups))
+        physics_manager.add(self.shape.body, self.shape)
+
+    def reset(self, pos: pygame.Vector2, angle: float) -> None:
+        self.pos = pygame.Vector2(pos)
+        self.angle = angle
+        self.stop()
+
+        if self.controller_body:
+            # a new body starts at the origin & only follows the robot once the motors are updated
+            self.controller_body.position = (0, 0)
+            self.controller_body.velocity = (0, 0)
+            self.controller_body.angle = 0
+            self.controller_body.angular_velocity = 0
+
+    def get_state(self) -> list:
+        body = self.controller_body
+        return [self.pos.x, self.pos.y, self.angle, self.motor_left, self.motor_right,
+                body.position.x, body.position.y, body.velocity.x, body.velocity.y, body.angle, body.angular_velocity]
+
+    def set_state(self, state: list) -> None:
+        """
+        Restores what get_state() returned
+        """
+        self.pos = pygame.Vector2(state[0], state[1])
+        self.angle, self.motor_left, self.motor_right = state[2:5]
+        body = self.controller_body
+        body.position = (state[5], state[6])
+        body.velocity = (state[7], state[8])
+        body.angle = state[9]
+        body.angular_velocity = state[10]
 
     def stop(self) -> None:
         self.motor_left = 0.0
@@ -34,10 +68,10 @@ class Robot:
 
     def set_left_motor(self, val) -> None:
         # max analog value for motor is 255
-        self.motor_right = max(-255, min(val, 255)) * SPEED
+        self.motor_right = max(-255, min(val, 255)) * self.speed
 
     def set_right_motor(self, val) -> None:
-        self.motor_left = max(-255, min(val, 255)) * SPEED
+        self.motor_left = max(-255, min(val, 255)) * self.speed
     
     def get_angle(self) -> float:
         return self.angle + math.pi * 0.5
@@ -50,8 +84,9 @@ class Robot:
         self.pos.y -= ((self.motor_left + self.motor_right) / 2) * math.sin(self.angle + math.pi * 0.5)
         self.angle -= (self.motor_right - self.motor_left) / self.dimensions.x
 
+        # fast enough to reach the new position in one step
         self.shape.body.velocity = pymunk.vec2d.Vec2d(self.pos.x + self.dimensions.x / 2 - self.shape.body.position.x,
-                                                       self.pos.y + self.dimensions.y / 2 - self.shape.body.position.y)
+                                                       self.pos.y + self.dimensions.y / 2 - self.shape.body.position.y) / self.time_step
         self.shape.body.angle = -self.angle
 
     @staticmethod
@@ -91,24 +126,20 @@ class Robot:
         # check for actual collision
         return rect.collidepoint(collide_point.x, collide_point.y)
 
-    def draw(self, screen: pygame.Surface, scroll: pygame.Vector2) -> None:
-        scroll = pygame.Vector2(scroll)
-        surf = pygame.Surface(self.dimensions)
-        surf.fill((100, 100, 100))
+    def draw(self, screen: pygame.Surface, scroll: pygame.Vector2) -> pygame.Rect:
         """
-        We don't need a colorkey in the general sense, but
-        otherwise pygame.transform.rotate() will fill in any
-        gaps with the average value from the surface (white)
+        Returns the area drawn over
         """
-        surf.set_colorkey((255, 255, 255))
-        rot_surf = pygame.transform.rotate(surf, math.degrees(self.angle))
+        scroll = pygame.Vector2(scroll)
+        rot_surf = render_cache.get_sprite(self.dimensions, (100, 100, 100), math.degrees(self.angle))
         # draw rotated rect
-        screen.blit(rot_surf, (self.pos.x - scroll.x - rot_surf.get_width() / 2 + surf.get_width() / 2,
-                               self.pos.y - scroll.y - rot_surf.get_height() / 2 + surf.get_height() / 2))
+        rect = screen.blit(rot_surf, (self.pos.x - scroll.x - rot_surf.get_width() / 2 + int(self.dimensions.x) / 2,
+                                      self.pos.y - scroll.y - rot_surf.get_height() / 2 + int(self.dimensions.y) / 2))
         
         # draw lines for direction
         center_pos = self.get_center()
         line_length = self.dimensions.y / 2 + 10
-        pygame.draw.line(screen, (255, 0, 0), (center_pos.x - scroll.x, center_pos.y - scroll.y), (center_pos.x - scroll.x + math.cos(self.angle + math.pi * 0.5) * line_length, center_pos.y - scroll.y - math.sin(self.angle + math.pi * 0.5) * line_length))
-        pygame.draw.line(screen, (0, 0, 255), (center_pos.x - scroll.x - math.cos(self.angle) * (self.dimensions.x / 2), center_pos.y - scroll.y + math.sin(self.angle) * (self.dimensions.x / 2)),
-                                              (center_pos.x - scroll.x + math.cos(self.angle) * (self.dimensions.x / 2), center_pos.y - scroll.y - math.sin(self.angle) * (self.dimensions.x / 2)))
\ No newline at end of file
+        rect.union_ip(pygame.draw.line(screen, (255, 0, 0), (center_pos.x - scroll.x, center_pos.y - scroll.y), (center_pos.x - scroll.x + math.cos(self.angle + math.pi * 0.5) * line_length, center_pos.y - scroll.y - math.sin(self.angle + math.pi * 0.5) * line_length)))
+        rect.union_ip(pygame.draw.line(screen, (0, 0, 255), (center_pos.x - scroll.x - math.cos(self.angle) * (self.dimensions.x / 2), center_pos.y - scroll.y + math.sin(self.angle) * (self.dimensions.x / 2)),
+                                                            (center_pos.x - scroll.x + math.cos(self.angle) * (self.dimensions.x / 2), center_pos.y - scroll.y - math.sin(self.angle) * (self.dimensions.x / 2))))
+        return rect
\ No newline at end of file
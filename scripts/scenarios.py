@@ -0,0 +1,27 @@
+import random
+
+# seeded scenario layouts shared by every genome in a generation (common random numbers)
+class ScenarioSet:
+    def __init__(self, num_scenarios, seed=None, resample=True):
+        """
+        Draws the scene seeds every genome gets evaluated on.\n
+        num_scenarios: number of seeded layouts per generation (one per run)
+        seed: master seed, the same master seed always gives the same seeds for each generation
+        resample: draw new layouts every generation, otherwise generation 0's are reused
+        """
+        self.num_scenarios = num_scenarios
+        self.seed = seed if seed is not None else random.getrandbits(32)
+        self.resample = resample
+
+        self.generation = -1
+        self.seeds = ()
+
+    def get_seeds(self, generation) -> tuple:
+        # derived from (seed, generation) only, so any generation can be reproduced on its own
+        rng = random.Random(f"{self.seed}:{generation if self.resample else 0}")
+        return tuple(rng.getrandbits(32) for _ in range(self.num_scenarios))
+
+    def next_generation(self) -> tuple:
+        self.generation += 1
+        self.seeds = self.get_seeds(self.generation)
+        return self.seeds
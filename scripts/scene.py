@@ -8,11 +8,22 @@ pygame.font.init()
 
 from .robot import Robot
 from .target import Target
-from .physics_world import PhysicsManager
+from .physics_world import PhysicsManager, PhysicsProfile, DEFAULT_PROFILE, STEP_RATE
+from .spatial_grid import SpatialGrid
+from .ray_sensor import RaySensor, HIT_WALL, HIT_TARGET, HIT_ROBOT
+from .profiler import profiler, null_timer
+from .trajectory import TrajectoryRecorder
+from .render_cache import render_cache
 
 FOV = math.radians(80.0)
 LOOK_TIME = 1 # 1 second to check the camera
-STEP_RATE = 1/60
+ROBOT_STATE_SIZE = 11 # length of Robot.get_state()
+TARGET_STATE_SIZE = 9 # length of Target.get_state()
+GRID_MIN_TARGETS = 32 # fewer targets than this are just all checked, the grid only pays off with lots of them
+GRID_CELL_SIZE = 64 # cell size of the grid targets are looked up in
+TILE_SIZE = (20, 20) # of the background grid
+SEARCH_TARGETS = 8 # the first search for the k closest targets is sized to find about this many times k
+SEARCH_GROWTH = 4 # the search radius grows this much until enough targets are found
 
 # marker info
 @dataclass
@@ -21,54 +32,258 @@ class TargetInfo:
     bearing_y: float
     ID: int
 
+# everything needed to carry on a scene from a given step (see Scene.snapshot())
+@dataclass
+class SceneState:
+    data: np.ndarray # step, stall, robot state, then each target's state
+    seen_targets: np.ndarray # (distance, bearing_y, target index) rows
+    rng_state: tuple
+    seed: int | None
+
 class Scene:
-    def __init__(self, num_targets=4, width=1000, height=640, draw_debug_joints=False):
+    def __init__(self, num_targets=4, width=1000, height=640, draw_debug_joints=False, headless=False, seed=None, max_seen=None, num_rays=0,
+                 physics_profile: PhysicsProfile = DEFAULT_PROFILE, physics_manager: PhysicsManager | None = None, lane=None,
+                 share_targets_with: "Scene | None" = None):
         """
         Class to handle robot & targets simulation.\n
         display: toggles whether scene should by drawn\n
         num_targets: number of targets to display
         width: width of screen & arena
         height: height of screen & arena
+        headless: skips creating the screen & font, and never draws anything (for training)
+        seed: seed for this scene's random layout & junk inputs, the same seed always gives the same scene
+        max_seen: tick() only keeps the closest this many targets the camera sees (None keeps all of them),
+        1 is enough when only get_closest_target() is used & makes looking much cheaper with lots of targets
+        num_rays: rays in the ray sensor (see RaySensor), their (distance, hit type) readings are added to
+        the net inputs every step. 0 turns the sensor off
+        physics_profile: timestep, solver & other physics settings (see PHYSICS_PROFILES)\n
+        the rest are for putting several scenes in one physics space (see MultiScene):
+        physics_manager: space shared with other scenes, whoever owns it steps it (tick() doesn't)
+        lane: collision lane for the robot & targets, they only collide with walls & the same lane (None for everything)
+        share_targets_with: uses that scene's targets (which it updates & places) instead of having its own
         """
-        self.screen = pygame.Surface((width, height))
+        self.width = width
+        self.height = height
+        self.headless = headless
+        self.max_seen = max_seen
+        # no surface in headless mode, nothing should ever be drawn to it
+        self.screen = None if headless else pygame.Surface((width, height))
         self.scroll = pygame.Vector2(0, 0)
         self.draw_debug_joints = draw_debug_joints # toggles whether pymunk debugging objects should be drawn
+        # areas of the screen drawn over since the background was last put back (see draw())
+        self.dirty_rects = [self.screen.get_rect()] if self.screen else []
+        self.changed_rects = [] # areas the last draw() changed, for only updating those on the display
+        self.last_background = None
+        self.target_draws = [] # (pose, area) each target was last drawn with, unmoved targets are only redrawn if something drew over them
         self.paused = False
         self.step = 0
 
         self.user_input = False
 
-        self.font = pygame.font.Font(pygame.font.match_font("consolas"), 14)
+        self.font = None if headless else pygame.font.Font(pygame.font.match_font("consolas"), 14)
 
         # physics
-        self.physics_manager = PhysicsManager(self.screen.get_width(), self.screen.get_height())
+        self.owns_physics = physics_manager is None
+        self.physics_manager = PhysicsManager(self.width, self.height, physics_profile) if self.owns_physics else physics_manager
+        self.ready_steps = LOOK_TIME / self.physics_manager.profile.step_rate
+
+        # placed by reset()
+        self.robot = Robot((0, 0), 0, (20, 30))
+        self.robot.init(self.physics_manager, lane)
+
+        self.owns_targets = share_targets_with is None
+        if self.owns_targets:
+            self.targets = []
+            self.num_targets = num_targets
+            for t in range(num_targets):
+                self.targets.append(Target((0, 0), 0, (10, 10)))
+                self.targets[t].init(self.physics_manager, lane)
+            # with lots of targets see() looks them up in a grid of their positions instead of checking all of them.
+            # pymunk's own index doesn't do, it's only updated by stepping & Target.pos is set from before the step
+            self.target_grid = SpatialGrid(GRID_CELL_SIZE) if num_targets >= GRID_MIN_TARGETS else None
+        else:
+            self.targets = share_targets_with.targets
+            self.num_targets = share_targets_with.num_targets
+            self.target_grid = share_targets_with.target_grid
 
-        self.robot = Robot((random.random() * 100 + 10, random.random() + 100 + 10), 0, (20, 30))
-        self.robot.init(self.physics_manager)
+        # unlike the camera, the rays are blocked by walls & targets in the way
+        self.ray_sensor = RaySensor(self.physics_manager, num_rays, FOV, math.hypot(width, height)) if num_rays else None
 
-        self.targets = []
-        self.num_targets = num_targets
-        for t in range(num_targets):
-            self.targets.append(Target((random.randint(100, width - 100), random.randint(100, height - 100)), random.random() * 360, (10, 10)))
-            self.targets[t].init(self.physics_manager)
+        self.recording = False # see start_recording()
+        self.recorder = None
+        self.last_inputs = None # only kept while recording
         
+        self.reset(seed)
+
+    def reset(self, seed=None):
+        """
+        Puts the scene back to step 0 with the layout for seed, reusing the bodies. A scene that has
+        been run before then runs exactly like a new Scene(seed=seed)
+        """
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.step = 0
         self.stall = 1
         self.seen_targets = []
+
+        self.robot.reset((self.rng.random() * 100 + 10, self.rng.random() + 100 + 10), 0)
+        if self.owns_targets:
+            for target in self.targets:
+                target.reset((self.rng.randint(100, self.width - 100), self.rng.randint(100, self.height - 100)), self.rng.random() * 360)
+            if self.target_grid:
+                self.target_grid.clear()
+            self.update_target_grid()
+        # a shared space is reset by whoever owns it (see MultiScene.reset())
+        if self.owns_physics:
+            self.physics_manager.reset()
+
+    def update_targets(self):
+        # only the scene that owns the targets updates them, once per step
+        if not self.owns_targets:
+            return
+        for target in self.targets:
+            target.update()
+        self.update_target_grid()
+
+    def update_target_grid(self):
+        # call whenever Target.pos changes
+        if self.target_grid is None or not self.owns_targets:
+            return
+        for i, target in enumerate(self.targets):
+            self.target_grid.move(i, target.pos.x, target.pos.y)
     
+    def snapshot(self) -> SceneState:
+        """
+        Captures the scene so it can be restored later, eg. to fork many runs from the same state.
+        pymunk's contact caches aren't captured, so restoring in the middle of a collision can
+        give slightly different results.
+        """
+        data = [self.step, self.stall] + self.robot.get_state()
+        for target in self.targets:
+            data += target.get_state()
+
+        indices = {id(target): i for i, target in enumerate(self.targets)}
+        seen_targets = [(info.distance, info.bearing_y, indices[info.ID]) for info in self.seen_targets]
+
+        return SceneState(
+            data=np.array(data, dtype=np.float64),
+            seen_targets=np.array(seen_targets, dtype=np.float64).reshape(-1, 3),
+            rng_state=self.rng.getstate(),
+            seed=self.seed,
+        )
+
+    def restore(self, state: SceneState):
+        """
+        Puts the scene back to a snapshot of itself (or of a scene with the same settings)
+        """
+        data = state.data.tolist()
+        self.step = int(data[0])
+        self.stall = int(data[1])
+        self.robot.set_state(data[2:2 + ROBOT_STATE_SIZE])
+        for i, target in enumerate(self.targets):
+            start = 2 + ROBOT_STATE_SIZE + i * TARGET_STATE_SIZE
+            target.set_state(data[start:start + TARGET_STATE_SIZE])
+
+        self.seen_targets = [TargetInfo(distance=distance, bearing_y=bearing_y, ID=id(self.targets[int(i)]))
+                             for distance, bearing_y, i in state.seen_targets.tolist()]
+
+        self.seed = state.seed
+        self.rng.setstate(state.rng_state)
+        self.update_target_grid()
+
+    def warm_up(self):
+        """
+        Runs the stalled steps at the start, which are the same whatever the network outputs
+        (motors & camera are ignored until the scene is ready)
+        """
+        while not self.get_ready():
+            self.get_net_inputs() # keeps the junk inputs in step with a network driven run
+            self.tick()
+
+    def start_recording(self, max_steps=1000):
+        """
+        Records every following tick() (see TrajectoryRecorder), the network inputs are
+        taken from the last get_net_inputs() call. Starts over if already recording
+        """
+        if self.recorder is None:
+            self.recorder = TrajectoryRecorder(max_steps, self.num_targets, 8 + 2 * (self.ray_sensor.num_rays if self.ray_sensor else 0))
+        self.recorder.clear(self.step)
+        self.last_inputs = None
+        self.recording = True
+
+    def stop_recording(self) -> TrajectoryRecorder:
+        # the recorder (& its buffers) is kept for the next start_recording()
+        self.recording = False
+        return self.recorder
+
     def set_user_input_enabled(self, val: bool):
         self.user_input = val
 
     # draws grid to show positions more clearly
-    def draw_grid(self, size: list, color: tuple):
+    def draw_grid(self, size: list, color: tuple, surface: pygame.Surface | None = None):
+        surface = surface or self.screen
         tile_size = size
-        length = math.ceil(self.screen.get_width() / tile_size[0]) + 2
-        height = math.ceil(self.screen.get_height() / tile_size[1]) + 2
+        length = math.ceil(surface.get_width() / tile_size[0]) + 2
+        height = math.ceil(surface.get_height() / tile_size[1]) + 2
         for x in range(length):
-            pygame.draw.line(self.screen, color, ((x - 1) * tile_size[0] - (self.scroll[0] % tile_size[0]), 0), ((x - 1) * tile_size[0] - (self.scroll[0] % tile_size[0]), self.screen.get_height()))
+            pygame.draw.line(surface, color, ((x - 1) * tile_size[0] - (self.scroll[0] % tile_size[0]), 0), ((x - 1) * tile_size[0] - (self.scroll[0] % tile_size[0]), surface.get_height()))
         for y in range(height):
-            pygame.draw.line(self.screen, color, (0, (y - 1) * tile_size[1] - (self.scroll[1] % tile_size[1])), (self.screen.get_width(), (y - 1) * tile_size[1] - (self.scroll[1] % tile_size[1])))
+            pygame.draw.line(surface, color, (0, (y - 1) * tile_size[1] - (self.scroll[1] % tile_size[1])), (surface.get_width(), (y - 1) * tile_size[1] - (self.scroll[1] % tile_size[1])))
+
+    def draw_background(self, surface: pygame.Surface):
+        surface.fill((255, 255, 255))
+        self.draw_grid(TILE_SIZE, (220, 220, 220), surface)
+
+    def get_background(self) -> pygame.Surface:
+        # the grid repeats every tile, so only the scroll within a tile changes it
+        key = (self.scroll.x % TILE_SIZE[0], self.scroll.y % TILE_SIZE[1])
+        return render_cache.get_background(self.screen.get_size(), key, self.draw_background)
     
-    def see(self) -> list[Target]:
+    def get_view_bb(self, robot_pos, angle: float, radius: float) -> tuple:
+        """
+        Bounding box (left, top, right, bottom) of the part of the camera's view cone within radius of the robot
+        """
+        xs = [robot_pos[0]]
+        ys = [robot_pos[1]]
+        # the edges of the cone, & any axis directions inside it where the arc bulges out furthest
+        directions = [angle - FOV / 2, angle + FOV / 2]
+        directions += [d * math.pi / 2 for d in range(-4, 5) if abs(d * math.pi / 2 - angle) < FOV / 2]
+        for direction in directions:
+            xs.append(robot_pos[0] + math.cos(direction) * radius)
+            ys.append(robot_pos[1] + math.sin(direction) * radius)
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def find_targets(self, robot_pos, angle: float, radius: float, visited: set | None = None) -> list[TargetInfo]:
+        """
+        Every target in the camera's view within radius (& maybe some further away), closest first\n
+        visited: grid cells already searched, see SpatialGrid.query()
+        """
+        targets_found: list[TargetInfo] = []
+        if self.target_grid is None:
+            candidates = range(len(self.targets))
+        else:
+            candidates = self.target_grid.query(*self.get_view_bb(robot_pos, angle, radius), visited)
+        for i in candidates:
+            target = self.targets[i]
+            # in radians
+            angle2target = math.atan2(target.pos.y - robot_pos[1], target.pos.x - robot_pos[0])
+            anglediff = ((angle2target - angle + math.pi) % (math.pi * 2)) - math.pi
+            if abs(anglediff) < FOV / 2:
+                targets_found.append(TargetInfo(
+                    distance=math.sqrt((robot_pos[0] - target.pos.x) ** 2 + (robot_pos[1] - target.pos.y) ** 2), # get distance to target with pythagoras
+                    bearing_y=anglediff,
+                    ID=id(target) # doesn't matter as long as it's unique
+                ))
+        targets_found.sort(key=lambda info: info.distance)
+        return targets_found
+
+    def see(self, k=None) -> list[TargetInfo]:
+        """
+        Looks for targets in the camera's field of view. Returns them closest first & keeps them
+        for get_closest_target() (& the net inputs).\n
+        k: only find the k closest targets, the search starts close to the robot & grows until
+        it has found them, so with lots of targets only the ones near the robot get checked
+        """
         if self.get_ready():
             self.stall = 0
 
@@ -81,27 +296,38 @@ class Scene:
             robot_pos = self.robot.get_center()
 
             # debug drawing
-            pygame.draw.line(self.screen, (0, 255, 0), robot_pos, (robot_pos[0] + math.cos(upper_bound) * 1000, robot_pos[1] + math.sin(upper_bound) * 1000))
-            pygame.draw.line(self.screen, (0, 255, 0), robot_pos, (robot_pos[0] + math.cos(lower_bound) * 1000, robot_pos[1] + math.sin(lower_bound) * 1000))
+            if not self.headless:
+                self.dirty_rects.append(pygame.draw.line(self.screen, (0, 255, 0), robot_pos, (robot_pos[0] + math.cos(upper_bound) * 1000, robot_pos[1] + math.sin(upper_bound) * 1000)))
+                self.dirty_rects.append(pygame.draw.line(self.screen, (0, 255, 0), robot_pos, (robot_pos[0] + math.cos(lower_bound) * 1000, robot_pos[1] + math.sin(lower_bound) * 1000)))
 
-            targets_found: list[TargetInfo] = []
-            for target in self.targets:
-                # in radians
-                angle2target = math.atan2(target.pos.y - robot_pos[1], target.pos.x - robot_pos[0])
-                anglediff = ((angle2target - angle + math.pi) % (math.pi * 2)) - math.pi
-                if abs(anglediff) < FOV / 2:
-                    target_data = TargetInfo(
-                        distance=math.sqrt((robot_pos[0] - target.pos.x) ** 2 + (robot_pos[1] - target.pos.y) ** 2), # get distance to target with pythagoras
-                        bearing_y = anglediff,
-                        ID = id(target) # doesn't matter as long as it's unique
-                    )
-                    targets_found.append(target_data)
-                    pygame.draw.line(self.screen, (0, 255, 255), robot_pos, (robot_pos[0] + math.cos(angle2target) * 1000, robot_pos[1] + math.sin(angle2target) * 1000))
+            if self.target_grid is None:
+                targets_found = self.find_targets(robot_pos, angle, math.inf)[:k]
+            elif k is None:
+                targets_found = self.find_targets(robot_pos, angle, self.target_grid.get_max_distance(robot_pos[0], robot_pos[1]))
+            else:
+                # no target is further away than this
+                max_range = self.target_grid.get_max_distance(robot_pos[0], robot_pos[1])
+                # the view cone covers FOV / 2 * radius ** 2 of the arena
+                radius = math.sqrt(SEARCH_TARGETS * k * self.width * self.height / (len(self.targets) * FOV / 2))
+                visited = set()
+                targets_found = self.find_targets(robot_pos, angle, radius, visited)
+                # targets found outside the radius might not be the closest ones yet
+                while sum(info.distance <= radius for info in targets_found) < k and radius < max_range:
+                    radius = min(radius * SEARCH_GROWTH, max_range)
+                    targets_found += self.find_targets(robot_pos, angle, radius, visited)
+                targets_found.sort(key=lambda info: info.distance)
+                targets_found = targets_found[:k]
+
+            if not self.headless:
+                for target_data in targets_found:
+                    angle2target = angle + target_data.bearing_y
+                    self.dirty_rects.append(pygame.draw.line(self.screen, (0, 255, 255), robot_pos, (robot_pos[0] + math.cos(angle2target) * 1000, robot_pos[1] + math.sin(angle2target) * 1000)))
             self.seen_targets = targets_found
             return targets_found
         return []
 
     def get_closest_target(self) -> TargetInfo:
+        # see() sorts them closest first
         targets = self.seen_targets
         if len(targets):
             return targets[0]
@@ -109,11 +335,14 @@ class Scene:
             return None
     
     def get_net_inputs(self) -> tuple:
+        """
+        Inputs for the network, 8 values followed by (distance, hit type) for each ray if the ray sensor is on
+        """
         closest_target = self.get_closest_target()
         if not closest_target:
-            return (
-                random.random() * 1000, # junk values
-                random.random() * 1000, # trash
+            inputs = (
+                self.rng.random() * 1000, # junk values
+                self.rng.random() * 1000, # trash
                 self.robot.motor_left,
                 self.robot.motor_right,
                 self.robot.angle,
@@ -122,7 +351,7 @@ class Scene:
                 False,
             )
         else:
-            return (
+            inputs = (
                 closest_target.bearing_y,
                 closest_target.distance,
                 self.robot.motor_left,
@@ -132,10 +361,15 @@ class Scene:
                 self.stall,
                 True,
             )
+        if self.ray_sensor:
+            inputs += tuple(self.ray_sensor.sense(self.robot).ravel().tolist())
+        if self.recording:
+            self.last_inputs = inputs
+        return inputs
 
     def get_ready(self) -> bool:
         # check if we're done checking sensors
-        return self.stall > LOOK_TIME / STEP_RATE
+        return self.stall > self.ready_steps
 
     def set_motor_left(self, val) -> None:
         if self.get_ready():
@@ -149,9 +383,15 @@ class Scene:
         if self.get_ready():
             self.robot.stop()
 
-    def update(self):
+    def update(self, timer=null_timer, motors=0) -> int:
+        """
+        Moves the robot & targets, then steps the physics (if the scene owns it).\n
+        timer: profiler the phases are timed with (see tick())
+        motors: ns already spent on the motors this step, added to the motors phase
+        """
         # self.robot.set_left_motor(-60)
         # self.robot.set_right_motor(60)
+        t = timer.start() - motors
         if self.user_input:
             speed = 255
             if pygame.key.get_pressed()[pygame.K_w]:
@@ -169,46 +409,103 @@ class Scene:
         
         if self.get_ready():
             self.robot.update_motors()
-        
-        for target in self.targets:
-            target.update()
+        t = timer.lap("motors", t)
 
-        self.physics_manager.update(1)
+        self.update_targets()
+        t = timer.lap("targets", t)
+
+        if self.owns_physics:
+            self.physics_manager.update()
+            t = timer.lap("physics", t)
+        return t
 
     def draw(self):
-        self.screen.fill((255, 255, 255))
-        self.draw_grid([20, 20], (220, 220, 220))
+        """
+        Redraws the screen, only putting the background back where the last frame drew.
+        changed_rects is set to the areas that changed
+        """
+        if self.headless:
+            return
+        background = self.get_background()
+        poses = [(target.pos.x, target.pos.y, target.angle) for target in self.targets]
+        if background is not self.last_background or len(self.target_draws) != len(poses):
+            self.dirty_rects = [self.screen.get_rect()]
+            self.target_draws = [(None, None)] * len(poses)
+            self.last_background = background
+        # targets that moved get drawn again, everything else drawn last frame gets erased anyway
+        erased = self.dirty_rects + [rect for pose, (old_pose, rect) in zip(poses, self.target_draws) if pose != old_pose and rect]
+        for rect in erased:
+            self.screen.blit(background, rect, rect)
 
+        drawn = []
         # target
-        for target in self.targets:
-            target.draw(self.screen, self.scroll)
+        touched = list(erased) # also anything drawn since, so overlapping targets stay in order
+        for i, target in enumerate(self.targets):
+            old_pose, rect = self.target_draws[i]
+            if poses[i] != old_pose or rect.collidelist(touched) != -1:
+                rect = target.draw(self.screen, self.scroll)
+                self.target_draws[i] = (poses[i], rect)
+                drawn.append(rect)
+                touched.append(rect)
 
         # robot
-        self.robot.draw(self.screen, self.scroll)
+        self.dirty_rects = [self.robot.draw(self.screen, self.scroll)]
 
         if self.draw_debug_joints:
+            # draws anywhere, so the next frame puts back the whole background
             self.physics_manager.draw(self.screen)
+            if self.ray_sensor:
+                self.draw_rays()
+            self.dirty_rects.append(self.screen.get_rect())
 
-        self.screen.blit(self.font.render(f"Step: {self.step}", False, (255, 255, 255), (0, 0, 0)), (0, 0))
+        self.dirty_rects.append(self.screen.blit(self.font.render(f"Step: {self.step}", False, (255, 255, 255), (0, 0, 0)), (0, 0)))
+        self.changed_rects = erased + drawn + self.dirty_rects
     
+    def draw_rays(self):
+        # last readings of the ray sensor, coloured by what they hit
+        colors = {HIT_WALL: (255, 0, 0), HIT_TARGET: (0, 200, 0), HIT_ROBOT: (0, 0, 255)}
+        start = self.robot.get_center()
+        heading = -self.robot.angle - math.pi * 0.5
+        for (end_x, end_y), (distance, hit) in zip(self.ray_sensor.ray_ends, self.ray_sensor.readings):
+            # ray_ends are for a robot facing along the x axis
+            scale = distance / self.ray_sensor.max_range
+            end = pygame.Vector2(end_x * scale, end_y * scale).rotate_rad(heading) + start
+            pygame.draw.line(self.screen, colors.get(int(hit), (200, 200, 200)), start - self.scroll, end - self.scroll)
+
     def tick(self, output=None, display=False) -> pygame.Surface | None:
         """
         Executes one frame. Returns pygame.Surface if display is set to True
+        (always None for headless scenes)
         """
         # output: (
         #   motor_left,
         #   motor_right,
         # )
+        # the timers cost next to nothing while the profiler is off
+        timer = profiler if profiler.enabled else null_timer
+        t = timer.start()
         if output:
             self.set_motor_left(output[0])
             self.set_motor_right(output[1])
-            if output[2] >= 0.5:
-                self.see()
-        self.update()
+        motors = timer.start() - t
+
+        # the camera is used before the motors move the robot
+        if output and output[2] >= 0.5:
+            t = timer.start()
+            timer.count("see calls")
+            timer.count("targets seen", len(self.see(self.max_seen)))
+            timer.lap("see", t)
+
+        t = self.update(timer, motors) # both halves of the motors as one sample
         self.step += 1
         self.stall += 1
+        timer.count("steps")
+        if self.recording:
+            self.recorder.record(self.robot, self.targets, self.last_inputs, output)
+            self.last_inputs = None
 
-        if display:
+        if display and not self.headless:
             self.draw()
+            timer.lap("draw", t)
             return self.screen
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,100 @@
+from collections import OrderedDict
+
+from .scene import Scene, SceneState
+from .multi_scene import MultiScene
+
+WARM_CACHE_SIZE = 64
+
+# keeps built scenes around so runs can reset them instead of building new pymunk spaces
+class ScenePool:
+    def __init__(self):
+        self.free = {} # scene settings -> list of scenes not in use
+        self.warm_states = OrderedDict() # (scene settings, seed) -> snapshot after warm up
+        self.created = 0
+        self.reused = 0
+
+    @staticmethod
+    def get_key(kwargs: dict) -> tuple:
+        return tuple(sorted(kwargs.items()))
+
+    def get(self, seed=None, **kwargs) -> Scene:
+        """
+        Returns a scene built with kwargs (see Scene), reset to the layout for seed.
+        Give it back with release() once the run is done.
+        """
+        free = self.free.get(self.get_key(kwargs))
+        if free:
+            self.reused += 1
+            scene = free.pop()
+            scene.reset(seed)
+            return scene
+
+        self.created += 1
+        scene = Scene(seed=seed, **kwargs)
+        scene.pool_key = self.get_key(kwargs)
+        return scene
+
+    def get_warm(self, seed=None, **kwargs) -> Scene:
+        """
+        Like get(), but the scene has already done its warm up steps. The warm up is only
+        simulated once per seed & settings, after that it's restored from a snapshot.
+        """
+        scene = self.get(seed, **kwargs)
+        if seed is None:
+            # unseeded layouts are different every time, nothing to share
+            scene.warm_up()
+            return scene
+
+        key = (self.get_key(kwargs), seed)
+        state = self.warm_states.get(key)
+        if state is None:
+            scene.warm_up()
+            self.warm_states[key] = scene.snapshot()
+            if len(self.warm_states) > WARM_CACHE_SIZE:
+                self.warm_states.popitem(last=False)
+        else:
+            self.warm_states.move_to_end(key)
+            scene.restore(state)
+        return scene
+
+    def get_warm_state(self, seed, **kwargs) -> SceneState:
+        """
+        Snapshot of a scene built with kwargs after warming up with seed
+        """
+        key = (self.get_key(kwargs), seed)
+        state = self.warm_states.get(key)
+        if state is None:
+            self.release(self.get_warm(seed, **kwargs))
+            state = self.warm_states[key]
+        self.warm_states.move_to_end(key)
+        return state
+
+    def get_multi_warm(self, seeds, **kwargs) -> MultiScene:
+        """
+        MultiScene with a robot for each seed (built with kwargs, see Scene), after the warm up.
+        Each scene's warm up is restored from the same snapshot get_warm() would use.
+        Give it back with release() too.
+        """
+        key = ("multi", len(seeds)) + self.get_key(kwargs)
+        free = self.free.get(key)
+        if free:
+            self.reused += 1
+            multi = free.pop()
+            multi.reset(seeds)
+        else:
+            self.created += 1
+            multi = MultiScene(len(seeds), seeds=seeds, **kwargs)
+            multi.pool_key = key
+
+        if None in seeds:
+            multi.warm_up()
+        else:
+            for scene, seed in zip(multi.scenes, seeds):
+                scene.restore(self.get_warm_state(seed, **kwargs))
+        return multi
+
+    def release(self, scene: Scene | MultiScene):
+        self.free.setdefault(scene.pool_key, []).append(scene)
+
+# one pool per process, training workers only ever have one scene in use at a time
+scene_pool = ScenePool()
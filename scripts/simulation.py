@@ -3,8 +3,8 @@ from .scene import Scene
 NUM_TARGETS = 1
 
 class Simulation:
-    def __init__(self, width, height):
-        self.scene = Scene(num_targets=NUM_TARGETS, width=width, height=height)
+    def __init__(self, width, height, headless=False, seed=None):
+        self.scene = Scene(num_targets=NUM_TARGETS, width=width, height=height, headless=headless, seed=seed)
     
     def step(self, output, disp=False):
         # output: (
@@ -0,0 +1,69 @@
+import math
+
+# uniform grid of points, finds the points in an area without checking every one of them
+class SpatialGrid:
+    def __init__(self, cell_size: float):
+        """
+        cell_size: width & height of each cell, roughly the size of the areas queried works well
+        """
+        self.cell_size = cell_size
+        self.clear()
+
+    def clear(self):
+        self.cells = {} # (cell x, cell y) -> set of keys
+        self.key_cells = {} # key -> (cell x, cell y)
+        self.bounds = None # (min x, min y, max x, max y) of every cell used since clear(), queries are clipped to it
+
+    def get_cell(self, x: float, y: float) -> tuple:
+        return math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+
+    def move(self, key, x: float, y: float):
+        """
+        Puts key at (x, y), adding it if it isn't in the grid yet
+        """
+        cell = self.get_cell(x, y)
+        old_cell = self.key_cells.get(key)
+        if cell == old_cell:
+            return
+        if old_cell is not None:
+            self.cells[old_cell].discard(key)
+        self.cells.setdefault(cell, set()).add(key)
+        self.key_cells[key] = cell
+
+        if self.bounds is None:
+            self.bounds = cell + cell
+        else:
+            self.bounds = (min(self.bounds[0], cell[0]), min(self.bounds[1], cell[1]),
+                           max(self.bounds[2], cell[0]), max(self.bounds[3], cell[1]))
+
+    def get_max_distance(self, x: float, y: float) -> float:
+        """
+        Upper bound on the distance from (x, y) to any key in the grid
+        """
+        if self.bounds is None:
+            return 0.0
+        min_x, min_y, max_x, max_y = self.bounds
+        size = self.cell_size
+        return math.hypot(max(abs(x - min_x * size), abs(x - (max_x + 1) * size)),
+                          max(abs(y - min_y * size), abs(y - (max_y + 1) * size)))
+
+    def query(self, left: float, top: float, right: float, bottom: float, visited: set | None = None) -> list:
+        """
+        Keys in every cell overlapping the box, which can include some just outside it.\n
+        visited: cells in it are skipped & the cells looked at are added to it, for growing a search without repeating it
+        """
+        if self.bounds is None:
+            return []
+        min_x, min_y = self.get_cell(left, top)
+        max_x, max_y = self.get_cell(right, bottom)
+        keys = []
+        for cx in range(max(min_x, self.bounds[0]), min(max_x, self.bounds[2]) + 1):
+            for cy in range(max(min_y, self.bounds[1]), min(max_y, self.bounds[3]) + 1):
+                if visited is not None:
+                    if (cx, cy) in visited:
+                        continue
+                    visited.add((cx, cy))
+                cell = self.cells.get((cx, cy))
+                if cell:
+                    keys.extend(cell)
+        return keys
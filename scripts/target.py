@@ -1,7 +1,8 @@
 import pygame, math
 # for physics
 import pymunk
-from .physics_world import PhysicsManager
+from .physics_world import PhysicsManager, CATEGORY_TARGET, get_shape_filter
+from .render_cache import render_cache
 
 class Target:
     def __init__(self, pos: pygame.Vector2, angle: float, dimensions: pygame.Vector2):
@@ -11,9 +12,40 @@ class Target:
 
         self.shape = None
 
-    def init(self, physics_manager: PhysicsManager):
+    def init(self, physics_manager: PhysicsManager, lane=None):
         self.shape = physics_manager.add_box((self.dimensions.x, self.dimensions.y), 20, physics_manager.get_pos(self.pos.x, self.pos.y))
         self.shape.body.velocity_func = Target.damp_velocity
+        self.shape.filter = get_shape_filter(CATEGORY_TARGET, lane)
+
+    def reset(self, pos: pygame.Vector2, angle: float):
+        self.pos = pygame.Vector2(pos)
+        self.angle = angle
+
+        if self.shape:
+            body = self.shape.body
+            body.position = (self.pos.x, self.pos.y)
+            body.velocity = (0, 0)
+            body.angle = 0
+            body.angular_velocity = 0
+            body.force = (0, 0)
+            body.torque = 0
+
+    def get_state(self) -> list:
+        body = self.shape.body
+        return [self.pos.x, self.pos.y, self.angle,
+                body.position.x, body.position.y, body.velocity.x, body.velocity.y, body.angle, body.angular_velocity]
+
+    def set_state(self, state: list):
+        """
+        Restores what get_state() returned
+        """
+        self.pos = pygame.Vector2(state[0], state[1])
+        self.angle = state[2]
+        body = self.shape.body
+        body.position = (state[3], state[4])
+        body.velocity = (state[5], state[6])
+        body.angle = state[7]
+        body.angular_velocity = state[8]
 
     @staticmethod
     def damp_velocity(body, gravity, damping, dt):
@@ -31,24 +63,24 @@ class Target:
         return center_pos
 
     # basically the same as Robot().draw(...)
-    def draw(self, screen: pygame.Surface, scroll: pygame.Vector2) -> None:
-        scroll = pygame.Vector2(scroll)
-        surf = pygame.Surface(self.dimensions)
-        surf.fill((125, 150, 125))
+    def draw(self, screen: pygame.Surface, scroll: pygame.Vector2) -> pygame.Rect:
         """
-        We don't need a colorkey in the general sense, but
-        otherwise pygame.transform.rotate() will fill in any
-        gaps with the average value from the surface (white)
+        Returns the area drawn over
         """
-        surf.set_colorkey((255, 255, 255))
-        rot_surf = pygame.transform.rotate(surf, self.angle)
+        scroll = pygame.Vector2(scroll)
+        rot_surf = render_cache.get_sprite(self.dimensions, (125, 150, 125), self.angle)
         # draw rotated rect
-        screen.blit(rot_surf, (self.pos.x - scroll.x - rot_surf.get_width() / 2 + surf.get_width() / 2,
-                               self.pos.y - scroll.y - rot_surf.get_height() / 2 + surf.get_height() / 2))
+        rect = screen.blit(rot_surf, (self.pos.x - scroll.x - rot_surf.get_width() / 2 + int(self.dimensions.x) / 2,
+                                      self.pos.y - scroll.y - rot_surf.get_height() / 2 + int(self.dimensions.y) / 2))
         
         # draw lines for direction (useful for debugging)
         center_pos = self.get_center()
+        x, y = center_pos.x - scroll.x, center_pos.y - scroll.y
         line_length = self.dimensions.y / 2 # we don't want this one to jut out
-        pygame.draw.line(screen, (255, 255, 0), (center_pos.x - scroll.x, center_pos.y - scroll.y), (center_pos.x - scroll.x + math.cos(math.radians(self.angle + 90)) * line_length, center_pos.y - scroll.y - math.sin(math.radians(self.angle + 90)) * line_length))
-        pygame.draw.line(screen, (0, 255, 255), (center_pos.x - scroll.x - math.cos(math.radians(self.angle)) * (self.dimensions.x / 2), center_pos.y - scroll.y + math.sin(math.radians(self.angle)) * (self.dimensions.x / 2)),
-                                              (center_pos.x - scroll.x + math.cos(math.radians(self.angle)) * (self.dimensions.x / 2), center_pos.y - scroll.y - math.sin(math.radians(self.angle)) * (self.dimensions.x / 2)))
\ No newline at end of file
+        forward = math.radians(self.angle + 90)
+        side = math.radians(self.angle)
+        half_width = self.dimensions.x / 2
+        rect.union_ip(pygame.draw.line(screen, (255, 255, 0), (x, y), (x + math.cos(forward) * line_length, y - math.sin(forward) * line_length)))
+        rect.union_ip(pygame.draw.line(screen, (0, 255, 255), (x - math.cos(side) * half_width, y + math.sin(side) * half_width),
+                                                            (x + math.cos(side) * half_width, y - math.sin(side) * half_width)))
+        return rect
\ No newline at end of file
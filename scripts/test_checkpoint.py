@@ -0,0 +1,54 @@
+import os
+import random
+
+import neat
+import pytest
+
+from scripts.checkpoint import Checkpointer, load_checkpoint, restore_population
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), "..", "config.conf")
+
+def load_config():
+    return neat.Config(neat.DefaultGenome, neat.DefaultReproduction, neat.DefaultSpeciesSet, neat.DefaultStagnation, CONFIG_PATH)
+
+def evaluate(genomes, config):
+    # cheap & deterministic, anything that depends on the genes will do
+    for genome_id, genome in genomes:
+        genome.fitness = sum(cg.weight for cg in genome.connections.values() if cg.enabled) + len(genome.nodes)
+
+def describe(pop):
+    # everything about a population that the next generation depends on
+    genomes = sorted((key, genome.fitness, sorted((k, cg.weight, cg.enabled) for k, cg in genome.connections.items()),
+                      sorted((k, ng.bias, ng.response) for k, ng in genome.nodes.items()))
+                     for key, genome in pop.population.items())
+    species = sorted((sid, sorted(s.members)) for sid, s in pop.species.species.items())
+    return genomes, species, pop.best_genome.key, pop.best_genome.fitness, random.random()
+
+def test_resume_matches_uninterrupted_run(tmp_path):
+    random.seed(0)
+    pop = neat.Population(load_config())
+    checkpointer = Checkpointer(str(tmp_path), pop, base_every=2)
+    pop.add_reporter(checkpointer)
+    pop.run(evaluate, 7)
+    checkpointer.close()
+    expected = describe(pop)
+
+    # resumes from a delta record, so the chain has to be put back together
+    checkpoint = load_checkpoint(str(tmp_path), 5)
+    assert checkpoint.generation == 5
+    random.seed(1)
+    resumed = restore_population(checkpoint, load_config())
+    resumed.run(evaluate, 2)
+    assert describe(resumed) == expected
+
+def test_write_error_is_raised(tmp_path):
+    random.seed(0)
+    pop = neat.Population(load_config())
+    checkpointer = Checkpointer(str(tmp_path / "checkpoints"), pop)
+    pop.add_reporter(checkpointer)
+    pop.run(evaluate, 1)
+    # the chain file can't be opened from now on
+    os.rename(tmp_path / "checkpoints", tmp_path / "moved")
+    with pytest.raises(RuntimeError):
+        pop.run(evaluate, 3)
+        checkpointer.close()
@@ -0,0 +1,47 @@
+import os
+import random
+
+import neat
+
+from scripts.compiled_network import CompiledNetwork, NetworkCache, genome_hash
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), "..", "config.conf")
+
+def load_config():
+    return neat.Config(neat.DefaultGenome, neat.DefaultReproduction, neat.DefaultSpeciesSet, neat.DefaultStagnation, CONFIG_PATH)
+
+def make_genomes(config, count, mutations):
+    # mutated a lot, so there are hidden nodes, disabled connections & nodes that don't reach an output
+    random.seed(0)
+    genomes = []
+    for key in range(count):
+        genome = config.genome_type(key)
+        genome.configure_new(config.genome_config)
+        for _ in range(mutations):
+            genome.mutate(config.genome_config)
+            genome.mutate_add_node(config.genome_config)
+        genomes.append(genome)
+    return genomes
+
+def test_matches_feed_forward_network():
+    config = load_config()
+    rng = random.Random(1)
+    for genome in make_genomes(config, 20, 50):
+        net = neat.nn.FeedForwardNetwork.create(genome, config)
+        compiled = CompiledNetwork.create(genome, config)
+        for _ in range(20):
+            inputs = [rng.uniform(-1000, 1000) for _ in range(config.genome_config.num_inputs)]
+            assert compiled.activate(inputs) == net.activate(inputs)
+
+def test_cache_shares_networks():
+    config = load_config()
+    genome, other = make_genomes(config, 2, 10)
+    clone = config.genome_type(100)
+    clone.nodes = genome.nodes
+    clone.connections = genome.connections
+    assert genome_hash(clone) == genome_hash(genome) != genome_hash(other)
+
+    cache = NetworkCache()
+    assert cache.get(clone, config) is cache.get(genome, config)
+    assert cache.get(other, config) is not cache.get(genome, config)
+    assert (cache.hits, cache.misses) == (2, 2)
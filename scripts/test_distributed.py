@@ -0,0 +1,50 @@
+import os
+import threading
+
+import neat
+import pytest
+
+from scripts.distributed import Coordinator, run_worker
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), "..", "config.conf")
+
+def load_config():
+    return neat.Config(neat.DefaultGenome, neat.DefaultReproduction, neat.DefaultSpeciesSet, neat.DefaultStagnation, CONFIG_PATH)
+
+def make_genomes(config, count):
+    genomes = []
+    for key in range(1, count + 1):
+        genome = config.genome_type(key)
+        genome.configure_new(config.genome_config)
+        genomes.append((key, genome))
+    return genomes
+
+def count_nodes(genome, config):
+    return float(len(genome.nodes))
+
+def fail_on_first(genome, config):
+    if genome.key == 1:
+        raise ValueError("broken genome")
+    return 1.0
+
+def evaluate_with_worker(eval_function, genomes, config):
+    coordinator = Coordinator(config, "127.0.0.1", 0, chunk_size=2)
+    worker = threading.Thread(target=run_worker, args=(*coordinator.address, eval_function), daemon=True)
+    worker.start()
+    try:
+        return coordinator.evaluate(genomes, config)
+    finally:
+        coordinator.close()
+        worker.join(10)
+
+def test_evaluate():
+    config = load_config()
+    genomes = make_genomes(config, 5)
+    results = evaluate_with_worker(count_nodes, genomes, config)
+    assert results == {key: float(len(genome.nodes)) for key, genome in genomes}
+    assert all(genome.fitness == results[key] for key, genome in genomes)
+
+def test_worker_exception_fails_evaluate():
+    config = load_config()
+    with pytest.raises(RuntimeError, match="broken genome"):
+        evaluate_with_worker(fail_on_first, make_genomes(config, 5), config)
@@ -0,0 +1,51 @@
+import copy
+import os
+import random
+
+import neat
+
+from main import App, RUNS_PER_NET
+from scripts.fitness_cache import FitnessCache
+from scripts.scenarios import ScenarioSet
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), "..", "config.conf")
+
+def load_config():
+    config = neat.Config(neat.DefaultGenome, neat.DefaultReproduction, neat.DefaultSpeciesSet, neat.DefaultStagnation, CONFIG_PATH)
+    config.scenario_seeds = ScenarioSet(RUNS_PER_NET, seed=0).get_seeds(0)
+    config.racing_threshold = None
+    return config
+
+def evaluate(genomes, config):
+    for genome_id, genome in genomes:
+        genome.fitness = App.evaluate_genome(genome, config)
+
+def test_hit_matches_evaluation():
+    config = load_config()
+    random.seed(0)
+    genomes = list(neat.Population(config).population.items())[:4]
+    cache = FitnessCache()
+    cache.evaluate(evaluate, genomes, config, config.scenario_seeds)
+    assert cache.misses == len(genomes)
+
+    # same networks under new keys, like elites carried over to the next generation
+    copies = []
+    for genome_id, genome in genomes:
+        genome = copy.deepcopy(genome)
+        genome.key += 1000
+        genome.fitness = None
+        copies.append((genome.key, genome))
+    cache.evaluate(evaluate, copies, config, config.scenario_seeds)
+    assert cache.hits == len(genomes)
+
+    cached = [genome.fitness for genome_id, genome in copies]
+    evaluate(copies, config)
+    assert cached == [genome.fitness for genome_id, genome in copies]
+
+def test_other_seeds_miss():
+    config = load_config()
+    random.seed(0)
+    genomes = list(neat.Population(config).population.items())[:1]
+    cache = FitnessCache()
+    cache.evaluate(evaluate, genomes, config, config.scenario_seeds)
+    assert cache.get(genomes[0][1], ScenarioSet(RUNS_PER_NET, seed=1).get_seeds(0)) is None
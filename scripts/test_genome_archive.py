@@ -0,0 +1,59 @@
+import os
+import random
+
+import neat
+
+from scripts.compiled_network import genome_hash
+from scripts.genome_archive import GenomeArchive, ArchiveReporter
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), "..", "config.conf")
+
+def load_config():
+    return neat.Config(neat.DefaultGenome, neat.DefaultReproduction, neat.DefaultSpeciesSet, neat.DefaultStagnation, CONFIG_PATH)
+
+def evaluate(genomes, config):
+    for genome_id, genome in genomes:
+        genome.fitness = sum(cg.weight for cg in genome.connections.values() if cg.enabled)
+
+def run(directory, generations):
+    random.seed(0)
+    config = load_config()
+    pop = neat.Population(config)
+    archive = GenomeArchive(directory)
+    pop.add_reporter(ArchiveReporter(archive, elites=3))
+    pop.run(evaluate, generations)
+    archive.close()
+    return pop, config
+
+def test_load_gives_back_the_network(tmp_path):
+    pop, config = run(str(tmp_path), 4)
+    archive = GenomeArchive(str(tmp_path))
+    assert set(archive.index["generation"].tolist()) == {0, 1, 2, 3}
+
+    best = archive.best(1)[0]
+    genome = archive.load(best, config)
+    assert genome.key == pop.best_genome.key
+    assert genome.fitness == pop.best_genome.fitness
+    assert genome_hash(genome) == genome_hash(pop.best_genome)
+
+def test_partial_write_is_dropped(tmp_path):
+    run(str(tmp_path), 2)
+    archive = GenomeArchive(str(tmp_path))
+    count = len(archive)
+    # a crash half way through a row
+    with open(archive.index_path, "ab") as f:
+        f.write(b"\0" * 10)
+    archive.refresh()
+    assert len(archive) == count
+
+    config = load_config()
+    genome = archive.load(0, config)
+    archive.add(genome, config, 2)
+    archive.close()
+    assert len(GenomeArchive(str(tmp_path))) == count + 1
+
+def test_drop_from(tmp_path):
+    run(str(tmp_path), 3)
+    archive = GenomeArchive(str(tmp_path))
+    archive.drop_from(1)
+    assert set(archive.index["generation"].tolist()) == {0}
@@ -0,0 +1,31 @@
+from scripts.multi_scene import MultiScene
+
+FORWARD = (255, 255, 0.0)
+
+def warm_up(multi):
+    multi.warm_up()
+    for _ in range(5):
+        multi.get_net_inputs()
+        multi.tick([FORWARD] * multi.num_robots)
+
+def test_inactive_robot_stays_put():
+    multi = MultiScene(2, num_targets=4, seeds=[1, 2])
+    warm_up(multi)
+    body = multi.scenes[0].robot.controller_body
+    position = tuple(body.position)
+    for _ in range(20):
+        multi.get_net_inputs()
+        multi.tick([None, FORWARD], [False, True])
+    assert tuple(body.position) == position
+
+def test_shared_targets_update_without_first_scene():
+    multi = MultiScene(2, num_targets=4, seeds=[1, 2], cooperative=True)
+    warm_up(multi)
+    target = multi.scenes[1].targets[0]
+    target.shape.body.velocity = (5, 0)
+    x = target.pos.x
+    for _ in range(5):
+        multi.get_net_inputs()
+        multi.tick([None, FORWARD], [False, True])
+    # the pushed target is seen to move, as of the step before the last
+    assert target.pos.x > x
@@ -0,0 +1,85 @@
+import math
+import random
+
+from scripts.scene import Scene
+
+NUM_TARGETS = 40 # enough to be pushing into each other & to use the target grid
+
+def make_scene(seed):
+    return Scene(num_targets=NUM_TARGETS, width=640, height=640, headless=True, seed=seed, max_seen=1)
+
+def get_poses(scene):
+    bodies = [scene.robot.controller_body] + [target.shape.body for target in scene.targets]
+    return [(*body.position, body.angle, *body.velocity) for body in bodies]
+
+def drive(scene, steps, seed):
+    # random motors, looking now & then so the robot keeps moving
+    rng = random.Random(seed)
+    for _ in range(steps):
+        scene.get_net_inputs()
+        scene.tick((rng.uniform(-255, 255), rng.uniform(-255, 255), float(rng.random() < 0.05)))
+        yield get_poses(scene)
+
+def test_reset_matches_new_scene():
+    used = make_scene(1)
+    for _ in drive(used, 1000, 0):
+        pass
+
+    used.reset(2)
+    fresh = make_scene(2)
+    assert get_poses(used) == get_poses(fresh)
+    for step, (a, b) in enumerate(zip(drive(used, 300, 1), drive(fresh, 300, 1))):
+        assert a == b, f"diverged at step {step}"
+
+def test_restored_warm_up_matches_uninterrupted_run():
+    # what the scene pool does: the warm up is only simulated once, other scenes restore it
+    scene = make_scene(3)
+    scene.warm_up()
+    state = scene.snapshot()
+
+    other = make_scene(4)
+    for _ in drive(other, 500, 0):
+        pass
+    other.reset(3)
+    other.restore(state)
+    assert other.snapshot().data.tolist() == state.data.tolist()
+    for step, (a, b) in enumerate(zip(drive(scene, 300, 1), drive(other, 300, 1))):
+        assert a == b, f"diverged at step {step}"
+
+def test_snapshot_round_trip():
+    scene = make_scene(5)
+    for _ in drive(scene, 200, 0):
+        pass
+    scene.see(1) # so there's a seen target to restore
+    state = scene.snapshot()
+    expected = list(drive(scene, 100, 1))
+
+    scene.restore(state)
+    restored = scene.snapshot()
+    assert restored.data.tolist() == state.data.tolist()
+    assert restored.seen_targets.tolist() == state.seen_targets.tolist()
+    assert scene.rng.getstate() == state.rng_state
+    assert list(drive(scene, 100, 1)) == expected
+
+def test_grid_see_matches_checking_every_target():
+    scene = Scene(num_targets=200, width=1000, height=640, headless=True, seed=6)
+    assert scene.target_grid is not None
+    scene.warm_up()
+    rng = random.Random(3)
+    most = 0
+    for _ in range(100):
+        # see() only looks at where the robot is & which way its body faces
+        scene.robot.pos.update(rng.uniform(0, scene.width), rng.uniform(0, scene.height))
+        scene.robot.controller_body.angle = rng.uniform(-math.pi, math.pi)
+        for k in (1, 3, 10, None):
+            # see() only looks once the scene is ready & starts the stall over
+            scene.stall = scene.ready_steps + 1
+            found = scene.see(k)
+            grid = scene.target_grid
+            scene.target_grid = None
+            scene.stall = scene.ready_steps + 1
+            expected = scene.see(k)
+            scene.target_grid = grid
+            assert found == expected, f"k={k} from {scene.robot.pos}"
+            most = max(most, len(found))
+    assert most > 10
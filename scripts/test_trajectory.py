@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from scripts.scene import Scene
+from scripts.trajectory import EpisodeFile, save_episodes
+
+def record(seed, steps):
+    scene = Scene(num_targets=3, headless=True, seed=seed, max_seen=1)
+    scene.start_recording(steps)
+    for _ in range(steps):
+        scene.get_net_inputs()
+        scene.tick((200, 100, 0.0))
+    return scene.stop_recording().get_episode(genome_id=seed, seed=seed, fitness=float(steps))
+
+def test_round_trip(tmp_path):
+    # an episode without any steps is kept as one
+    episodes = [record(1, 50), record(2, 0), record(3, 20)]
+    path = tmp_path / "episodes.npz"
+    save_episodes(path, episodes)
+
+    loaded = EpisodeFile(path)
+    assert len(loaded) == len(episodes)
+    for i, episode in enumerate(episodes):
+        copy = loaded.get(i)
+        assert (copy.genome_id, copy.seed, copy.fitness, len(copy)) == (episode.genome_id, episode.seed, episode.fitness, len(episode))
+        for name in ("robot", "motors", "targets"):
+            assert np.array_equal(getattr(copy, name), getattr(episode, name))
+    loaded.close()
+
+def test_save_nothing(tmp_path):
+    with pytest.raises(ValueError):
+        save_episodes(tmp_path / "episodes.npz", [])
@@ -0,0 +1,157 @@
+import numpy as np
+
+from dataclasses import dataclass
+
+NO_SEED = -1 # stored in the index for unseeded runs
+INDEX_DTYPE = np.dtype([
+    ("genome_id", np.int64), ("run", np.int32), ("seed", np.int64), ("fitness", np.float64),
+    ("first_step", np.int32), # scene step of the first recorded step (the warm up isn't recorded)
+    ("start", np.int64), ("length", np.int64), # rows of the episode in the step arrays
+    ("generation", np.int32), ("reached_target", np.bool_),
+])
+STEP_ARRAYS = ("robot", "motors", "inputs", "outputs", "targets") # Episode fields with a row per step
+
+# one recorded run, every array has a row per step
+@dataclass
+class Episode:
+    genome_id: int
+    run: int
+    seed: int | None
+    fitness: float
+    first_step: int
+    robot: np.ndarray # (x, y, angle) of Robot.pos & Robot.angle after the step
+    motors: np.ndarray # (left, right) motor values
+    inputs: np.ndarray # network inputs
+    outputs: np.ndarray # network outputs, NaN for steps without any
+    targets: np.ndarray # (x, y, angle) of Target.pos & Target.angle for each target
+    generation: int = 0
+    reached_target: bool = False
+
+    def __len__(self) -> int:
+        return len(self.robot)
+
+# records a scene step by step into preallocated buffers, see Scene.start_recording()
+class TrajectoryRecorder:
+    def __init__(self, max_steps: int, num_targets: int, num_inputs: int, num_outputs: int = 3):
+        """
+        max_steps: steps the buffers are sized for, longer runs grow them (copying everything)
+        """
+        self.robot = np.empty((max_steps, 3), dtype=np.float32)
+        self.motors = np.empty((max_steps, 2), dtype=np.float32)
+        self.inputs = np.empty((max_steps, num_inputs), dtype=np.float32)
+        self.outputs = np.empty((max_steps, num_outputs), dtype=np.float32)
+        self.targets = np.empty((max_steps, num_targets, 3), dtype=np.float32)
+        self.first_step = 0
+        self.length = 0
+
+    def clear(self, first_step=0):
+        self.first_step = first_step
+        self.length = 0
+
+    def grow(self):
+        for name in STEP_ARRAYS:
+            buffer = getattr(self, name)
+            setattr(self, name, np.concatenate((buffer, np.empty_like(buffer))))
+
+    def record(self, robot, targets, inputs, output):
+        """
+        Adds a step. inputs & output: what the network got & gave this step (either can be None)
+        """
+        i = self.length
+        if i == len(self.robot):
+            self.grow()
+        self.robot[i] = robot.pos.x, robot.pos.y, robot.angle
+        self.motors[i] = robot.motor_left, robot.motor_right
+        self.inputs[i] = inputs if inputs is not None else np.nan
+        self.outputs[i] = output if output else np.nan
+        for t, target in enumerate(targets):
+            self.targets[i, t] = target.pos.x, target.pos.y, target.angle
+        self.length += 1
+
+    def get_episode(self, genome_id=0, run=0, seed=None, fitness=0.0, generation=0, reached_target=False) -> Episode:
+        # copies, so the recorder can carry on with the next run
+        n = self.length
+        return Episode(genome_id, run, seed, fitness, self.first_step, self.robot[:n].copy(), self.motors[:n].copy(),
+                       self.inputs[:n].copy(), self.outputs[:n].copy(), self.targets[:n].copy(), generation, reached_target)
+
+def get_index_entry(episode: Episode, start: int) -> tuple:
+    # row of INDEX_DTYPE for an episode whose steps start at row start
+    seed = NO_SEED if episode.seed is None else episode.seed
+    return (episode.genome_id, episode.run, seed, episode.fitness, episode.first_step, start, len(episode),
+            episode.generation, episode.reached_target)
+
+def get_episode(entry, arrays) -> Episode:
+    """
+    Episode for an index entry, its step arrays sliced (not copied) out of arrays (name -> array)
+    """
+    rows = slice(int(entry["start"]), int(entry["start"] + entry["length"]))
+    seed = int(entry["seed"])
+    return Episode(int(entry["genome_id"]), int(entry["run"]), None if seed == NO_SEED else seed, float(entry["fitness"]),
+                   int(entry["first_step"]), *(arrays[name][rows] for name in STEP_ARRAYS),
+                   int(entry["generation"]), bool(entry["reached_target"]))
+
+def save_episodes(path, episodes: list[Episode]):
+    """
+    Writes episodes (from scenes with the same number of targets & network inputs) to one .npz file,
+    their steps back to back in each array with an index of where each episode is
+    """
+    # the arrays' shapes come from the episodes
+    if not episodes:
+        raise ValueError(f"no episodes to save to {path}")
+    index = np.zeros(len(episodes), dtype=INDEX_DTYPE)
+    start = 0
+    for i, episode in enumerate(episodes):
+        index[i] = get_index_entry(episode, start)
+        start += len(episode)
+
+    np.savez(path, index=index, **{name: np.concatenate([getattr(episode, name) for episode in episodes]) for name in STEP_ARRAYS})
+
+# episodes written by save_episodes(), only the index is read until an episode is asked for
+class EpisodeFile:
+    def __init__(self, path):
+        self.path = path
+        self.data = np.load(path)
+        self.index = self.data["index"]
+        self.arrays = {}
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def get_arrays(self) -> dict:
+        # npz members are read in one go, the first time an episode is asked for
+        if not self.arrays:
+            self.arrays = {name: self.data[name] for name in STEP_ARRAYS}
+        return self.arrays
+
+    def find(self, genome_id=None, run=None, seed=None) -> list[int]:
+        """
+        Positions of the episodes matching every filter given
+        """
+        mask = np.ones(len(self.index), dtype=bool)
+        if genome_id is not None:
+            mask &= self.index["genome_id"] == genome_id
+        if run is not None:
+            mask &= self.index["run"] == run
+        if seed is not None:
+            mask &= self.index["seed"] == seed
+        return np.flatnonzero(mask).tolist()
+
+    def get(self, i) -> Episode:
+        return get_episode(self.index[i], self.get_arrays())
+
+    def close(self):
+        self.data.close()
+
+def show_step(scene, episode: Episode, step: int):
+    """
+    Puts the robot & targets of scene (with as many targets as the episode) where they were
+    after a recorded step, for drawing. Nothing is simulated, the physics bodies are left alone
+    """
+    x, y, angle = episode.robot[step].tolist()
+    scene.robot.pos.update(x, y)
+    scene.robot.angle = angle
+    scene.robot.motor_left, scene.robot.motor_right = episode.motors[step].tolist()
+    for target, (x, y, angle) in zip(scene.targets, episode.targets[step].tolist()):
+        target.pos.update(x, y)
+        target.angle = angle
+    scene.step = episode.first_step + step
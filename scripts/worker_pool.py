@@ -0,0 +1,157 @@
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from .profiler import Profiler, profiler
+from .event_log import event_log
+
+CHUNK_SIZE = 4
+TASK_TIMEOUT = 600.0 # seconds evaluate() waits for the next chunk before giving up (eg. a worker process died)
+
+# set up once in every worker by init_worker()
+worker_eval_function = None
+worker_config = None
+
+def pack_genome(genome, config) -> tuple:
+    """
+    Packs the parts of a genome a network is built from into two small arrays:
+    nodes (key, bias, response, activation index, aggregation index) & enabled connections (in, out, weight)
+    """
+    activations = config.genome_config.activation_options
+    aggregations = config.genome_config.aggregation_options
+    nodes = np.array([(key, ng.bias, ng.response, activations.index(ng.activation), aggregations.index(ng.aggregation))
+                      for key, ng in genome.nodes.items()], dtype=np.float64).reshape(-1, 5)
+    connections = np.array([(key[0], key[1], cg.weight) for key, cg in genome.connections.items() if cg.enabled],
+                           dtype=np.float64).reshape(-1, 3)
+    return genome.key, nodes, connections
+
+def unpack_genome(packed, config):
+    """
+    Rebuilds a genome (without disabled connections) from pack_genome()
+    """
+    key, nodes, connections = packed
+    genome_config = config.genome_config
+    genome = config.genome_type(key)
+    for node_key, bias, response, activation, aggregation in nodes.tolist():
+        ng = genome_config.node_gene_type(int(node_key))
+        ng.bias = bias
+        ng.response = response
+        ng.activation = genome_config.activation_options[int(activation)]
+        ng.aggregation = genome_config.aggregation_options[int(aggregation)]
+        genome.nodes[ng.key] = ng
+    for in_key, out_key, weight in connections.tolist():
+        cg = genome_config.connection_gene_type((int(in_key), int(out_key)))
+        cg.weight = weight
+        cg.enabled = True
+        genome.connections[cg.key] = cg
+    return genome
+
+def init_worker(eval_function, config, initializer):
+    global worker_eval_function, worker_config
+    worker_eval_function = eval_function
+    worker_config = config
+    if initializer:
+        initializer(config)
+
+def evaluate_packed(eval_function, config, attributes: dict, chunk: list) -> list:
+    """
+    Evaluates a chunk of (genome id, packed genome) & returns [(genome id, result)]
+    """
+    # per generation settings (scenario seeds etc.) ride along with each chunk
+    for name, value in attributes.items():
+        setattr(config, name, value)
+
+    results = []
+    for genome_id, packed in chunk:
+        results.append((genome_id, eval_function(unpack_genome(packed, config), config)))
+    return results
+
+def evaluate_chunk(task) -> tuple:
+    """
+    Runs in a worker. Returns (worker pid, seconds spent evaluating, [(genome id, result)],
+    what the worker's profiler recorded or None if it's off, the worker's event log records)
+    """
+    start = time.perf_counter()
+    attributes, chunk = task
+    results = evaluate_packed(worker_eval_function, worker_config, attributes, chunk)
+    return os.getpid(), time.perf_counter() - start, results, profiler.drain() if profiler.enabled else None, event_log.drain()
+
+# persistent process pool that only gets the config once & evaluates genomes in chunks
+class WorkerPool:
+    def __init__(self, num_workers, eval_function, config, chunk_size=CHUNK_SIZE, initializer=None, config_attributes=()):
+        """
+        Drop in replacement for neat.ParallelEvaluator.\n
+        num_workers: number of worker processes
+        eval_function: function(genome, config) run in the workers, returns the fitness or a tuple starting with it
+        config: neat config, sent to each worker once when it starts
+        chunk_size: number of genomes sent to a worker per task
+        initializer: optional function(config) run once in each worker, eg. to build scenes ahead of time
+        config_attributes: names of attributes set on the config each generation that workers need too
+        """
+        self.num_workers = num_workers
+        self.chunk_size = chunk_size
+        self.config_attributes = config_attributes
+        self.pool = multiprocessing.Pool(num_workers, initializer=init_worker, initargs=(eval_function, config, initializer))
+
+        self.utilization = {} # worker pid -> fraction of the last evaluate() spent working
+        self.profile = Profiler() # merged from the workers during the last evaluate()
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def submit(self, genome_id, genome, config, callback, error_callback=None):
+        """
+        Starts evaluating one genome without waiting for it.
+        callback(genome_id, result) gets called from the pool's result thread when it's done,
+        or error_callback(genome_id, exception) if the evaluation raised
+        """
+        attributes = {name: getattr(config, name, None) for name in self.config_attributes}
+        task = (attributes, [(genome_id, pack_genome(genome, config))])
+        def done(result):
+            event_log.extend(result[4])
+            callback(*result[2][0])
+        def failed(error):
+            if error_callback:
+                error_callback(genome_id, error)
+        self.pool.apply_async(evaluate_chunk, (task,), callback=done, error_callback=failed)
+
+    def evaluate(self, genomes, config) -> dict:
+        """
+        Sets the fitness of every genome & returns {genome id: eval_function result}.
+        An exception raised by eval_function is raised here
+        """
+        attributes = {name: getattr(config, name, None) for name in self.config_attributes}
+        packed = [(genome_id, pack_genome(genome, config)) for genome_id, genome in genomes]
+        tasks = [(attributes, packed[i:i + self.chunk_size]) for i in range(0, len(packed), self.chunk_size)]
+
+        start = time.perf_counter()
+        busy = {}
+        results = {}
+        self.profile = Profiler()
+        chunks = self.pool.imap_unordered(evaluate_chunk, tasks)
+        for _ in tasks:
+            # the pool replaces a worker process that dies, but the chunk it had is never finished
+            try:
+                pid, seconds, chunk_results, profile, records = chunks.next(TASK_TIMEOUT)
+            except multiprocessing.TimeoutError:
+                raise TimeoutError(f"no chunk finished in {TASK_TIMEOUT:.0f}s, did a worker process die?") from None
+            busy[pid] = busy.get(pid, 0.0) + seconds
+            results.update(chunk_results)
+            if profile:
+                self.profile.merge(profile)
+            event_log.extend(records)
+        wall_time = time.perf_counter() - start
+
+        for genome_id, genome in genomes:
+            result = results[genome_id]
+            genome.fitness = result[0] if isinstance(result, tuple) else result
+
+        # workers that got no tasks at all were idle for the whole generation
+        self.utilization = {pid: seconds / wall_time for pid, seconds in busy.items()}
+        idle = self.num_workers - len(busy)
+        print(f"Workers: {len(busy)} busy, {idle} idle, utilization " +
+              ", ".join(f"{u:.0%}" for u in sorted(self.utilization.values(), reverse=True)))
+        return results